@@ -3,13 +3,33 @@ import pandas as pd
 import json
 import os
 from datetime import datetime, timezone
-from src.ai_core import get_ai_analysis, parse_llm_response, get_last_audit_meta
+from src.ai_core import analyze_feature
+from src.llm_metrics import get_llm_metrics
+from src.terminology import refresh_terminology
+from src.csv_import import (
+    CSVFormatError,
+    CSV_IMPORT_CHUNK_ROWS,
+    import_features_csv,
+    preview_csv,
+    validate_csv_columns,
+)
+from src.batch_scan import run_batch_scan, select_feature_ids, BATCH_SCAN_CONCURRENCY
+from src.rule_impact import find_rule_impact
 from src.db_utils import (
-    get_all_features,
+    FEATURE_PAGE_SIZE,
+    SCAN_PAGE_SIZE,
+    count_features,
+    get_all_feature_ids,
+    get_features_page,
+    get_features_list_rows,
     get_feature_by_id,
     add_or_update_feature,
     add_scan,
-    get_scans_for_feature,
+    get_scan_details,
+    get_scan_snapshots,
+    get_scan_headers_page,
+    get_scan_stats,
+    get_scan_summaries,
     get_all_legal_rules,
     delete_features,
     add_or_update_legal_rule,
@@ -89,6 +109,14 @@ if "rule_to_edit" not in st.session_state:
     st.session_state.rule_to_edit = None
 if "term_to_edit" not in st.session_state:
     st.session_state.term_to_edit = None
+if "rule_impact" not in st.session_state:
+    st.session_state.rule_impact = None
+if "feature_pager" not in st.session_state:
+    st.session_state.feature_pager = {}
+if "scan_pager" not in st.session_state:
+    st.session_state.scan_pager = {}
+if "open_scans" not in st.session_state:
+    st.session_state.open_scans = set()
     
 def _sev_class(sev: str) -> str:
     s = (sev or "").lower()
@@ -142,34 +170,105 @@ def extract_text_from_file(uploaded_file):
 
 
 def process_batch_csv(uploaded_file):
-    """Process CSV file for batch feature upload"""
+    """Validate the CSV header and return a preview of its first rows (the file is not fully read)."""
     try:
-        df = pd.read_csv(uploaded_file)
-        df.columns = df.columns.str.strip()
+        validate_csv_columns(uploaded_file)
+        return preview_csv(uploaded_file)
+    except CSVFormatError as e:
+        st.error(str(e))
+        st.info("Required columns: title, description")
+        st.info("Optional columns: prd, trd")
+        return None
+    except Exception as e:
+        st.error(f"Error processing CSV file: {str(e)}")
+        return None
 
-        required_columns = ['title', 'description']
-        optional_columns = ['prd', 'trd']
 
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            st.error(f"Missing required columns: {missing_columns}")
-            st.info("Required columns: title, description")
-            st.info("Optional columns: prd, trd")
-            return None
+@st.cache_data(show_spinner=False, max_entries=200)
+def load_scan_details(scan_id: str):
+    """Analysis, snapshot and audit of one scan (no prompt snapshot); scans are append-only, so they are cached by id."""
+    return get_scan_details(scan_id)
 
-        for col in optional_columns:
-            if col not in df.columns:
-                df[col] = ""
 
-        df = df.fillna("")
-        df = df[df['title'].str.strip() != ""]
+# Scans written by other sessions / the CLI show up on the dashboard within this many seconds
+SCAN_SUMMARIES_CACHE_TTL = int(os.getenv("SCAN_SUMMARIES_CACHE_TTL", "60"))
 
-        return df[['title', 'description', 'prd', 'trd']]
+@st.cache_data(show_spinner=False, ttl=SCAN_SUMMARIES_CACHE_TTL)
+def load_scan_summaries():
+    """Latest scan + count per feature for the dashboard; cleared whenever this app writes or deletes scans."""
+    return get_scan_summaries()
 
-    except Exception as e:
-        st.error(f"Error processing CSV file: {str(e)}")
+
+@st.cache_data(show_spinner=False, max_entries=50)
+def load_scan_snapshots(scan_id: str):
+    """Prompt and context snapshots of one scan (the bulkiest part of its audit)."""
+    return get_scan_snapshots(scan_id)
+
+
+def render_pager(state_key: str, page: int, has_next: bool, caption: str) -> None:
+    """Previous / next controls for a paged list whose state dict lives in st.session_state[state_key]."""
+    prev_col, caption_col, next_col = st.columns([1, 2, 1])
+    with prev_col:
+        if st.button("← Newer", key=f"{state_key}_prev", disabled=page == 0, use_container_width=True):
+            st.session_state[state_key]["page"] = page - 1
+            st.rerun()
+    with caption_col:
+        st.caption(caption)
+    with next_col:
+        if st.button("Older →", key=f"{state_key}_next", disabled=not has_next, use_container_width=True):
+            st.session_state[state_key]["page"] = page + 1
+            st.rerun()
+
+
+def run_batch_scan_with_progress(feature_ids):
+    """Runs a batch scan with a live progress bar and shows per-item errors."""
+    feature_ids = list(feature_ids)
+    if not feature_ids:
+        st.info("No features to scan.")
         return None
 
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+
+    def _on_progress(done, total, item):
+        progress_bar.progress(done / total)
+        mark = "✅" if item["status"] == "ok" else "❌"
+        status_text.text(f"{mark} [{done}/{total}] {item.get('title') or item['feature_id']}")
+
+    try:
+        report = run_batch_scan(feature_ids, on_progress=_on_progress)
+    finally:
+        load_scan_summaries.clear()
+
+    progress_bar.empty()
+    status_text.empty()
+    st.session_state.last_batch_report = report
+    return report
+
+
+def render_batch_report(report):
+    """Summarizes the outcome of the last batch scan."""
+    if not report:
+        return
+    with st.container(border=True):
+        st.markdown(f"**Batch scan:** {report['succeeded']} of {report['total']} features scanned successfully.")
+        usage = report.get("usage") or {}
+        if usage.get("calls"):
+            p95 = usage.get("latency_p95_ms")
+            st.caption(
+                f"{usage['total_tokens']:,} tokens billed ({usage['prompt_tokens']:,} prompt / "
+                f"{usage['output_tokens']:,} output) · {usage['cache_hits']} cache hits · "
+                f"{usage['retries']} retries" + (f" · p95 latency {p95 / 1000:.1f}s" if p95 is not None else "")
+            )
+        failed = [it for it in report["items"] if it["status"] != "ok"]
+        if failed:
+            with st.expander(f"❌ {len(failed)} failed scan(s)", expanded=False):
+                for it in failed:
+                    st.markdown(f"• **{it.get('title') or it['feature_id']}** (`{it['feature_id']}`): {it.get('error')}")
+        if st.button("Dismiss", key="dismiss_batch_report"):
+            st.session_state.last_batch_report = None
+            st.rerun()
+
 
 def render_classification_badge(classification):
     """Renders a styled classification badge"""
@@ -346,6 +445,53 @@ def render_feature_snapshot(snapshot, key_prefix: str = "snapshot"):
 # ==============================================================================
 #                           RENDER SETTINGS VIEW
 # ==============================================================================
+def compute_rule_impact(rule_ids, include_new_shortlists=True):
+    """Stores the features affected by a rule change for the settings view to offer a rescan."""
+    with st.spinner("Finding features affected by the rule change..."):
+        try:
+            affected = find_rule_impact(rule_ids, include_new_shortlists=include_new_shortlists)
+        except Exception as e:
+            st.session_state.rule_impact = {"rule_ids": list(rule_ids), "features": None, "error": str(e)}
+            return
+    st.session_state.rule_impact = {"rule_ids": list(rule_ids), "features": affected, "error": None}
+
+
+def render_rule_impact(impact):
+    """Offers to rescan just the features affected by the last rule change."""
+    if not impact:
+        return
+    with st.container(border=True):
+        rules = ", ".join(f"`{rid}`" for rid in impact["rule_ids"])
+        affected = impact.get("features")
+        if affected is None:
+            st.warning(f"⚠️ Could not determine the features affected by {rules}: {impact.get('error')}")
+        elif not affected:
+            st.markdown(f"**Rule change {rules}:** no scanned feature is affected.")
+        else:
+            counts = {}
+            for a in affected:
+                for reason in a["reasons"]:
+                    counts[reason] = counts.get(reason, 0) + 1
+            st.markdown(f"**Rule change {rules}:** {len(affected)} feature(s) affected.")
+            st.caption(f"{counts.get('triggered', 0)} cited it · {counts.get('in_context', 0)} had it in context · "
+                       f"{counts.get('newly_shortlisted', 0)} would now be matched to it")
+            with st.expander("Affected features", expanded=False):
+                for a in affected:
+                    st.markdown(f"• **{a['title'] or a['feature_id']}** (`{a['feature_id']}`): {', '.join(a['reasons'])}")
+        b_col1, b_col2 = st.columns(2)
+        with b_col1:
+            if affected and st.button(f"🔄 Rescan {len(affected)} Affected", type="primary", use_container_width=True):
+                with st.spinner(f"Scanning {len(affected)} affected feature(s), {BATCH_SCAN_CONCURRENCY} at a time..."):
+                    run_batch_scan_with_progress([a["feature_id"] for a in affected])
+                st.session_state.rule_impact = None
+                st.session_state.view = "list"
+                st.rerun()
+        with b_col2:
+            if st.button("Dismiss", key="dismiss_rule_impact", use_container_width=True):
+                st.session_state.rule_impact = None
+                st.rerun()
+
+
 def render_settings_view():
     """Renders the page for managing legal rules and terminology."""
     st.title("⚙️ Settings")
@@ -368,6 +514,7 @@ def render_settings_view():
     with col1:
         st.header("⚖️ Legal Rules")
         st.markdown("Manage the legal knowledge base used for AI analysis.")
+        render_rule_impact(st.session_state.rule_impact)
 
         # --- Form to Add or Edit a Rule ---
         st.subheader("➕ Add or Update a Rule")
@@ -398,8 +545,9 @@ def render_settings_view():
                         "severity": severity.lower(), "summary": summary,
                         "human_summary": human_summary, "link": link,
                     }
-                    add_or_update_legal_rule(rule_details)
-                    st.success(f"✅ Rule '{rule_id}' saved successfully!")
+                    if add_or_update_legal_rule(rule_details):
+                        st.success(f"✅ Rule '{rule_id}' saved successfully!")
+                        compute_rule_impact([rule_id])
                     st.session_state.rule_to_edit = None
                     st.cache_data.clear()
                     st.rerun()
@@ -429,8 +577,9 @@ def render_settings_view():
                             st.rerun()
                     with r_col3:
                         if st.button("🗑️ Delete", key=f"del_{rule['id']}", type="secondary", use_container_width=True):
-                            delete_legal_rules([rule['id']])
-                            st.success(f"🗑️ Rule '{rule['id']}' deleted.")
+                            if delete_legal_rules([rule['id']]):
+                                st.success(f"🗑️ Rule '{rule['id']}' deleted.")
+                                compute_rule_impact([rule['id']], include_new_shortlists=False)
                             st.cache_data.clear()
                             st.rerun()
 
@@ -460,6 +609,7 @@ def render_settings_view():
                     st.error(f"Term '{final_term}' already exists. To update it, click its 'Edit' button below.")
                 else:
                     add_or_update_terminology(final_term, expansion)
+                    refresh_terminology()
                     st.success(f"✅ Term '{final_term}' saved successfully!")
                     st.session_state.term_to_edit = None
                     st.cache_data.clear()
@@ -492,11 +642,13 @@ def render_settings_view():
                     with t_col3:
                         if st.button("🗑️ Delete", key=f"del_term_{term_item['term']}", type="secondary", use_container_width=True):
                             delete_terminology([term_item['term']])
+                            refresh_terminology()
                             st.success(f"🗑️ Term '{term_item['term']}' deleted.")
                             st.cache_data.clear()
                             st.rerun()
 
-def render_audit_tab(audit: dict, key_prefix: str = "audit") -> None:
+def render_audit_tab(audit: dict, key_prefix: str = "audit", scan_id: str = None) -> None:
+    """Audit block of a scan. Snapshots missing from `audit` are offered on demand when `scan_id` is given."""
     audit = audit or {}
     st.subheader("📑 Audit Details")
 
@@ -505,19 +657,68 @@ def render_audit_tab(audit: dict, key_prefix: str = "audit") -> None:
         st.markdown("**Audit ID:**"); st.code(audit.get("audit_id", "—"))
         st.markdown("**Status:**"); st.code(audit.get("status", "—"))
         st.markdown("**Model:**"); st.code(audit.get("model", "—"))
+        st.markdown("**Prompt Version:**"); st.code(audit.get("prompt_version") or "—")
+        if audit.get("context_cache"):
+            cc = audit["context_cache"]
+            st.markdown("**Context Cache:**")
+            st.code(f"{cc.get('status', '—')} · {cc.get('name') or cc.get('mode')} · {cc.get('cached_tokens') or 0:,} cached tokens")
         st.markdown("**Prompt Included:**"); st.code(str(audit.get("prompt_included", False)))
     with col2:
         st.markdown("**Raw Output Hash:**"); st.code(audit.get("raw_output_hash", "—"))
         st.markdown("**Legal DB Fingerprint:**"); st.code(audit.get("legal_db_fingerprint", "—"))
         st.markdown("**Rules Context Fingerprint:**"); st.code(audit.get("rules_context_fingerprint", "—"))
+        st.markdown("**Terminology Version:**"); st.code(audit.get("terminology_version") or "—")
+
+    if audit.get("latency_ms") is not None:
+        estimated = " (estimated)" if audit.get("tokens_source") == "estimate" else ""
+        u1, u2, u3, u4 = st.columns(4)
+        u1.metric(f"Prompt Tokens{estimated}", f"{audit.get('prompt_tokens') or 0:,}")
+        u2.metric(f"Output Tokens{estimated}", f"{audit.get('output_tokens') or 0:,}")
+        u3.metric("Latency", f"{audit['latency_ms'] / 1000:.2f}s")
+        u4.metric("Retries", audit.get("retries") or 0, help="Cache hit" if audit.get("cache_hit") else None)
 
     rules_ids = audit.get("rules_context_ids") or []
     st.markdown("**Rules Context IDs:**")
     st.code(", ".join(rules_ids) if rules_ids else "—")
 
+    budget = audit.get("prompt_budget") or {}
+    if budget.get("dropped_rule_ids") or budget.get("truncated_sections"):
+        notes = []
+        if budget.get("dropped_rule_ids"):
+            notes.append(f"dropped rules: {', '.join(map(str, budget['dropped_rule_ids']))}")
+        for name, sizes in (budget.get("truncated_sections") or {}).items():
+            notes.append(f"{name} truncated {sizes['from_chars']:,} → {sizes['to_chars']:,} chars")
+        st.warning(
+            f"✂️ Prompt trimmed to fit the {budget.get('budget', 0):,}-token budget "
+            f"(~{budget.get('original_tokens', 0):,} → ~{budget.get('estimated_tokens', 0):,} tokens): " + "; ".join(notes)
+        )
+
+    locations = audit.get("detected_locations") or []
+    st.markdown("**Detected Locations:**")
+    st.code(", ".join(locations) if locations else "—")
+
+    artifacts = audit.get("artifacts") or {}
+    if artifacts:
+        st.markdown("**Documents Sent:**")
+        st.code("\n".join(
+            f"{name}: {len(stats.get('selected_chunks') or [])} of {stats.get('chunks', 0)} chunks "
+            f"({stats.get('selected_chars', 0):,} of {stats.get('chars', 0):,} chars)"
+            for name, stats in artifacts.items()
+        ))
+
     # --- Snapshots (no `key` supported on st.expander in your version) ---
     snap_prompt = audit.get("prompt_snapshot")
     snap_context = audit.get("context_snapshot")
+    snapshots_stored = audit.get("prompt_included", True) or audit.get("context_text_included", True)
+    if scan_id and not (snap_prompt or snap_context) and snapshots_stored:
+        # Scan lists are read without the snapshots (the whole prompt); fetch them when asked
+        loaded_key = f"{key_prefix}_snapshots_loaded"
+        if st.session_state.get(loaded_key):
+            snapshots = load_scan_snapshots(scan_id) or {}
+            snap_prompt, snap_context = snapshots.get("prompt_snapshot"), snapshots.get("context_snapshot")
+        elif st.button("📝 Load prompt & context snapshots", key=f"{key_prefix}_load_snapshots"):
+            st.session_state[loaded_key] = True
+            st.rerun()
     if snap_prompt or snap_context:
         st.markdown("---")
         st.markdown("**Snapshots**")
@@ -591,44 +792,53 @@ def render_batch_upload_view():
 
         if df is not None:
             st.dataframe(df, use_container_width=True)
-            st.success(f"✅ Found {len(df)} valid features in your CSV file")
+            st.caption(f"Showing the first {len(df)} features; the full file is read in chunks during import.")
 
             col1, col2 = st.columns(2)
             with col1:
                 if st.button("📤 Import All Features", type="primary", use_container_width=True):
-                    imported_count = 0
-
-                    progress_bar = st.progress(0)
                     status_text = st.empty()
 
-                    for index, row in df.iterrows():
-                        status_text.text(f"Importing: {row['title']}")
-                        feature_details = {
-                            "id": None,
-                            "title": row['title'],
-                            "description": row['description'],
-                            "prd": row['prd'],
-                            "trd": row['trd'],
-                        }
-                        add_or_update_feature(feature_details)
-                        imported_count += 1
-                        progress_bar.progress((index + 1) / len(df))
+                    def _on_progress(counts):
+                        status_text.text(
+                            f"Processed {counts['rows']:,} rows: {counts['inserted']:,} imported, "
+                            f"{counts['duplicate']:,} duplicates skipped..."
+                        )
+
+                    status_text.text("Checking for duplicates...")
+                    try:
+                        summary = import_features_csv(uploaded_csv, on_progress=_on_progress)
+                    except Exception as e:
+                        summary = None
+                        st.error(f"❌ Import failed: {e}")
 
                     status_text.empty()
-                    progress_bar.empty()
-                    st.success(f"🎉 Successfully imported {imported_count} features!")
-                    st.session_state.import_completed = True
-                    st.rerun()
+                    if summary is not None:
+                        st.session_state.import_summary = summary
+                        st.session_state.import_completed = True
+                        st.rerun()
+
+                summary = st.session_state.get("import_summary")
+                if getattr(st.session_state, 'import_completed', False) and summary:
+                    st.success(
+                        f"🎉 Imported {summary['inserted']:,} features, "
+                        f"skipped {summary['duplicate']:,} duplicates"
+                    )
+                    failed_count = summary["error"] + summary["invalid"]
+                    if failed_count:
+                        st.warning(f"⚠️ {failed_count:,} rows were not imported")
+                        st.dataframe(pd.DataFrame(summary["failures"]), use_container_width=True)
 
                 if getattr(st.session_state, 'import_completed', False):
                     if st.button("📊 View Dashboard", type="secondary", use_container_width=True):
                         st.session_state.view = "list"
                         st.session_state.import_completed = False
+                        st.session_state.pop("import_summary", None)
                         st.rerun()
 
             with col2:
                 st.markdown("**Import Summary:**")
-                st.info(f"• {len(df)} features ready to import\n• Duplicates will be skipped\n• All features will be saved to database")
+                st.info(f"• Imported in chunks of {CSV_IMPORT_CHUNK_ROWS:,} rows\n• Duplicates (same title and description) will be skipped\n• All features will be saved to database")
 
 
 
@@ -755,15 +965,20 @@ def render_detail_view():
             with st.spinner("🤔 AI is analyzing your feature for compliance issues..."):
                 feature_snapshot = {"title": title, "description": description, "prd": prd_content, "trd": trd_content}
 
-                # Use latest ai_core semantics: terminology expansion looks at topic/description
-                raw_response = get_ai_analysis("", feature_topic=title, feature_description=description)
-                analysis = parse_llm_response(raw_response)
-
-                # Minimal audit block from ai_core (no feature hashes/terminology paths)
-                audit_meta = get_last_audit_meta() or {}
+                # Title/description go in whole; PRD/TRD are reduced to their most relevant excerpts.
+                # The audit meta comes back with this call's result, never from shared state.
+                result = analyze_feature(feature_topic=title, feature_description=description,
+                                         prd=prd_content, trd=trd_content)
+                analysis, audit_meta = result.analysis, result.audit
 
+            if not result.ok:
+                # Failed / empty model calls are not real assessments; don't store them.
+                st.error(f"❌ Scan failed, nothing was saved: {analysis.get('reasoning', 'Unknown error')}")
+            else:
                 add_scan(st.session_state.selected_feature_id, feature_snapshot, analysis, audit_meta=audit_meta)
-                
+                load_scan_summaries.clear()
+                st.session_state.scan_pager = {}
+
                 st.success("✅ Compliance scan completed and saved!")
                 st.rerun()
 
@@ -776,15 +991,25 @@ def render_detail_view():
     st.markdown("### 📈 Compliance Scan History")
 
     if st.session_state.selected_feature_id:
-        feature_scans = get_scans_for_feature(st.session_state.selected_feature_id)
-
-
-        if not feature_scans:
+        feature_id = st.session_state.selected_feature_id
+        scan_stats = get_scan_stats(feature_id)
+        pager = st.session_state.scan_pager
+        if pager.get("feature_id") != feature_id:
+            pager = st.session_state.scan_pager = {"feature_id": feature_id, "page": 0, "cursors": [None]}
+            st.session_state.open_scans = set()
+
+        if not scan_stats["scan_count"]:
             st.info("🔍 No compliance scans have been performed for this feature yet. Run your first scan above!")
         else:
-            total_scans = len(feature_scans)
-            high_risk_scans = sum(1 for scan in feature_scans if scan['analysis'].get('classification') == 'YES')
-            latest_scan = feature_scans[0] if feature_scans else None
+            total_scans = scan_stats["scan_count"]
+            high_risk_scans = scan_stats["yes_count"]
+            page = pager["page"]
+            # Headers only; each scan's analysis/snapshot/audit is fetched when it is opened
+            feature_scans, next_cursor = get_scan_headers_page(feature_id, SCAN_PAGE_SIZE, pager["cursors"][page])
+            if next_cursor is not None:
+                pager["cursors"][page + 1:] = [next_cursor]
+            latest_scan = feature_scans[0] if page == 0 and feature_scans else next(
+                iter(get_scan_headers_page(feature_id, 1)[0]), None)
 
             metric_col1, metric_col2, metric_col3 = st.columns(3)
             with metric_col1:
@@ -793,7 +1018,7 @@ def render_detail_view():
                 st.metric("Compliance Needed for", high_risk_scans, delta=f"{high_risk_scans}/{total_scans}")
             with metric_col3:
                 if latest_scan:
-                    classification = latest_scan['analysis'].get('classification', 'N/A')
+                    classification = latest_scan.get('classification') or 'N/A'
 
                     if classification == "YES":
                         status_text = "YES, Needs Compliance"
@@ -808,10 +1033,12 @@ def render_detail_view():
             st.divider()
 
             for i, scan in enumerate(feature_scans):
-                scan_number = len(feature_scans) - i
+                scan_number = total_scans - page * SCAN_PAGE_SIZE - i
                 dt = _parse_scan_ts(scan)
                 formatted_time = dt.strftime("%B %d, %Y at %I:%M %p") if dt else "N/A"
-                classification = scan['analysis'].get('classification', 'N/A')
+                classification = scan.get('classification') or 'N/A'
+                scan_id = scan["scan_id"]
+                is_open = scan_id in st.session_state.open_scans or (page == 0 and i == 0)
 
                 if classification == "YES":
                     status_emoji = "🚨"; status_text = "Needs Compliance"
@@ -823,25 +1050,44 @@ def render_detail_view():
                     status_emoji = "❓"; status_text = "Unknown"
 
                 with st.expander(f"{status_emoji} Scan #{scan_number} - {status_text} ({formatted_time})",
-                                 expanded=(i == 0)):
+                                 expanded=is_open):
+                    if not is_open:
+                        regulation = scan.get("regulation")
+                        if regulation and regulation != "None":
+                            st.caption(f"Regulation: {regulation}")
+                        if st.button("📂 Load details", key=f"load_scan_{scan_id}"):
+                            st.session_state.open_scans.add(scan_id)
+                            st.rerun()
+                        continue
+
+                    details = load_scan_details(scan_id)
+                    if not details:
+                        st.warning("Could not load this scan.")
+                        continue
+
                     analysis_tab, snapshot_tab, audit_tab = st.tabs(
                         ["Analysis Results", "Feature Snapshot", "Audit Log"]
                     )
 
                     with analysis_tab:
-                        render_analysis_section(scan["analysis"])
+                        render_analysis_section(details["analysis"])
 
                     with snapshot_tab:
                         render_feature_snapshot(
-                            scan["feature_snapshot"],
-                            key_prefix=f"scan_{scan.get('scan_id', i)}"
+                            details["feature_snapshot"],
+                            key_prefix=f"scan_{scan_id}"
                         )
 
                     with audit_tab:
                         render_audit_tab(
-                            scan.get("audit") or {},
-                            key_prefix=f"audit_{scan.get('scan_id', i)}"
+                            details.get("audit") or {},
+                            key_prefix=f"audit_{scan_id}",
+                            scan_id=scan_id,
                         )
+
+            if page > 0 or next_cursor is not None:
+                render_pager("scan_pager", page, next_cursor is not None,
+                             f"Scans {page * SCAN_PAGE_SIZE + 1}-{page * SCAN_PAGE_SIZE + len(feature_scans)} of {total_scans}")
     else:
         st.info("💡 Save this feature to enable compliance scanning and view scan history.")
 
@@ -849,6 +1095,15 @@ def render_detail_view():
 # ==============================================================================
 #                               RENDER LIST VIEW
 # ==============================================================================
+# Status filter -> latest scan classification (None = never scanned)
+STATUS_FILTER_CLASSIFICATIONS = {
+    "Needs Compliance": "YES",
+    "Compliant": "NO",
+    "Review Required": "UNSURE",
+    "Not Scanned": None,
+}
+
+
 def render_list_view():
     """Renders the home screen with a list of all created features."""
 
@@ -878,9 +1133,9 @@ def render_list_view():
 
     st.divider()
 
-    features = get_all_features()
+    total_features = count_features()
 
-    if not features:
+    if not total_features:
         st.markdown("""
         <div style="text-align: center; padding: 3rem; color: #666;">
             <h3>🌟 Welcome to GeoGuard AI!</h3>
@@ -888,14 +1143,14 @@ def render_list_view():
         </div>
         """, unsafe_allow_html=True)
     else:
-        total_features = len(features)
+        # Latest scan + count per feature from the latest_scans view, cached between reruns
+        scan_summaries = load_scan_summaries()
 
         total_scans = 0
         high_risk_features = 0
-        for feature in features:
-            feature_scans = get_scans_for_feature(feature["id"])
-            total_scans += len(feature_scans)
-            if feature_scans and feature_scans[0]['analysis']['classification'] == 'YES':
+        for summary in scan_summaries.values():
+            total_scans += summary["scan_count"]
+            if summary["latest_classification"] == 'YES':
                 high_risk_features += 1
 
         st.markdown("### 📊 Dashboard Overview")
@@ -918,27 +1173,31 @@ def render_list_view():
         with search_col2:
             status_filter = st.selectbox("Filter by Status", ["All", "Needs Compliance", "Compliant", "Not Scanned", "Review Required"])
 
-        filtered_features = features
-        if search_term:
-            filtered_features = [
-                f for f in filtered_features
-                if search_term.lower() in f['title'].lower() or search_term.lower() in f.get('description', '').lower()
+        search_term = search_term.strip()
+        pager = st.session_state.feature_pager
+        if pager.get("query") != (search_term, status_filter):
+            pager = st.session_state.feature_pager = {"query": (search_term, status_filter), "page": 0, "cursors": [None]}
+        page = pager["page"]
+
+        if status_filter == "All":
+            # Keyset page straight from the features table (search runs server-side)
+            matching_ids = None
+            filtered_features, next_cursor = get_features_page(FEATURE_PAGE_SIZE, pager["cursors"][page], search_term)
+            if next_cursor is not None:
+                pager["cursors"][page + 1:] = [next_cursor]
+            has_next = next_cursor is not None
+            match_count = None if search_term else total_features
+        else:
+            # Status lives on the scans: filter the (id-only) feature list, then load one page of rows
+            wanted = STATUS_FILTER_CLASSIFICATIONS[status_filter]
+            matching_ids = [
+                fid for fid in get_all_feature_ids(search_term)
+                if (scan_summaries.get(fid) or {}).get("latest_classification") == wanted
             ]
-
-        if status_filter != "All":
-            filtered_by_status = []
-            for feature in filtered_features:
-                feature_scans = get_scans_for_feature(feature["id"])
-                if not feature_scans:
-                    if status_filter == "Not Scanned":
-                        filtered_by_status.append(feature)
-                else:
-                    latest_classification = feature_scans[0]['analysis'].get('classification', 'N/A')
-                    if (status_filter == "Needs Compliance" and latest_classification == "YES") or \
-                       (status_filter == "Compliant" and latest_classification == "NO") or \
-                       (status_filter == "Review Required" and latest_classification == "UNSURE"):
-                        filtered_by_status.append(feature)
-            filtered_features = filtered_by_status
+            start = page * FEATURE_PAGE_SIZE
+            filtered_features = get_features_list_rows(matching_ids[start:start + FEATURE_PAGE_SIZE])
+            has_next = start + FEATURE_PAGE_SIZE < len(matching_ids)
+            match_count = len(matching_ids)
 
         # Selection and Delete Controls
         if filtered_features:
@@ -951,13 +1210,38 @@ def render_list_view():
                 if select_all != st.session_state.select_all:
                     st.session_state.select_all = select_all
                     if select_all:
-                        st.session_state.selected_feature_ids = {f["id"] for f in filtered_features}
+                        # Every match, not just the page on screen
+                        st.session_state.selected_feature_ids = set(
+                            matching_ids if matching_ids is not None else get_all_feature_ids(search_term))
                     else:
                         st.session_state.selected_feature_ids = set()
                     st.rerun()
 
             selected_count = len(st.session_state.selected_feature_ids)
 
+            with select_col2:
+                if st.button(f"🔍 Scan Selected ({selected_count})", disabled=selected_count == 0, use_container_width=True):
+                    with st.spinner(f"Scanning {selected_count} feature(s), {BATCH_SCAN_CONCURRENCY} at a time..."):
+                        run_batch_scan_with_progress(st.session_state.selected_feature_ids)
+                    st.rerun()
+                if st.button("🔍 Scan All Unscanned", use_container_width=True):
+                    with st.spinner("Scanning all unscanned features..."):
+                        run_batch_scan_with_progress(select_feature_ids("unscanned"))
+                    st.rerun()
+                if st.button("🔄 Rescan Changed", use_container_width=True,
+                             help="Scan features whose text, terminology, matching rules, model or prompt "
+                                  "changed since their latest scan (and unscanned ones)"):
+                    with st.spinner("Checking which features changed..."):
+                        try:
+                            changed_ids = select_feature_ids("changed")
+                        except Exception as e:
+                            changed_ids = None
+                            st.error(f"❌ Could not check for changes: {e}")
+                    if changed_ids is not None:
+                        with st.spinner(f"Scanning {len(changed_ids)} changed feature(s)..."):
+                            run_batch_scan_with_progress(changed_ids)
+                        st.rerun()
+
             with select_col3:
                 if st.button("🗑️ Clear Selection", disabled=selected_count == 0):
                     st.session_state.selected_feature_ids = set()
@@ -978,9 +1262,11 @@ def render_list_view():
                     with confirm_col1:
                         if st.button("✅ Yes, Delete", type="primary", use_container_width=True):
                             deleted_features, deleted_scans = delete_features(list(st.session_state.selected_feature_ids))
+                            load_scan_summaries.clear()
                             st.session_state.selected_feature_ids = set()
                             st.session_state.select_all = False
                             st.session_state.show_delete_confirmation = False
+                            st.session_state.feature_pager = {}
                             st.success(f"🗑️ Deleted {deleted_features} features and {deleted_scans} associated scans")
                             st.rerun()
                     with confirm_col2:
@@ -988,19 +1274,26 @@ def render_list_view():
                             st.session_state.show_delete_confirmation = False
                             st.rerun()
 
+            render_batch_report(st.session_state.get("last_batch_report"))
+
             st.divider()
 
-        st.markdown(f"### 📋 Features ({len(filtered_features)} of {len(features)})")
+        first = page * FEATURE_PAGE_SIZE + 1
+        shown = f"{first}-{first + len(filtered_features) - 1}" if filtered_features else "0"
+        if match_count is None:
+            st.markdown(f"### 📋 Features ({shown} matching \"{search_term}\")")
+        else:
+            st.markdown(f"### 📋 Features ({shown} of {match_count})")
 
         for feature in filtered_features:
-            feature_scans = get_scans_for_feature(feature["id"])
+            summary = scan_summaries.get(feature["id"])
             latest_classification = "Not Scanned"
             last_scan_date = "Never"
 
-            if feature_scans:
-                dt = _parse_scan_ts(feature_scans[0])
+            if summary:
+                dt = _parse_scan_ts({"timestamp_utc": summary["latest_timestamp_utc"]})
                 last_scan_date = dt.strftime("%m/%d/%Y") if dt else "N/A"
-                latest_classification = feature_scans[0]['analysis'].get('classification', 'N/A')
+                latest_classification = summary["latest_classification"]
 
             if latest_classification == "YES":
                 status_emoji = "🚨"; status_text = "Needs Compliance"
@@ -1022,7 +1315,8 @@ def render_list_view():
                             st.session_state.selected_feature_ids.add(feature["id"])
                         else:
                             st.session_state.selected_feature_ids.discard(feature["id"])
-                        st.session_state.select_all = len(st.session_state.selected_feature_ids) == len(filtered_features)
+                        if not checkbox_changed:
+                            st.session_state.select_all = False
                         st.rerun()
 
                 with row_col2:
@@ -1039,8 +1333,8 @@ def render_list_view():
                 with row_col4:
                     st.markdown("**Last Scan:**")
                     st.caption(last_scan_date)
-                    if feature_scans:
-                        st.caption(f"({len(feature_scans)} total scans)")
+                    if summary:
+                        st.caption(f"({summary['scan_count']} total scans)")
 
                 with row_col5:
                     if st.button("View →", key=f"view_{feature['id']}", use_container_width=True):
@@ -1048,6 +1342,9 @@ def render_list_view():
                         st.session_state.view = "detail"
                         st.rerun()
 
+        if page > 0 or has_next:
+            render_pager("feature_pager", page, has_next, f"Page {page + 1}")
+
 
 # ==============================================================================
 #                                 MAIN ROUTER
@@ -1087,6 +1384,22 @@ with st.sidebar:
         - `trd`: TRD content/link
         """)
 
+    usage = get_llm_metrics()
+    if usage["calls"]:
+        st.divider()
+        with st.expander("📈 LLM Usage (this server)", expanded=False):
+            from_context_cache = (f" ({usage['context_cache_tokens']:,} billed at the context cache rate)"
+                                  if usage["context_cache_tokens"] else "")
+            st.markdown(
+                f"- Calls: **{usage['calls']}** ({usage['model_calls']} to the model, "
+                f"{usage['cache_hits']} from cache)\n"
+                f"- Tokens billed: **{usage['total_tokens']:,}** "
+                f"({usage['prompt_tokens']:,} prompt, {usage['output_tokens']:,} output)\n"
+                f"- Mean / max prompt: {usage['mean_prompt_tokens']:,.0f} / {usage['max_prompt_tokens']:,} tokens{from_context_cache}\n"
+                f"- Latency p50 / p95: {usage['latency_p50_ms'] or 0:,.0f} / {usage['latency_p95_ms'] or 0:,.0f} ms\n"
+                f"- Retries: {usage['retries']} · Errors: {usage['errors']}"
+            )
+
 # Main content routing
 if st.session_state.view == "list":
     render_list_view()
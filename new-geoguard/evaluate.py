@@ -1,110 +1,190 @@
-import pandas as pd
+import argparse
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
 from dotenv import load_dotenv
 from sklearn.metrics import classification_report, confusion_matrix
 
 # Load environment variables FIRST before importing modules that need them
 load_dotenv()
 
-from src.ai_core import get_ai_analysis, parse_llm_response
+from src.ai_core import analyze_feature
+from src.llm_client import estimate_tokens
+
+TEST_DATA_PATH = os.getenv("EVAL_DATA_PATH", os.path.join("data", "test_data.csv"))
+EVAL_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "4"))
+
+# Accepted column names, in order of preference
+TITLE_COLUMNS = ("feature_title", "feature_name", "title")
+DESCRIPTION_COLUMNS = ("feature_description", "description")
+PRD_COLUMNS = ("feature_prd", "prd")
+TRD_COLUMNS = ("feature_trd", "trd")
+GROUND_TRUTH_COLUMN = "ground_truth"
 
-TEST_DATA_PATH = "../sample-dataset/sample_data.csv"
-RESULTS_OUTPUT_PATH = "../sample-dataset/sample_data_results.csv"
 
-# SPECIFIC TEST CASES TO RUN (1-indexed)
-# Leave empty [] to run all test cases
-# Example: [1, 3, 5] to run only test cases 1, 3, and 5
-SPECIFIC_TEST_CASES = [16,19,20,21,22,23,24,25,26,27,28,29,30]
+def _pick(columns, candidates) -> Optional[str]:
+    return next((c for c in candidates if c in columns), None)
 
+def default_results_path(data_path: str) -> str:
+    root, _ = os.path.splitext(data_path)
+    return f"{root}_results.csv"
 
-def run_evaluation():
-    """Runs the AI analysis on the test dataset and saves results."""
+def load_cases(data_path: str, case_numbers: Optional[List[int]] = None) -> pd.DataFrame:
+    """Test cases with a 1-based `test_case_id`; `case_numbers` limits them to those ids."""
+    df = pd.read_csv(data_path, dtype=str, keep_default_na=False)
+    df.columns = df.columns.str.strip()
+    title_col = _pick(df.columns, TITLE_COLUMNS)
+    desc_col = _pick(df.columns, DESCRIPTION_COLUMNS)
+    prd_col = _pick(df.columns, PRD_COLUMNS)
+    trd_col = _pick(df.columns, TRD_COLUMNS)
+    if not title_col or not desc_col:
+        raise ValueError(f"{data_path}: need a title column {TITLE_COLUMNS} and a description column {DESCRIPTION_COLUMNS}")
+
+    cases = pd.DataFrame({
+        "test_case_id": range(1, len(df) + 1),
+        "feature_name": df[title_col],
+        "feature_description": df[desc_col],
+        "feature_prd": df[prd_col] if prd_col else "",
+        "feature_trd": df[trd_col] if trd_col else "",
+        "ground_truth": df[GROUND_TRUTH_COLUMN].str.strip().str.upper() if GROUND_TRUTH_COLUMN in df.columns else "",
+    })
+    if case_numbers:
+        cases = cases[cases["test_case_id"].isin(case_numbers)]
+    return cases.reset_index(drop=True)
+
+
+def run_case(case: Dict[str, Any], use_cache: bool = True) -> Dict[str, Any]:
+    """Analyse one case; never raises. Token counts are estimated when the audit has none."""
+    started = time.perf_counter()
     try:
-        df = pd.read_csv(TEST_DATA_PATH)
+        result = analyze_feature(feature_topic=case["feature_name"],
+                                 feature_description=case["feature_description"],
+                                 prd=case.get("feature_prd") or None,
+                                 trd=case.get("feature_trd") or None,
+                                 use_cache=use_cache)
+        analysis, audit, error = result.analysis, result.audit, None
+        if not result.ok:
+            error = analysis.get("reasoning") or f"LLM status: {audit.get('status')}"
+    except Exception as e:
+        analysis, audit, error = {}, {}, f"{type(e).__name__}: {e}"
+        result = None
+    latency_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    prompt_tokens = audit.get("prompt_tokens")
+    output_tokens = audit.get("output_tokens")
+    tokens_estimated = audit.get("tokens_source") == "estimate"
+    if prompt_tokens is None and audit.get("prompt_snapshot"):
+        prompt_tokens, tokens_estimated = estimate_tokens(audit["prompt_snapshot"]), True
+    if output_tokens is None and result is not None:
+        output_tokens, tokens_estimated = estimate_tokens(result.raw), True
+
+    predicted = analysis.get("classification", "ERROR") if not error else "ERROR"
+    truth = case.get("ground_truth") or ""
+    return {
+        "test_case_id": case["test_case_id"],
+        "feature_name": case["feature_name"],
+        "feature_description": case["feature_description"],
+        "ground_truth": truth,
+        "predicted_classification": predicted,
+        "correct": (predicted == truth) if truth else None,
+        "reasoning": analysis.get("reasoning", ""),
+        "regulation": analysis.get("regulation", "None"),
+        "triggered_rules": str(analysis.get("triggered_rules", [])),
+        "recommendations": str(analysis.get("recommendations", [])),
+        "status": audit.get("status", "error"),
+        "cache_hit": bool(audit.get("cache_hit")),
+        "latency_ms": latency_ms,
+        "prompt_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+        "tokens_estimated": tokens_estimated,
+        "error": error,
+    }
+
+
+def run_evaluation(data_path: str = TEST_DATA_PATH,
+                   results_path: Optional[str] = None,
+                   case_numbers: Optional[List[int]] = None,
+                   concurrency: int = EVAL_CONCURRENCY,
+                   use_cache: bool = True,
+                   baseline_path: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """
+    Runs the AI analysis on the test dataset concurrently and saves results.
+    Responses come from the on-disk LLM cache when the prompt is unchanged, so a
+    re-run (or a run restarted after being killed) only pays for new prompts.
+    """
+    try:
+        cases = load_cases(data_path, case_numbers)
     except FileNotFoundError:
-        print(f"Error: Test data file not found at {TEST_DATA_PATH}")
-        return
+        print(f"Error: Test data file not found at {data_path}")
+        return None
+    results_path = results_path or default_results_path(data_path)
+    # Read before the results are written: they may go to the same file
+    baseline = load_baseline(baseline_path) if baseline_path else None
+    if baseline is not None and os.path.abspath(results_path) == os.path.abspath(baseline_path):
+        print(f"Note: results will overwrite the baseline {baseline_path} (already read for the diff)")
+    print(f"Running {len(cases)} test cases from {data_path} with concurrency {concurrency}"
+          f"{'' if use_cache else ' (cache disabled)'}\n")
+
+    rows = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [pool.submit(run_case, case, use_cache) for case in cases.to_dict("records")]
+        for n, future in enumerate(as_completed(futures), 1):
+            row = future.result()
+            rows.append(row)
+            mark = "" if row["correct"] is None else (" ✓" if row["correct"] else f" ✗ (expected {row['ground_truth']})")
+            source = "cache" if row["cache_hit"] else f"{row['latency_ms']:.0f} ms"
+            print(f"[{n}/{len(cases)}] case {row['test_case_id']} '{row['feature_name']}': "
+                  f"{row['predicted_classification']}{mark} [{source}]")
+            if row["error"]:
+                print(f"  -> Error: {row['error']}")
 
-    predictions = []
-    detailed_results = []
+    results_df = pd.DataFrame(rows).sort_values("test_case_id").reset_index(drop=True)
+    out_dir = os.path.dirname(results_path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    results_df.to_csv(results_path, index=False)
 
-    # Filter test cases if specific ones are requested
-    if SPECIFIC_TEST_CASES:
-        # Convert to 0-indexed for pandas
-        test_indices = [i - 1 for i in SPECIFIC_TEST_CASES if 1 <= i <= len(df)]
-        df_filtered = df.iloc[test_indices].reset_index(drop=True)
-        print(f"Running specific test cases: {SPECIFIC_TEST_CASES}")
-        print(f"Total test cases to run: {len(df_filtered)}")
+    print(f"\n--- Results saved to {results_path} ---")
+    print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print_run_summary(results_df)
+
+    labelled = results_df[results_df["ground_truth"] != ""]
+    if len(labelled):
+        print(f"\n--- Classification Report ({len(labelled)} labelled cases) ---")
+        calculate_metrics(list(labelled["ground_truth"]), list(labelled["predicted_classification"]))
     else:
-        df_filtered = df
-        print(f"Running all test cases: {len(df_filtered)}")
-
-    print("Note: Using sample data without ground truth labels - running AI analysis only\n")
-
-    for index, row in df_filtered.iterrows():
-        # Calculate original test case number
-        if SPECIFIC_TEST_CASES:
-            original_case_num = SPECIFIC_TEST_CASES[index]
-        else:
-            original_case_num = index + 1
-            
-        print(f"[*] Running test case {original_case_num}: '{row['feature_name']}'")
-
-        # Use the feature description for analysis
-        full_feature_text = f"""
-        Feature Name: {row['feature_name']}
-        Feature Description: {row['feature_description']}
-        """
-
-        # Use the AI analysis
-        raw_response = get_ai_analysis(full_feature_text)
-        parsed_response = parse_llm_response(raw_response)
-        predicted = parsed_response["classification"]
-        predictions.append(predicted)
-
-        print(f"  -> Predicted: {predicted}")
-        print(f"  -> Reasoning: {parsed_response.get('reasoning', 'No reasoning provided')[:100]}...")
-        print(f"  -> Regulation: {parsed_response.get('regulation', 'None')}\n")
-
-        # Collect detailed results for CSV output
-        detailed_results.append({
-            "test_case_id": original_case_num,
-            "feature_name": row['feature_name'],
-            "feature_description": row['feature_description'],
-            "predicted_classification": predicted,
-            "confidence": parsed_response.get("confidence", 0.0),
-            "reasoning": parsed_response.get("reasoning", ""),
-            "regulation": parsed_response.get("regulation", "None"),
-            "triggered_rules": str(parsed_response.get("triggered_rules", [])),
-            "recommendations": str(parsed_response.get("recommendations", []))
-        })
-
-    # Save detailed results to CSV
-    results_df = pd.DataFrame(detailed_results)
-    
-    # Add timestamp and summary statistics
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # Count classifications
-    classification_counts = {}
-    for pred in predictions:
-        classification_counts[pred] = classification_counts.get(pred, 0) + 1
-    
-    # Create output directory if it doesn't exist
-    os.makedirs(os.path.dirname(RESULTS_OUTPUT_PATH), exist_ok=True)
-    
-    # Save results
-    results_df.to_csv(RESULTS_OUTPUT_PATH, index=False)
-    
-    print(f"\n--- Results saved to {RESULTS_OUTPUT_PATH} ---")
-    print(f"Timestamp: {timestamp}")
-    print(f"Total test cases: {len(detailed_results)}")
-    print(f"Classification breakdown:")
-    for classification, count in classification_counts.items():
-        percentage = (count / len(predictions)) * 100
-        print(f"  {classification}: {count} ({percentage:.1f}%)")
-    print()
+        print("\nNo ground_truth column/labels - skipping accuracy metrics")
+
+    if baseline is not None:
+        diff_against_baseline(results_df, baseline_path, baseline)
+    return results_df
+
+
+def print_run_summary(results_df: pd.DataFrame) -> None:
+    total = len(results_df)
+    if not total:
+        return
+    print(f"Total test cases: {total}")
+    print("Classification breakdown:")
+    for classification, count in results_df["predicted_classification"].value_counts().items():
+        print(f"  {classification}: {count} ({count / total * 100:.1f}%)")
+
+    hits = int(results_df["cache_hit"].sum())
+    live = results_df[~results_df["cache_hit"]]["latency_ms"]
+    print(f"Cache hits: {hits}/{total}")
+    if len(live):
+        print(f"Latency (uncached): p50 {live.quantile(0.5):.0f} ms, p95 {live.quantile(0.95):.0f} ms, "
+              f"max {live.max():.0f} ms")
+    prompt_tokens = pd.to_numeric(results_df["prompt_tokens"], errors="coerce")
+    output_tokens = pd.to_numeric(results_df["output_tokens"], errors="coerce")
+    estimated = " (estimated)" if results_df["tokens_estimated"].any() else ""
+    print(f"Tokens{estimated}: prompt {int(prompt_tokens.sum()):,} "
+          f"(mean {prompt_tokens.mean():.0f}), output {int(output_tokens.sum()):,}")
+
 
 def calculate_metrics(y_true, y_pred):
     """Calculates and prints a full classification report."""
@@ -118,5 +198,64 @@ def calculate_metrics(y_true, y_pred):
     cm_df = pd.DataFrame(cm, index=[f"True_{l}" for l in labels], columns=[f"Pred_{l}" for l in labels])
     print(cm_df)
 
+
+def load_baseline(baseline_path: str) -> Optional[pd.DataFrame]:
+    try:
+        return pd.read_csv(baseline_path, dtype=str, keep_default_na=False)
+    except FileNotFoundError:
+        print(f"\nBaseline not found at {baseline_path} - skipping diff")
+        return None
+
+
+def diff_against_baseline(results_df: pd.DataFrame, baseline_path: str,
+                          baseline: Optional[pd.DataFrame] = None) -> Optional[pd.DataFrame]:
+    """
+    Prints cases whose prediction changed since a previous results file (matched on
+    test_case_id). Pass `baseline` when it was read earlier, e.g. before being overwritten.
+    """
+    if baseline is None:
+        baseline = load_baseline(baseline_path)
+        if baseline is None:
+            return None
+
+    base = baseline[["test_case_id", "predicted_classification"]].rename(
+        columns={"predicted_classification": "baseline_classification"})
+    base["test_case_id"] = pd.to_numeric(base["test_case_id"], errors="coerce")
+    merged = results_df.merge(base, on="test_case_id", how="left")
+    compared = merged[merged["baseline_classification"].notna()]
+    changed = compared[compared["baseline_classification"] != compared["predicted_classification"]]
+
+    print(f"\n--- Diff vs baseline {baseline_path} ---")
+    print(f"Compared {len(compared)} cases, {len(changed)} changed")
+    for _, row in changed.iterrows():
+        verdict = ""
+        if row["ground_truth"]:
+            was_right = row["baseline_classification"] == row["ground_truth"]
+            verdict = " FIXED" if row["correct"] and not was_right else (" REGRESSED" if was_right else "")
+        print(f"  case {row['test_case_id']} '{row['feature_name']}': "
+              f"{row['baseline_classification']} -> {row['predicted_classification']}{verdict}")
+
+    labelled = compared[compared["ground_truth"] != ""]
+    if len(labelled):
+        before = (labelled["baseline_classification"] == labelled["ground_truth"]).mean()
+        after = (labelled["predicted_classification"] == labelled["ground_truth"]).mean()
+        print(f"Accuracy: {before:.1%} -> {after:.1%} ({(after - before) * 100:+.1f} pts)")
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the LLM classifier against a labelled dataset")
+    parser.add_argument("--data", default=TEST_DATA_PATH, help=f"test cases CSV (default {TEST_DATA_PATH})")
+    parser.add_argument("--output", help="results CSV (default: <data>_results.csv)")
+    parser.add_argument("--cases", type=int, nargs="+", metavar="N", help="1-based test case ids to run")
+    parser.add_argument("--concurrency", type=int, default=EVAL_CONCURRENCY,
+                        help=f"LLM calls in flight (default {EVAL_CONCURRENCY})")
+    parser.add_argument("--no-cache", action="store_true", help="always call the model")
+    parser.add_argument("--baseline", help="previous results CSV to diff predictions against")
+    args = parser.parse_args()
+    run_evaluation(args.data, args.output, args.cases, args.concurrency,
+                   use_cache=not args.no_cache, baseline_path=args.baseline)
+
+
 if __name__ == "__main__":
-    run_evaluation()
\ No newline at end of file
+    main()
@@ -0,0 +1,206 @@
+# geoguard.py
+"""
+Headless command line for GeoGuard.
+
+    python -m geoguard scan --select unscanned --output scans.jsonl
+    python -m geoguard scan --ids 3f2a... 9bc1... --concurrency 8
+    python -m geoguard scan --csv features.csv --output scans.jsonl --resume
+    python -m geoguard scan --rules us_ut_minor_protection --output scans.jsonl
+
+Each finished feature is written to the output as one JSON line once its scan
+is saved in Supabase. With --resume, features already recorded as "ok" in the
+output file are skipped and new lines are appended, so a killed job can be
+restarted without redoing finished work.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from dotenv import load_dotenv
+
+# Load environment variables FIRST before importing modules that need them
+load_dotenv()
+
+from src.batch_scan import (  # noqa: E402
+    BATCH_SCAN_CONCURRENCY,
+    BATCH_SCAN_PERSIST_CHUNK,
+    SELECTIONS,
+    run_batch_scan,
+    select_feature_ids,
+)
+from src.rule_impact import find_rule_impact  # noqa: E402
+
+ID_COLUMNS = ("id", "feature_id")
+
+
+# ============================ Selection =============================
+def _ids_from_csv(path: str) -> List[str]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        columns = {(c or "").strip(): c for c in reader.fieldnames or []}
+        column = next((columns[c] for c in ID_COLUMNS if c in columns), None)
+        if column is None:
+            raise ValueError(f"{path}: expected a column named one of {ID_COLUMNS}")
+        return [row[column].strip() for row in reader if (row.get(column) or "").strip()]
+
+def _ids_from_file(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+def resolve_feature_ids(args: argparse.Namespace) -> List[str]:
+    """Union of all selectors given on the command line, in first-seen order."""
+    ids: List[str] = []
+    if args.ids:
+        ids.extend(args.ids)
+    if args.ids_file:
+        ids.extend(_ids_from_file(args.ids_file))
+    if args.csv:
+        ids.extend(_ids_from_csv(args.csv))
+    if args.select:
+        ids.extend(select_feature_ids(args.select, stale_days=args.stale_days))
+    if args.rules:
+        ids.extend(a["feature_id"] for a in find_rule_impact(args.rules))
+    ids = list(dict.fromkeys(ids))
+    if args.limit:
+        ids = ids[:args.limit]
+    return ids
+
+
+# ============================ Checkpoint ============================
+def load_checkpoint(path: str) -> Set[str]:
+    """Feature ids recorded with status "ok" in an existing JSONL output."""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short when the previous run was killed
+            if record.get("status") == "ok" and record.get("feature_id"):
+                done.add(record["feature_id"])
+    return done
+
+class JsonlWriter:
+    """Appends result records and flushes them to disk after every batch."""
+
+    def __init__(self, path: str, append: bool):
+        self.path = path
+        if path == "-":
+            self._file = sys.stdout
+        else:
+            self._file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, items: List[Dict[str, Any]]) -> None:
+        now = datetime.now(timezone.utc).isoformat()
+        for item in items:
+            record = {k: v for k, v in item.items() if not k.startswith("_")}
+            record["finished_at_utc"] = now
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        if self._file is not sys.stdout:
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+# ============================== Scan ================================
+def cmd_scan(args: argparse.Namespace) -> int:
+    if args.resume and args.output == "-":
+        print("--resume needs --output FILE to read the checkpoint from", file=sys.stderr)
+        return 2
+
+    try:
+        ids = resolve_feature_ids(args)
+    except (OSError, ValueError) as e:
+        print(f"Could not resolve features: {e}", file=sys.stderr)
+        return 2
+
+    skipped = 0
+    if args.resume:
+        done = load_checkpoint(args.output)
+        skipped = sum(1 for fid in ids if fid in done)
+        ids = [fid for fid in ids if fid not in done]
+
+    print(f"Scanning {len(ids)} features ({skipped} already done) "
+          f"with concurrency {args.concurrency}", file=sys.stderr)
+    if args.dry_run:
+        for fid in ids:
+            print(fid)
+        return 0
+    if not ids:
+        return 0
+
+    writer = JsonlWriter(args.output, append=args.resume)
+
+    def _on_progress(done: int, total: int, item: Dict[str, Any]) -> None:
+        if args.quiet:
+            return
+        label = item.get("classification") if item["status"] == "ok" else f"ERROR {item.get('error')}"
+        print(f"[{done}/{total}] {item['feature_id']} {item.get('title', '')!r}: {label}", file=sys.stderr)
+
+    try:
+        report = run_batch_scan(
+            ids,
+            concurrency=args.concurrency,
+            persist_chunk_size=args.persist_chunk,
+            on_progress=_on_progress,
+            on_persisted=writer.write,
+        )
+    finally:
+        writer.close()
+
+    print(f"Done: {report['succeeded']} succeeded, {report['failed']} failed "
+          f"(of {report['total']})", file=sys.stderr)
+    return 0 if report["failed"] == 0 else 1
+
+
+# =============================== CLI ================================
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m geoguard", description="GeoGuard headless tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    scan = sub.add_parser("scan", help="Scan features and save the results as scans")
+    sel = scan.add_argument_group("feature selection (combined as a union)")
+    sel.add_argument("--ids", nargs="+", metavar="ID", help="feature ids to scan")
+    sel.add_argument("--ids-file", metavar="FILE", help="file with one feature id per line")
+    sel.add_argument("--csv", metavar="FILE", help=f"CSV with a feature id column ({' or '.join(ID_COLUMNS)})")
+    sel.add_argument("--select", choices=SELECTIONS, help="features by scan status")
+    sel.add_argument("--stale-days", type=float, default=None,
+                     help="age after which a scan counts as stale (with --select stale)")
+    sel.add_argument("--rules", nargs="+", metavar="RULE_ID",
+                     help="features whose latest scan cited or was sent these rules, or that would be matched to them now")
+    sel.add_argument("--limit", type=int, default=0, help="scan at most this many features")
+
+    scan.add_argument("--concurrency", type=int, default=BATCH_SCAN_CONCURRENCY,
+                      help=f"LLM calls in flight (default {BATCH_SCAN_CONCURRENCY})")
+    scan.add_argument("--persist-chunk", type=int, default=BATCH_SCAN_PERSIST_CHUNK,
+                      help=f"scans saved per insert (default {BATCH_SCAN_PERSIST_CHUNK})")
+    scan.add_argument("--output", "-o", default="-", metavar="FILE",
+                      help="JSONL results file (default: stdout)")
+    scan.add_argument("--resume", action="store_true",
+                      help="skip features already 'ok' in --output and append to it")
+    scan.add_argument("--dry-run", action="store_true", help="print the selected ids and exit")
+    scan.add_argument("--quiet", "-q", action="store_true", help="no per-feature progress on stderr")
+    scan.set_defaults(func=cmd_scan)
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "scan" and not (args.ids or args.ids_file or args.csv or args.select or args.rules):
+        parser.error("scan: give at least one of --ids, --ids-file, --csv, --select or --rules")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
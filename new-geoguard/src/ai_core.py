@@ -1,14 +1,29 @@
 # src/ai_core.py
 from __future__ import annotations
 
+import asyncio
 import json
 import os
 import re
 import uuid
 import hashlib
+import threading
+import time
+import warnings
+from contextvars import ContextVar
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
-from .db_utils import get_all_legal_rules, get_all_terminology
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from .db_utils import get_cached_legal_rules
+from .terminology import get_terminology_snapshot
+from .rule_index import get_rule_index
+from .jurisdictions import extract_locations
+from .llm_cache import get_response_cache, make_cache_key
+from .llm_client import GeminiClient, estimate_tokens, is_transient_error
+from .llm_metrics import LLM_METRICS
+from .prompt_budget import PROMPT_MIN_RULES, PROMPT_TOKEN_BUDGET, Section, fit_prompt
+from .prompts import DEFAULT_PROMPT_VERSION, get_prompt_template
+from .artifacts import ARTIFACT_TOKEN_BUDGET, select_artifacts
+from .context_cache import make_context_cache
 
 
 from dotenv import load_dotenv
@@ -21,21 +36,26 @@ load_dotenv()
 # NOTE: matches your current file (uses GEMINI_API_KEY)
 GOOGLE_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
-LEGAL_DB_PATH = os.getenv("LEGAL_DB_PATH", os.path.join("data", "legal_db.json"))
 
 GEN_TEMPERATURE = float(os.getenv("GEN_TEMPERATURE", "0.1"))
 GEN_MAX_TOKENS   = int(os.getenv("GEN_MAX_TOKENS", "1200"))
 
 # Pass a shortlist of rules to the LLM (set 0 to pass all)
 RULES_TOP_K = int(os.getenv("RULES_TOP_K", "12"))
+# Only rank rules whose jurisdiction relates to locations named in the feature
+RULES_JURISDICTION_PREFILTER = os.getenv("RULES_JURISDICTION_PREFILTER", "1").strip().lower() not in ("0", "false", "no", "off")
+
+# Prompt template revision (see prompts.py); recorded on every scan, so changing it marks scans as stale
+PROMPT_VERSION = os.getenv("PROMPT_VERSION", DEFAULT_PROMPT_VERSION).strip()
 
 # -------- Audit behaviour (no file writes; only return meta to DB) --------
 # Kept as flags for UI display, but we never write snapshots to disk.
 PROMPT_INCLUDED_IN_AUDIT  = True
 CONTEXT_INCLUDED_IN_AUDIT = True
 
-# Module-level cache so callers can fetch metadata to store in DB
-_LAST_AUDIT_META: Optional[Dict[str, Any]] = None
+# Backs the deprecated get_last_audit_meta() shim only; analyze_feature() returns
+# the audit with its result. A ContextVar keeps legacy callers per thread / task.
+_LAST_AUDIT_META: ContextVar[Optional[Dict[str, Any]]] = ContextVar("_LAST_AUDIT_META", default=None)
 
 
 # ============================ Utilities =============================
@@ -45,12 +65,6 @@ def _sha256_bytes(b: bytes) -> str:
 def _sha256_text(s: str) -> str:
     return _sha256_bytes((s or "").encode("utf-8"))
 
-def _file_sha256(path: str) -> str:
-    try:
-        with open(path, "rb") as f:
-            return _sha256_bytes(f.read())
-    except Exception:
-        return "unavailable"
 
 
 # ======================= Model init (Gemini) ========================
@@ -64,6 +78,10 @@ def _init_model() -> Optional[genai.GenerativeModel]:
         return None
 
 _MODEL = _init_model()
+# Shared call layer: rate limits, timeouts, retries with backoff
+_CLIENT = GeminiClient(_MODEL) if _MODEL else None
+# Optional cached-content handle for the prompt head (GEMINI_CONTEXT_CACHE, see context_cache.py)
+_CONTEXT_CACHE = make_context_cache(base_model=_MODEL) if _MODEL else None
 
 
 # ===================== Legal DB & Rule Selection =====================
@@ -93,9 +111,6 @@ def _derive_keywords(title: str, summary: str, limit: int = 10) -> List[str]:
             break
     return out
 
-def _severity_weight(sev: str) -> int:
-    return {"critical": 4, "high": 3, "medium": 2, "low": 1}.get((sev or "").lower(), 2)
-
 def _normalize_rule(obj_key: str, value: Any) -> Optional[Dict[str, Any]]:
     if not isinstance(value, dict):
         value = {"summary": str(value)}
@@ -110,25 +125,14 @@ def _normalize_rule(obj_key: str, value: Any) -> Optional[Dict[str, Any]]:
     return value
 
 def _load_legal_context() -> List[Dict[str, Any]]:
-    return get_all_legal_rules()
-
-def _score_rule(rule: Dict[str, Any], text_lc: str) -> float:
-    hits = 0
-    for kw in rule.get("keywords", []) or []:
-        if isinstance(kw, str) and kw.lower() in text_lc:
-            hits += 2
-    for f in ("id", "title"):
-        val = str(rule.get(f, "")).lower()
-        if val and val in text_lc:
-            hits += 1
-    return hits + 0.1 * _severity_weight(rule.get("severity", "medium"))
-
-def _select_relevant_rules(feature_text: str, rules: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
-    text_lc = (feature_text or "").lower()
-    ranked = sorted(rules, key=lambda r: _score_rule(r, text_lc), reverse=True)
-    if top_k <= 0 or top_k >= len(rules):  # pass all
-        return ranked
-    return ranked[:top_k]
+    # Shared in-memory snapshot (TTL + version probe); see db_utils.
+    return get_cached_legal_rules()
+
+def _select_relevant_rules(feature_text: str, rules: List[Dict[str, Any]], top_k: int,
+                           locations: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    # Inverted keyword index, built once per rules snapshot (see rule_index.py).
+    # With locations, rules for unrelated jurisdictions are dropped before ranking.
+    return get_rule_index(rules).select(feature_text, top_k, locations)
 
 def _context_block(rules: List[Dict[str, Any]]) -> str:
     return "\n".join(
@@ -138,117 +142,63 @@ def _context_block(rules: List[Dict[str, Any]]) -> str:
 
 
 # ==================== Terminology (acronym/codename) =================
-def _load_terminology() -> Dict[str, str]:
-    try:
-        # Fetch from the database via db_utils
-        data = get_all_terminology()
-        # Convert the list of dicts to a single dict for fast lookups
-        return {item['term']: item['expansion'] for item in data}
-    except Exception:
-        return {}
-
-_TERMINOLOGY = _load_terminology()
-
-def _expand_terminology_text(text: str, terms: Dict[str, str]) -> Tuple[str, List[Dict[str, Any]]]:
-    if not text or not terms:
-        return text or "", []
-    replaced_meta: List[Dict[str, Any]] = []
-    for key in sorted(terms.keys(), key=lambda s: len(s), reverse=True):
-        expansion = terms[key]
-        pattern = re.compile(rf"(?<![A-Za-z0-9])({re.escape(key)})(?![A-Za-z0-9])", re.IGNORECASE)
-        def _repl(m: re.Match) -> str:
-            token = m.group(1)
-            return f"{token} ({expansion})"
-        new_text, count = pattern.subn(_repl, text)
-        if count > 0:
-            replaced_meta.append({"term": key, "expansion": expansion, "count": count})
-            text = new_text
-    return text, replaced_meta
+def _feature_sections(feature_text: str,
+                      feature_topic: Optional[str],
+                      feature_description: Optional[str]) -> List[Section]:
+    if feature_topic or feature_description:
+        return [("Title", feature_topic or ""), ("Description", feature_description or "")]
+    return [(None, feature_text or "")]
+
+def _render_feature_sections(sections: List[Section]) -> str:
+    return "\n\n".join(f"{label}: {text}" if label else text for label, text in sections).strip()
 
 def _prepare_feature_text(feature_text: str,
                           feature_topic: Optional[str],
-                          feature_description: Optional[str]) -> Tuple[str, Dict[str, Any]]:
-    if feature_topic or feature_description:
-        raw = f"Title: {feature_topic or ''}\n\nDescription: {feature_description or ''}".strip()
-    else:
-        raw = feature_text or ""
-    expanded, replacements = _expand_terminology_text(raw, _TERMINOLOGY)
+                          feature_description: Optional[str],
+                          artifacts: Optional[List[Section]] = None,
+                          ) -> Tuple[List[Section], List[Section], Dict[str, Any]]:
+    """Terminology-expanded feature sections and artifacts (PRD/TRD), in prompt order."""
+    version, _terms, expander = get_terminology_snapshot()
+    replacements: List[Dict[str, Any]] = []
+
+    def _expand(items: List[Section]) -> List[Section]:
+        out = []
+        for label, text in items:
+            expanded, applied = expander.expand(text)
+            out.append((label, expanded))
+            replacements.extend(applied)
+        return out
+
+    sections = _expand(_feature_sections(feature_text, feature_topic, feature_description))
+    expanded_artifacts = _expand([(name, text) for name, text in artifacts or [] if (text or "").strip()])
     meta = {
         "terminology_applied": replacements,  # not stored in DB; just useful for debugging if needed
+        "terminology_version": version,
     }
-    return expanded, meta
+    return sections, expanded_artifacts, meta
 
 
 # ============================ Prompt ================================
-def _build_master_prompt(feature_text_normalized: str, rules: List[Dict[str, Any]]) -> str:
+# Versioned templates live in prompts.py; the one in use is compiled once at import.
+_PROMPT_TEMPLATE = get_prompt_template(PROMPT_VERSION)
+
+def _prompt_fields(feature_text_normalized: str, rules: List[Dict[str, Any]]) -> Dict[str, str]:
     allowed_ids = [str(r.get("id", "")) for r in rules if r.get("id")]
-    allowed_ids_csv = ", ".join(allowed_ids) if allowed_ids else "None"
-    context_text = _context_block(rules)
-
-    return f"""
-You are a legal compliance analysis AI for a global tech company.
-
-Your task: determine if the feature requires geo-specific **legal** compliance logic.
-Always distinguish **legal obligations** from **business decisions** (e.g., market testing is a business decision, not a legal requirement).
-
-STRICT CONSTRAINTS (follow exactly):
-1) You **MUST** base your reasoning and any regulation citation **ONLY** on the "REFERENCE LEGAL CONTEXT" below.
-2) You **MUST NOT** invent or reference any law/regulation that is not present in the "REFERENCE LEGAL CONTEXT".
-3) If the feature artifacts **explicitly mention** a law/regulation that is **NOT** present in the context, your classification **MUST** be "UNSURE".
-   Your reasoning **MUST** state that a potential legal requirement was found but is not in your knowledge base **without naming it**.
-
-LOCATION → JURISDICTION APPLICATION (do this within your reasoning):
-A) Identify the **implementation location** of the feature (where it is deployed/hosted/rolled out). Prefer explicit statements such as
-   country/state/province/city, cloud region names (e.g., "us-east-1" ⇒ United States), or phrases like "US-only rollout", "available in India".
-B) If multiple locations are present, pick the **most specific** for analysis (state/province > country > regional bloc). If both implementation
-   location and general references exist, **prioritize the implementation location**.
-C) Apply rules **only when their jurisdiction equals, contains, or is contained by** the implementation location:
-   - If a **state/province** is given and you have both state and country rules, prefer the **state** rule(s); country/region rules may also apply.
-   - If only country-level rules exist for that location, those may apply to a state-level implementation.
-D) If **no implementation location is stated**, your classification **MUST** be "UNSURE", "regulation" must be "None", and the reasoning must say
-   that a location is required to determine legality for a jurisdiction.
-E) If a location is stated but **no matching rule** exists in the reference context, classification **MUST** be "UNSURE" with "regulation":"None"
-   and reasoning noting that the relevant jurisdiction is not represented in the context.
-
-BUSINESS-DECISION HEURISTIC (apply before citing any rule):
-- If the feature is **only** a market-availability / rollout gate (e.g., "market testing", "US-only access", geofence-based availability)
-  and the description **does not** state any of the following:
-  (i) collection/retention of precise location or other personal data,
-  (ii) targeted advertising, profiling, or geofence-triggered messaging,
-  (iii) handling of user-generated content or content moderation duties,
-  (iv) impacts on children/minors,
-  then classify **"NO"**. Set "regulation" to **"None"**. In your reasoning, clearly state this is a **business rollout decision** rather than a legal requirement.
-- Only if the description **does** state one of (i)–(iv) should you consider applicable rules for the declared jurisdiction(s).
-
-CITATION RULES:
-- Valid rule ids: {allowed_ids_csv}
-- When you cite a rule, use its **id** exactly as given.
-- Do **not** restate or enumerate the entire REFERENCE LEGAL CONTEXT in your reasoning.
-- Mention **only** rules you actually cite in "regulation" or "triggered_rules".
-
-REFERENCE LEGAL CONTEXT:
-{context_text}
-
-FEATURE ARTIFACTS TO ANALYZE (terminology expanded inline):
-{feature_text_normalized}
-
-### OUTPUT FORMAT
-Return **only** a single valid JSON object with these keys:
-- "classification": "YES" | "NO" | "UNSURE"
-- "reasoning": plain-English rationale focused on the implementation location and rule applicability
-- "regulation": one allowed rule id from the context above OR "None"
-Optional:
-- "triggered_rules": [ {{ "rule_id": <allowed id>, "verdict": "violated"|"not_applicable"|"unclear", "explanation": str }} ]
-- "recommendations": [ str, ... ]
-
-### FINAL SELF-CHECK (must pass before you output)
-- If the feature is only a market-availability toggle and none of (i)–(iv) are stated, the output is **"classification":"NO", "regulation":"None"**.
-- The reasoning does **not** list or enumerate the REFERENCE LEGAL CONTEXT (no phrases like "the reference context includes ...").
-- The reasoning has **no dangling fragments** such as "The reference ..." and is grammatically complete.
-- The reasoning does **not** mention any law name, acronym, bill number, or code **outside** the allowed ids above.
-  If you needed an external law, switch to **"UNSURE"** and state the law is outside the provided context **without naming it**.
-- The JSON has **no extra text**, no trailing commas, and all strings are complete sentences.
-""".strip()
+    return {
+        "allowed_ids_csv": ", ".join(allowed_ids) if allowed_ids else "None",
+        "context_text": _context_block(rules),
+        "feature_text_normalized": feature_text_normalized,
+    }
+
+def _build_master_prompt(feature_text_normalized: str, rules: List[Dict[str, Any]]) -> str:
+    return _PROMPT_TEMPLATE.render(_prompt_fields(feature_text_normalized, rules))
+
+# With the context cache on, everything before the feature text (instructions and
+# the whole legal DB) is the same for every call and lives in the cached head.
+_FEATURE_SLOT = "feature_text_normalized"
+
+def _split_master_prompt(feature_text_normalized: str, rules: List[Dict[str, Any]]) -> Tuple[str, str]:
+    return _PROMPT_TEMPLATE.render_split(_prompt_fields(feature_text_normalized, rules), _FEATURE_SLOT)
 
 
 # ========================= JSON helpers ============================
@@ -264,6 +214,19 @@ def _try_json_load(s: str) -> Optional[Dict[str, Any]]:
     except Exception:
         return None
 
+def _load_llm_json(response_text: str) -> Optional[Dict[str, Any]]:
+    """The JSON object in a model answer (code fences and surrounding prose allowed), or None."""
+    text = response_text.strip()
+    # Strip code fences if the model returns ```json ... ```
+    if "```json" in text:
+        try:
+            text = text.split("```json", 1)[1].split("```", 1)[0]
+        except Exception:
+            pass
+    elif text.startswith("```") and text.endswith("```"):
+        text = text.strip("`")
+    return _try_json_load(text) or _try_json_load(_extract_json(text) or "")
+
 
 # ====================== Rules fingerprint ==========================
 def _rules_fingerprint(rules: List[Dict[str, Any]]) -> str:
@@ -276,86 +239,251 @@ def _rules_fingerprint(rules: List[Dict[str, Any]]) -> str:
     } for r in sorted(rules, key=lambda x: x.get("id", ""))]
     return _sha256_text(json.dumps(canon, ensure_ascii=False, separators=(",", ":")))
 
+# Fingerprint of the whole legal DB, computed once per cached rules snapshot.
+# Snapshots are replaced (never mutated) on refresh, so list identity is the version.
+_LEGAL_DB_FP: Dict[str, Any] = {"rules": None, "fingerprint": None}
+_LEGAL_DB_FP_LOCK = threading.Lock()
 
-# =========================== Public API ============================
-def get_ai_analysis(feature_text: str,
-                    feature_topic: Optional[str] = None,
-                    feature_description: Optional[str] = None) -> str:
+def _legal_db_fingerprint(rules: List[Dict[str, Any]]) -> str:
+    with _LEGAL_DB_FP_LOCK:
+        if _LEGAL_DB_FP["rules"] is not rules:
+            _LEGAL_DB_FP["fingerprint"] = _rules_fingerprint(rules)
+            _LEGAL_DB_FP["rules"] = rules
+        return _LEGAL_DB_FP["fingerprint"]
+
+
+# ======================= Input fingerprint =========================
+def _input_text_hash(feature_text: str, feature_topic: Optional[str], feature_description: Optional[str],
+                     prd: Optional[str], trd: Optional[str]) -> str:
+    parts = [feature_text or "", feature_topic or "", feature_description or "", prd or "", trd or ""]
+    return _sha256_text(json.dumps(parts, ensure_ascii=False))
+
+def _input_fingerprint(text_hash: str, terminology_version: Optional[str],
+                       rule_ids: List[Any], rules_fingerprint: str) -> str:
     """
-    Calls Gemini with strict prompt + low temperature and returns the model's raw JSON text.
-    No files are written. Minimal audit metadata is cached via get_last_audit_meta()
-    so the caller can append it into database.json.
+    Everything that decides a scan's outcome apart from the model's sampling: feature
+    text, terminology version, the rules it is matched against (ids + content), model,
+    prompt version and the budgets. `rule_ids` is the ranked shortlist before budget
+    trimming (the trimmed one follows from it and the budgets), or the whole legal DB
+    when it is sent in a cached prompt head, so no prompt has to be built.
     """
-    global _LAST_AUDIT_META
-    _LAST_AUDIT_META = None
-
-    audit_id = str(uuid.uuid4())
-    normalized_text, _feature_meta = _prepare_feature_text(feature_text, feature_topic, feature_description)
+    canon = {
+        "text": text_hash,
+        "terminology_version": terminology_version,
+        "rule_ids": rule_ids,
+        "rules_fingerprint": rules_fingerprint,
+        "model": GEMINI_MODEL,
+        "prompt_version": PROMPT_VERSION,
+        "budgets": [PROMPT_TOKEN_BUDGET, PROMPT_MIN_RULES, ARTIFACT_TOKEN_BUDGET],
+    }
+    return _sha256_text(json.dumps(canon, sort_keys=True, ensure_ascii=False, separators=(",", ":")))
 
-        # Build rule context
-    all_rules = _load_legal_context()
-    selected_rules = _select_relevant_rules(normalized_text, all_rules, RULES_TOP_K)
-    rules_ctx_ids = [r.get("id") for r in selected_rules]
-    rules_ctx_fp  = _rules_fingerprint(selected_rules)
-    legal_db_fp   = _file_sha256(LEGAL_DB_PATH)
 
-    # Build prompt + (optional) snapshots
-    context_snapshot_text = _context_block(selected_rules)  # used for optional audit snapshot
-    prompt = _build_master_prompt(normalized_text, selected_rules)
+# =========================== Public API ============================
+def _generation_config_dict() -> Dict[str, Any]:
+    return {
+        "temperature": GEN_TEMPERATURE,
+        "max_output_tokens": GEN_MAX_TOKENS,
+        "candidate_count": 1,
+        "response_mime_type": "application/json",
+        "response_schema": RESPONSE_SCHEMA,
+    }
 
-    # Config
-    generation_config = gen_types.GenerationConfig(
-        temperature=GEN_TEMPERATURE,
-        max_output_tokens=GEN_MAX_TOKENS,
-        candidate_count=1,
-        response_mime_type="application/json",
-        response_schema=RESPONSE_SCHEMA,
+def _failure_response(reasoning: str) -> str:
+    return json.dumps({
+        "classification": "UNSURE",
+        "reasoning": reasoning,
+        "regulation": "None",
+        "triggered_rules": [],
+        "recommendations": []
+    })
+
+def _prepare_call(feature_text: str,
+                  feature_topic: Optional[str],
+                  feature_description: Optional[str],
+                  use_cache: bool,
+                  prd: Optional[str] = None,
+                  trd: Optional[str] = None) -> Dict[str, Any]:
+    """Everything up to the model call: text, rule context, prompt, config, cache key."""
+    sections, artifacts, feature_meta, all_rules, locations, selected_rules = _rank_rules(
+        feature_text, feature_topic, feature_description, prd, trd,
+    )
+    text_hash = _input_text_hash(feature_text, feature_topic, feature_description, prd, trd)
+    terminology_version = feature_meta.get("terminology_version")
+    shortlist_fingerprint = _input_fingerprint(
+        text_hash, terminology_version, [r.get("id") for r in selected_rules], _rules_fingerprint(selected_rules),
     )
 
-    def _base_meta(status: str, raw_hash: Optional[str] = None) -> Dict[str, Any]:
-        meta = {
-            "audit_id": audit_id,
-            "status": status,
-            "model": GEMINI_MODEL,
-            "legal_db_fingerprint": legal_db_fp,
-            "rules_context_ids": rules_ctx_ids,
-            "rules_context_fingerprint": rules_ctx_fp,
-            "prompt_included": PROMPT_INCLUDED_IN_AUDIT,
-            "context_text_included": CONTEXT_INCLUDED_IN_AUDIT,
-        }
-        if raw_hash is not None:
-            meta["raw_output_hash"] = raw_hash
-        # Snapshots only when flags are enabled
-        if PROMPT_INCLUDED_IN_AUDIT:
-            meta["prompt_snapshot"] = prompt
-        if CONTEXT_INCLUDED_IN_AUDIT:
-            meta["context_snapshot"] = context_snapshot_text
-        return meta
-
-    if not _MODEL:
-        _LAST_AUDIT_META = _base_meta(status="error")
-        return json.dumps({
-            "classification": "UNSURE",
-            "reasoning": "[MODEL_NOT_CONFIGURED] Missing GEMINI_API_KEY.",
-            "regulation": "None",
-            "triggered_rules": [],
-            "recommendations": []
-        })
+    # PRD/TRD chunks most relevant to the shortlisted rules, within ARTIFACT_TOKEN_BUDGET
+    render = lambda rules, secs: _build_master_prompt(_render_feature_sections(secs), rules)
+    artifact_sections, artifacts_report = select_artifacts(artifacts, selected_rules)
 
-    try:
-        resp = _MODEL.generate_content(prompt, generation_config=generation_config)
-        raw = getattr(resp, "text", "") or ""
-        _LAST_AUDIT_META = _base_meta(status="ok", raw_hash=_sha256_text(raw))
-    except Exception as e:
-        _LAST_AUDIT_META = _base_meta(status="error")
-        return json.dumps({
-            "classification": "UNSURE",
-            "reasoning": f"[LLM_CALL_FAILED] {e}",
-            "regulation": "None",
-            "triggered_rules": [],
-            "recommendations": []
-        })
+    # Build prompt within the token budget (drops lowest-ranked rules, then trims text)
+    prompt, kept_rules, fitted_sections, budget_report = fit_prompt(
+        render, selected_rules, sections + artifact_sections,
+    )
+    # Excerpts picked for rules that were just dropped would waste the artifact budget:
+    # pick them again for the kept rules and fit once more
+    dropped_ids = budget_report.get("dropped_rule_ids")
+    if dropped_ids and artifact_sections:
+        original_tokens = budget_report["original_tokens"]
+        artifact_sections, artifacts_report = select_artifacts(artifacts, kept_rules)
+        prompt, kept_rules, fitted_sections, budget_report = fit_prompt(
+            render, kept_rules, sections + artifact_sections,
+        )
+        budget_report["original_tokens"] = original_tokens
+        budget_report["dropped_rule_ids"] = dropped_ids + budget_report.get("dropped_rule_ids", [])
+    selected_rules, sections = kept_rules, fitted_sections
 
+    # Config
+    config_dict = _generation_config_dict()
+    cache = get_response_cache() if use_cache else None
+    feature_text_normalized = _render_feature_sections(sections)
+
+    meta = {
+        "audit_id": str(uuid.uuid4()),
+        "model": GEMINI_MODEL,
+        "legal_db_fingerprint": _legal_db_fingerprint(all_rules),
+        "rules_context_ids": [r.get("id") for r in selected_rules],
+        "rules_context_fingerprint": _rules_fingerprint(selected_rules),
+        "terminology_version": terminology_version,
+        "detected_locations": locations,
+        "prompt_version": PROMPT_VERSION,
+        "prompt_budget": budget_report,
+        "artifacts": artifacts_report,
+        "prompt_included": PROMPT_INCLUDED_IN_AUDIT,
+        "context_text_included": CONTEXT_INCLUDED_IN_AUDIT,
+    }
+    meta["input_fingerprint"] = shortlist_fingerprint
+    _add_snapshots(meta, prompt, feature_text_normalized, selected_rules)
+    call = {
+        "prompt": prompt,
+        "cached_head": None,
+        "tail": None,
+        "generation_config": gen_types.GenerationConfig(**config_dict),
+        "cache": cache,
+        "cache_key": make_cache_key(GEMINI_MODEL, config_dict, prompt) if cache else None,
+        "inline": None,
+        "rules": all_rules,
+        "meta": meta,
+    }
+    if not _CONTEXT_CACHE:
+        return call
+
+    # Context cache: the head (instructions + whole legal DB) lives in a cached handle
+    # and the model sees head + tail, so that is what the audit records. If no handle
+    # can be had at call time, the budgeted shortlist prompt above is sent instead and
+    # its audit is used (see _use_inline_prompt).
+    if _context_cache_head(all_rules) is None:
+        meta["context_cache"] = {"mode": _CONTEXT_CACHE.backend.name, "status": "too_small"}
+        return call
+    head_rules = _context_cache_rules(all_rules)
+    head, tail = _split_master_prompt(feature_text_normalized, head_rules)
+
+    cached_meta = dict(
+        meta,
+        rules_context_ids=[r.get("id") for r in head_rules],
+        rules_context_fingerprint=meta["legal_db_fingerprint"],
+        context_cache={"mode": _CONTEXT_CACHE.backend.name, "head_hash": _sha256_text(head)},
+    )
+    cached_meta["input_fingerprint"] = _legal_db_input_fingerprint(text_hash, terminology_version, all_rules)
+    _add_snapshots(cached_meta, head + tail, feature_text_normalized, head_rules)
+    call["inline"] = {"prompt": prompt, "meta": meta, "cache_key": call["cache_key"]}
+    call.update(
+        prompt=head + tail,
+        cached_head=head,
+        tail=tail,
+        cache_key=make_cache_key(GEMINI_MODEL, config_dict, head + tail) if cache else None,
+        meta=cached_meta,
+    )
+    return call
+
+def _rank_rules(feature_text: str,
+                feature_topic: Optional[str],
+                feature_description: Optional[str],
+                prd: Optional[str],
+                trd: Optional[str]) -> Tuple[List[Section], List[Section], Dict[str, Any],
+                                             List[Dict[str, Any]], List[str], List[Dict[str, Any]]]:
+    """(sections, artifacts, feature meta, all rules, locations, ranked shortlist) of a feature."""
+    sections, artifacts, feature_meta = _prepare_feature_text(
+        feature_text, feature_topic, feature_description, [("PRD", prd or ""), ("TRD", trd or "")],
+    )
+    # Locations and rule ranking see the full documents; the prompt only gets excerpts.
+    normalized_text = _render_feature_sections(sections + artifacts)
+    all_rules = _load_legal_context()
+    locations = extract_locations(normalized_text)
+    selected_rules = _select_relevant_rules(
+        normalized_text, all_rules, RULES_TOP_K,
+        locations if RULES_JURISDICTION_PREFILTER else None,
+    )
+    return sections, artifacts, feature_meta, all_rules, locations, selected_rules
+
+def _context_cache_rules(rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The whole legal DB in id order, as it appears in the cached prompt head."""
+    return sorted(rules, key=lambda r: str(r.get("id", "")))
+
+# Cached prompt head per (rules snapshot, context cache); it does not depend on the feature
+_CACHED_HEAD: Dict[str, Any] = {"rules": None, "cache": None, "head": None}
+_CACHED_HEAD_LOCK = threading.Lock()
+
+def _context_cache_head(rules: List[Dict[str, Any]]) -> Optional[str]:
+    """The head a context-cache handle would hold, or None if it is below the caching minimum."""
+    with _CACHED_HEAD_LOCK:
+        if _CACHED_HEAD["rules"] is not rules or _CACHED_HEAD["cache"] is not _CONTEXT_CACHE:
+            head, _tail = _split_master_prompt("", _context_cache_rules(rules))
+            _CACHED_HEAD.update(rules=rules, cache=_CONTEXT_CACHE,
+                                head=head if estimate_tokens(head) >= _CONTEXT_CACHE.min_tokens else None)
+        return _CACHED_HEAD["head"]
+
+def _legal_db_input_fingerprint(text_hash: str, terminology_version: Optional[str],
+                                rules: List[Dict[str, Any]]) -> str:
+    """Input fingerprint of a call whose prompt head carries the whole legal DB."""
+    return _input_fingerprint(text_hash, terminology_version,
+                              [r.get("id") for r in _context_cache_rules(rules)], _legal_db_fingerprint(rules))
+
+def _add_snapshots(meta: Dict[str, Any], prompt: str, feature_text_normalized: str,
+                   rules: List[Dict[str, Any]]) -> None:
+    """Snapshots of the prompt as sent (only when the audit flags are enabled)."""
+    if PROMPT_INCLUDED_IN_AUDIT:
+        meta["prompt_snapshot"] = prompt
+        # Template + fields of the snapshot, so storage can keep one copy of the shared parts
+        meta["prompt_parts"] = {
+            "template": _PROMPT_TEMPLATE.format_string,
+            "fields": _prompt_fields(feature_text_normalized, rules),
+        }
+    if CONTEXT_INCLUDED_IN_AUDIT:
+        meta["context_snapshot"] = _context_block(rules)
+
+def _call_meta(call: Dict[str, Any], status: str,
+               raw_hash: Optional[str] = None, cache_hit: bool = False) -> Dict[str, Any]:
+    meta = dict(call["meta"])
+    meta["status"] = status
+    meta["cache_hit"] = cache_hit
+    if raw_hash is not None:
+        meta["raw_output_hash"] = raw_hash
+    return meta
+
+Outcome = Tuple[str, Dict[str, Any]]  # (raw JSON text, audit meta)
+
+def _answer_without_model(call: Dict[str, Any]) -> Optional[Outcome]:
+    """Cache hit or unconfigured model; None means the model must be called."""
+    cache = call["cache"]
+    cached = cache.get(call["cache_key"]) if cache else None
+    if cached and cached.get("raw"):
+        raw = cached["raw"]
+        meta = _call_meta(call, "ok", raw_hash=_sha256_text(raw), cache_hit=True)
+        if not raw.strip().startswith("{"):
+            raw = _extract_json(raw) or raw
+        return raw, meta
+
+    if not _CLIENT:
+        return _failure_response("[MODEL_NOT_CONFIGURED] Missing GEMINI_API_KEY."), _call_meta(call, "error")
+    return None
+
+def _finish_call(call: Dict[str, Any], resp: Any) -> Outcome:
+    raw = getattr(resp, "text", "") or ""
+    meta = _call_meta(call, "ok", raw_hash=_sha256_text(raw))
+    raw_original = raw
 
     # Try to extract a JSON object if model included prose
     if not raw.strip().startswith("{"):
@@ -364,26 +492,266 @@ def get_ai_analysis(feature_text: str,
             raw = candidate
 
     if not raw:
-        _LAST_AUDIT_META["status"] = "empty"
-        return json.dumps({
-            "classification": "UNSURE",
-            "reasoning": "[EMPTY_RESPONSE] Model returned no content.",
-            "regulation": "None",
-            "triggered_rules": [],
-            "recommendations": []
-        })
+        meta["status"] = "empty"
+        return _failure_response("[EMPTY_RESPONSE] Model returned no content."), meta
+
+    cache = call["cache"]
+    if cache and _load_llm_json(raw_original) is None:
+        # Unparseable answers would be served as the same ERROR result until evicted
+        print("Not caching LLM response: no JSON object found.")
+    elif cache:
+        try:
+            cache.put(call["cache_key"], raw_original, model=GEMINI_MODEL)
+        except Exception as e:
+            print(f"Error writing LLM response cache: {e}")
+
+    return raw, meta
+
+def _fail_call(call: Dict[str, Any], error: Exception) -> Outcome:
+    return _failure_response(f"[LLM_CALL_FAILED] {error}"), _call_meta(call, "error")
+
+def _cached_model(call: Dict[str, Any]) -> Tuple[Any, str, Optional[str]]:
+    """(model override, prompt to send, context cache key) for this call; the full prompt when uncached."""
+    if call["cached_head"] is None:
+        return None, call["prompt"], None
+    entry, status = _CONTEXT_CACHE.get(GEMINI_MODEL, call["cached_head"])
+    if entry is None:
+        _use_inline_prompt(call, status)
+        return None, call["prompt"], None
+    call["meta"]["context_cache"] = dict(call["meta"]["context_cache"], status=status,
+                                         name=entry["name"], cached_tokens=entry["tokens"])
+    return entry["model"], call["tail"], entry["key"]
+
+def _use_inline_prompt(call: Dict[str, Any], status: str) -> None:
+    """
+    No usable handle: send the budgeted shortlist prompt instead of head + tail, audit
+    it as such and store its answer under its own response cache key.
+    """
+    inline = call["inline"]
+    call.update(prompt=inline["prompt"], cached_head=None, tail=None,
+                cache_key=inline["cache_key"], meta=inline["meta"])
+    call["meta"]["context_cache"] = {"mode": _CONTEXT_CACHE.backend.name, "status": status}
+
+def _drop_cached_model(call: Dict[str, Any], key: str, error: BaseException) -> bool:
+    """
+    After a failed call on a cached handle: True if it should be retried with the
+    inline prompt (the handle may have expired or been deleted server-side).
+    """
+    if is_transient_error(getattr(error, "cause", None) or error):
+        return False
+    print(f"Context cache call failed, retrying without it: {error}")
+    _CONTEXT_CACHE.invalidate(key)
+    _use_inline_prompt(call, "fallback")
+    return True
+
+def _generate(call: Dict[str, Any]) -> Tuple[Any, int]:
+    model, prompt, key = _cached_model(call)
+    try:
+        return _CLIENT.generate(prompt, call["generation_config"], model)
+    except Exception as e:
+        if key is None or not _drop_cached_model(call, key, e):
+            raise
+    return _CLIENT.generate(call["prompt"], call["generation_config"])
+
+async def _agenerate(call: Dict[str, Any]) -> Tuple[Any, int]:
+    model, prompt, key = _cached_model(call)
+    try:
+        return await _CLIENT.agenerate(prompt, call["generation_config"], model)
+    except Exception as e:
+        if key is None or not _drop_cached_model(call, key, e):
+            raise
+    return await _CLIENT.agenerate(call["prompt"], call["generation_config"])
+
+def _usage_tokens(resp: Any) -> Tuple[Optional[int], Optional[int]]:
+    usage = getattr(resp, "usage_metadata", None)
+    prompt = getattr(usage, "prompt_token_count", None)
+    output = getattr(usage, "candidates_token_count", None)
+    if prompt is None:
+        return None, None
+    return int(prompt), int(output or 0)
+
+def _instrument(call: Dict[str, Any], outcome: Outcome, started: float,
+                resp: Any = None, retries: int = 0) -> Outcome:
+    """Adds tokens, latency and retries to the audit and feeds the process metrics."""
+    raw, meta = outcome
+    meta["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    meta["retries"] = retries
+    prompt_tokens, output_tokens = _usage_tokens(resp)
+    if prompt_tokens is not None:
+        meta["tokens_source"] = "usage_metadata"
+    elif meta["cache_hit"] or _CLIENT:
+        # Cache hits and failed calls carry no usage metadata; estimate instead.
+        meta["tokens_source"] = "estimate"
+        prompt_tokens = estimate_tokens(call["prompt"])
+        output_tokens = estimate_tokens(raw) if meta["status"] == "ok" else 0
+    else:
+        meta["tokens_source"] = None  # model not configured, nothing was sent
+        prompt_tokens = output_tokens = 0
+    meta["prompt_tokens"] = prompt_tokens
+    meta["output_tokens"] = output_tokens
+    cached = getattr(getattr(resp, "usage_metadata", None), "cached_content_token_count", None)
+    if cached and meta.get("context_cache"):
+        meta["context_cache"] = dict(meta["context_cache"], cached_tokens=int(cached))
+    LLM_METRICS.record(meta)
+    return raw, meta
+
+def _run_call(call: Dict[str, Any]) -> Outcome:
+    started = time.perf_counter()
+    early = _answer_without_model(call)
+    if early is not None:
+        return _instrument(call, early, started)
+    try:
+        resp, retries = _generate(call)
+    except Exception as e:
+        return _instrument(call, _fail_call(call, e), started, retries=getattr(e, "attempts", 1) - 1)
+    return _instrument(call, _finish_call(call, resp), started, resp, retries)
+
+async def _arun_call(call: Dict[str, Any]) -> Outcome:
+    started = time.perf_counter()
+    early = _answer_without_model(call)
+    if early is not None:
+        return _instrument(call, early, started)
+    try:
+        resp, retries = await _agenerate(call)
+    except Exception as e:
+        return _instrument(call, _fail_call(call, e), started, retries=getattr(e, "attempts", 1) - 1)
+    return _instrument(call, _finish_call(call, resp), started, resp, retries)
+
+class AnalysisResult(NamedTuple):
+    """Outcome of one analysis call: raw model JSON, parsed analysis and its audit meta."""
+    raw: str
+    analysis: Dict[str, Any]
+    audit: Dict[str, Any]
+
+    @property
+    def ok(self) -> bool:
+        return self.audit.get("status") == "ok"
+
+
+def analyze_feature(feature_text: str = "",
+                    feature_topic: Optional[str] = None,
+                    feature_description: Optional[str] = None,
+                    *,
+                    use_cache: bool = True,
+                    prd: Optional[str] = None,
+                    trd: Optional[str] = None) -> AnalysisResult:
+    """
+    Calls Gemini with strict prompt + low temperature and returns the raw JSON, the
+    parsed analysis and the audit metadata of this call together. Nothing is shared
+    between calls, so this is safe from threads, Streamlit sessions and tasks.
+    No files are written; the caller stores `audit` with the scan.
+    Identical calls (model, generation config, prompt) are answered from the local
+    response cache unless `use_cache` is False or LLM_CACHE_ENABLED=0.
+    Transient API errors are retried with backoff under the shared rate limits
+    (see llm_client.py); if the call still fails `audit["status"]` is "error".
+    `prd` / `trd` are chunked and only the excerpts most relevant to the shortlisted
+    rules are sent (see artifacts.py).
+    """
+    call = _prepare_call(feature_text, feature_topic, feature_description, use_cache, prd, trd)
+    raw, meta = _run_call(call)
+    return AnalysisResult(raw, parse_llm_response(raw, call["rules"]), meta)
+
+async def aanalyze_feature(feature_text: str = "",
+                           feature_topic: Optional[str] = None,
+                           feature_description: Optional[str] = None,
+                           *,
+                           use_cache: bool = True,
+                           prd: Optional[str] = None,
+                           trd: Optional[str] = None) -> AnalysisResult:
+    """
+    Async variant of analyze_feature(). Call preparation (rule / terminology reads,
+    prompt fitting) runs in a worker thread so the event loop stays free.
+    """
+    call = await asyncio.to_thread(_prepare_call, feature_text, feature_topic, feature_description, use_cache, prd, trd)
+    raw, meta = await _arun_call(call)
+    return AnalysisResult(raw, parse_llm_response(raw, call["rules"]), meta)
 
+
+def compute_input_fingerprint(feature_topic: Optional[str] = None,
+                              feature_description: Optional[str] = None,
+                              *,
+                              prd: Optional[str] = None,
+                              trd: Optional[str] = None) -> str:
+    """
+    The `input_fingerprint` a scan of this feature would record right now, without
+    calling the model or building the prompt (only terminology expansion and rule
+    ranking run). A scan whose stored fingerprint differs is out of date.
+    """
+    _sections, _artifacts, feature_meta, all_rules, _locations, selected_rules = _rank_rules(
+        "", feature_topic, feature_description, prd, trd,
+    )
+    text_hash = _input_text_hash("", feature_topic, feature_description, prd, trd)
+    terminology_version = feature_meta.get("terminology_version")
+    if _CONTEXT_CACHE and _context_cache_head(all_rules) is not None:
+        return _legal_db_input_fingerprint(text_hash, terminology_version, all_rules)
+    return _input_fingerprint(text_hash, terminology_version,
+                              [r.get("id") for r in selected_rules], _rules_fingerprint(selected_rules))
+
+
+def preview_rule_shortlist(feature_topic: Optional[str] = None,
+                           feature_description: Optional[str] = None) -> List[str]:
+    """
+    Ids of the rules ranked for this feature's title and description alone: a cheap
+    approximation of the shortlist a scan would send (no terminology expansion,
+    PRD/TRD or prompt budget), for checking many features at once.
+    """
+    text = _render_feature_sections(_feature_sections("", feature_topic, feature_description))
+    rules = _select_relevant_rules(
+        text, _load_legal_context(), RULES_TOP_K,
+        extract_locations(text) if RULES_JURISDICTION_PREFILTER else None,
+    )
+    return [str(r.get("id")) for r in rules if r.get("id")]
+
+
+# ------------------- Legacy string API (deprecated audit) -------------------
+def get_ai_analysis(feature_text: str,
+                    feature_topic: Optional[str] = None,
+                    feature_description: Optional[str] = None,
+                    *,
+                    use_cache: bool = True,
+                    prd: Optional[str] = None,
+                    trd: Optional[str] = None) -> str:
+    """
+    Returns only the model's raw JSON text. Prefer analyze_feature(), which also
+    returns the audit meta; this keeps filling the get_last_audit_meta() shim.
+    """
+    call = _prepare_call(feature_text, feature_topic, feature_description, use_cache, prd, trd)
+    raw, meta = _run_call(call)
+    _LAST_AUDIT_META.set(meta)
+    return raw
+
+async def aget_ai_analysis(feature_text: str,
+                           feature_topic: Optional[str] = None,
+                           feature_description: Optional[str] = None,
+                           *,
+                           use_cache: bool = True,
+                           prd: Optional[str] = None,
+                           trd: Optional[str] = None) -> str:
+    """Async variant of get_ai_analysis(). Prefer aanalyze_feature()."""
+    call = await asyncio.to_thread(_prepare_call, feature_text, feature_topic, feature_description, use_cache, prd, trd)
+    raw, meta = await _arun_call(call)
+    _LAST_AUDIT_META.set(meta)
     return raw
 
 
 def get_last_audit_meta() -> Optional[Dict[str, Any]]:
-    """Minimal audit metadata for storing in database.json (no files written)."""
-    return _LAST_AUDIT_META
+    """
+    Deprecated: audit metadata of the last get_ai_analysis() call on this thread /
+    asyncio task. Use analyze_feature(), which returns the audit with the result.
+    """
+    warnings.warn(
+        "get_last_audit_meta() is deprecated; use analyze_feature() and AnalysisResult.audit",
+        DeprecationWarning,
+        stacklevel=2,
+    )
+    return _LAST_AUDIT_META.get()
 
 
-def parse_llm_response(response_text: str) -> Dict[str, Any]:
+def parse_llm_response(response_text: str,
+                       rules: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
     """
     Parse & sanitize the LLM JSON.
+    - `rules` defaults to the cached legal rules snapshot.
     - No confidence field.
     - Validate 'regulation' and 'triggered_rules' against legal_db.
     - Reasoning: replace cited rule IDs with 'Title (`id`)', remove uncited IDs,
@@ -398,17 +766,7 @@ def parse_llm_response(response_text: str) -> Dict[str, Any]:
             "recommendations": [],
         }
 
-    text = response_text.strip()
-    # Strip code fences if the model returns ```json ... ```
-    if "```json" in text:
-        try:
-            text = text.split("```json", 1)[1].split("```", 1)[0]
-        except Exception:
-            pass
-    elif text.startswith("```") and text.endswith("```"):
-        text = text.strip("`")
-
-    payload = _try_json_load(text) or _try_json_load(_extract_json(text) or "")
+    payload = _load_llm_json(response_text)
     if payload is None:
         return {
             "classification": "ERROR",
@@ -419,7 +777,8 @@ def parse_llm_response(response_text: str) -> Dict[str, Any]:
         }
 
     # Load rules and build lookups
-    rules = _load_legal_context()
+    if rules is None:
+        rules = _load_legal_context()
     allowed_ids = {str(r.get("id", "")) for r in rules if r.get("id")}
     id_to_title = {str(r.get("id")): (r.get("title") or str(r.get("id"))) for r in rules if r.get("id")}
     allowed_titles = {(r.get("title") or "").lower() for r in rules}
@@ -0,0 +1,165 @@
+# src/artifacts.py
+from __future__ import annotations
+
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from .jurisdictions import extract_locations, matches_any, parse_jurisdiction
+from .llm_client import estimate_tokens
+
+# ============================== Config ==============================
+# Target size of one PRD/TRD chunk
+ARTIFACT_CHUNK_CHARS = int(os.getenv("ARTIFACT_CHUNK_CHARS", "1200"))
+# Tokens shared by all artifacts of one scan, unused share passes to the next one
+# (0 sends artifacts verbatim and leaves sizing to the prompt budget)
+ARTIFACT_TOKEN_BUDGET = int(os.getenv("ARTIFACT_TOKEN_BUDGET", "2500"))
+
+# Marks text left out between / around the selected excerpts
+EXCERPT_GAP = "[...]"
+
+_PARA_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+# Points per chunk: rule keyword, rule id/title, location related to a rule's jurisdiction
+_KEYWORD_POINTS = 2
+_TITLE_POINTS = 1
+_LOCATION_POINTS = 3
+
+
+# ============================= Chunking =============================
+def _pieces(text: str, max_chars: int) -> List[str]:
+    """Paragraphs, with oversized ones split into sentences and then hard slices."""
+    out: List[str] = []
+    for para in _PARA_RE.split(text):
+        para = para.strip()
+        if not para:
+            continue
+        if len(para) <= max_chars:
+            out.append(para)
+            continue
+        for sentence in _SENTENCE_RE.split(para):
+            while len(sentence) > max_chars:
+                out.append(sentence[:max_chars])
+                sentence = sentence[max_chars:]
+            if sentence.strip():
+                out.append(sentence)
+    return out
+
+def chunk_text(text: str, max_chars: Optional[int] = None) -> List[str]:
+    """Greedily packs paragraphs (or their pieces) into chunks of at most `max_chars`."""
+    max_chars = max(100, max_chars or ARTIFACT_CHUNK_CHARS)
+    chunks: List[str] = []
+    current = ""
+    for piece in _pieces(text or "", max_chars):
+        if current and len(current) + 2 + len(piece) > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# ============================== Scoring =============================
+def _rule_needles(rules: List[Dict[str, Any]]) -> List[Tuple[str, int]]:
+    needles: Dict[str, int] = {}
+    for rule in rules:
+        for kw in rule.get("keywords", []) or []:
+            if isinstance(kw, str) and kw.strip():
+                key = kw.strip().lower()
+                needles[key] = max(needles.get(key, 0), _KEYWORD_POINTS)
+        title = str(rule.get("title") or "").strip().lower()
+        if title:
+            needles[title] = max(needles.get(title, 0), _TITLE_POINTS)
+    return list(needles.items())
+
+def score_chunk(chunk: str, needles: List[Tuple[str, int]],
+                jurisdictions: List[Any]) -> int:
+    """Keyword/title hits of the shortlisted rules plus a bonus per rule whose jurisdiction the chunk names."""
+    lowered = chunk.lower()
+    score = sum(points for needle, points in needles if needle in lowered)
+    locations = extract_locations(chunk)
+    if locations:
+        score += _LOCATION_POINTS * sum(1 for codes in jurisdictions if codes and matches_any(codes, locations))
+    return score
+
+
+# ============================= Selection ============================
+def select_excerpts(text: str, rules: List[Dict[str, Any]], token_budget: int,
+                    max_chars: Optional[int] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Chunks `text`, ranks the chunks against `rules` and keeps the best ones that fit
+    `token_budget`, in document order. Without any scoring chunk the opening of the
+    document is kept. Returns (excerpt text, stats for the audit).
+    """
+    text = text or ""
+    stats: Dict[str, Any] = {"chars": len(text), "chunks": 0, "selected_chunks": [], "selected_chars": 0}
+    if not text.strip():
+        return "", stats
+    if token_budget <= 0 or estimate_tokens(text) <= token_budget:
+        stats.update(chunks=1, selected_chunks=[0], selected_chars=len(text))
+        return text, stats
+
+    chunks = chunk_text(text, max_chars)
+    needles = _rule_needles(rules)
+    jurisdictions = [parse_jurisdiction(r.get("jurisdiction")) for r in rules]
+    scores = [score_chunk(c, needles, jurisdictions) for c in chunks]
+    # Best score first; earlier chunks win ties
+    order = sorted(range(len(chunks)), key=lambda i: (-scores[i], i))
+
+    chosen: List[int] = []
+    used = 0
+    for i in order:
+        cost = estimate_tokens(chunks[i])
+        if used + cost > token_budget:
+            continue
+        chosen.append(i)
+        used += cost
+    chosen.sort()
+
+    if not chosen:
+        # Budget smaller than any chunk: keep the head of the best one
+        best = order[0]
+        chunks[best] = chunks[best][:max(0, token_budget) * 4]
+        chosen = [best] if chunks[best] else []
+
+    parts: List[str] = []
+    prev = -1
+    for i in chosen:
+        if i != prev + 1:
+            parts.append(EXCERPT_GAP)
+        parts.append(chunks[i])
+        prev = i
+    if chosen and chosen[-1] < len(chunks) - 1:
+        parts.append(EXCERPT_GAP)
+    excerpt = "\n\n".join(parts)
+
+    stats.update(chunks=len(chunks), selected_chunks=chosen,
+                 selected_chars=sum(len(chunks[i]) for i in chosen),
+                 scores=[scores[i] for i in chosen])
+    return excerpt, stats
+
+def select_artifacts(artifacts: List[Tuple[str, str]], rules: List[Dict[str, Any]],
+                     token_budget: Optional[int] = None) -> Tuple[List[Tuple[str, str]], Dict[str, Any]]:
+    """
+    Excerpts for each (name, text) artifact within one shared budget. Artifacts are
+    sized smallest first, each taking at most an even share of what is left, so the
+    budget a short document does not need goes to the longer ones.
+    Returns ([(name, excerpt)] in input order for non-empty artifacts, {name: stats}).
+    """
+    budget = ARTIFACT_TOKEN_BUDGET if token_budget is None else token_budget
+    present = [(name, text) for name, text in artifacts if (text or "").strip()]
+    excerpts: Dict[str, str] = {}
+    report: Dict[str, Any] = {}
+    remaining = budget
+    by_size = sorted(present, key=lambda item: len(item[1]))
+    for idx, (name, text) in enumerate(by_size):
+        share = remaining // (len(by_size) - idx) if budget > 0 else 0
+        excerpt, stats = select_excerpts(text, rules, share)
+        remaining -= estimate_tokens(excerpt) if excerpt else 0
+        excerpts[name] = excerpt
+        report[name] = stats
+    selected = [(name, excerpts[name]) for name, _ in present if excerpts[name]]
+    return selected, {name: report[name] for name, _ in present}
@@ -0,0 +1,277 @@
+# src/batch_scan.py
+from __future__ import annotations
+
+import os
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from .ai_core import analyze_feature, compute_input_fingerprint
+from .llm_metrics import summarize_audits
+from .db_utils import (
+    add_scans_bulk,
+    get_all_feature_ids,
+    get_features_by_ids,
+    get_features_for_fingerprint,
+    get_latest_scan_fingerprints,
+    get_scan_summaries,
+)
+
+# ============================== Config ==============================
+# Number of Gemini calls in flight at once
+BATCH_SCAN_CONCURRENCY = int(os.getenv("BATCH_SCAN_CONCURRENCY", "4"))
+# Finished scans are written to Supabase in inserts of this many rows
+BATCH_SCAN_PERSIST_CHUNK = int(os.getenv("BATCH_SCAN_PERSIST_CHUNK", "50"))
+# Feature rows (with PRD/TRD bodies) are loaded this many at a time, as the scan reaches them
+BATCH_SCAN_LOAD_CHUNK = int(os.getenv("BATCH_SCAN_LOAD_CHUNK", "200"))
+# A feature is "stale" when its latest scan is older than this
+BATCH_STALE_DAYS = float(os.getenv("BATCH_STALE_DAYS", "30"))
+
+SELECTIONS = ("all", "unscanned", "stale", "changed")
+
+ProgressCallback = Callable[[int, int, Dict[str, Any]], None]
+PersistedCallback = Callable[[List[Dict[str, Any]]], None]
+
+
+# ============================ Selection =============================
+def _parse_ts(ts: Optional[str]) -> Optional[datetime]:
+    if not ts:
+        return None
+    try:
+        dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+def select_feature_ids(selection: str, *, stale_days: Optional[float] = None) -> List[str]:
+    """
+    Resolve a named selection to feature ids:
+    - "all":       every feature
+    - "unscanned": features without any scan
+    - "stale":     unscanned features plus those whose latest scan is older than `stale_days`
+    - "changed":   features whose scan inputs differ from their latest scan (see find_changed_features)
+    """
+    if selection not in SELECTIONS:
+        raise ValueError(f"Unknown selection '{selection}', expected one of {SELECTIONS}")
+    if selection == "changed":
+        return [c["feature_id"] for c in find_changed_features()]
+
+    feature_ids = get_all_feature_ids()
+    if selection == "all":
+        return feature_ids
+
+    summaries = get_scan_summaries()
+    if selection == "unscanned":
+        return [fid for fid in feature_ids if fid not in summaries]
+
+    days = BATCH_STALE_DAYS if stale_days is None else stale_days
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    stale = []
+    for fid in feature_ids:
+        dt = _parse_ts((summaries.get(fid) or {}).get("latest_timestamp_utc"))
+        if dt is None or dt < cutoff:
+            stale.append(fid)
+    return stale
+
+
+def find_changed_features(feature_ids: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Features whose current input fingerprint (text, terminology version, rules that
+    would be sent, model, prompt version) differs from the one on their latest scan.
+    No model calls are made. Limited to `feature_ids` when given.
+    Returns [{"feature_id", "title", "reason"}] with reason "unscanned",
+    "no_fingerprint" (scanned before fingerprints were recorded) or "changed".
+    """
+    wanted = set(feature_ids) if feature_ids is not None else None
+    latest = get_latest_scan_fingerprints()
+    changed: List[Dict[str, Any]] = []
+    for feature in get_features_for_fingerprint():
+        fid = feature["id"]
+        if wanted is not None and fid not in wanted:
+            continue
+        if fid not in latest:
+            reason = "unscanned"
+        elif not latest[fid]:
+            reason = "no_fingerprint"
+        else:
+            current = compute_input_fingerprint(
+                feature.get("title") or "", feature.get("description") or "",
+                prd=feature.get("prd") or "", trd=feature.get("trd") or "",
+            )
+            if current == latest[fid]:
+                continue
+            reason = "changed"
+        changed.append({"feature_id": fid, "title": feature.get("title") or "", "reason": reason})
+    return changed
+
+
+# ============================ Execution =============================
+def _item(feature_id: str, title: str = "", **fields: Any) -> Dict[str, Any]:
+    item = {
+        "feature_id": feature_id,
+        "title": title,
+        "status": "error",
+        "classification": None,
+        "regulation": None,
+        "scan_id": None,
+        "error": None,
+    }
+    item.update(fields)
+    return item
+
+USAGE_KEYS = ("cache_hit", "prompt_tokens", "output_tokens", "latency_ms", "retries")
+
+def _usage(audit_meta: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: audit_meta.get(k) for k in USAGE_KEYS}
+
+def scan_feature(feature: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs the LLM analysis for one feature (safe to call from worker threads).
+    Returns an item result; successful items carry the pending scan under "_scan".
+    """
+    fid = feature["id"]
+    title = feature.get("title") or ""
+    try:
+        feature_snapshot = {
+            "title": title,
+            "description": feature.get("description") or "",
+            "prd": feature.get("prd") or "",
+            "trd": feature.get("trd") or "",
+        }
+        result = analyze_feature(feature_topic=title,
+                                 feature_description=feature_snapshot["description"],
+                                 prd=feature_snapshot["prd"],
+                                 trd=feature_snapshot["trd"])
+    except Exception as e:
+        return _item(fid, title, error=f"{type(e).__name__}: {e}")
+
+    analysis, audit_meta = result.analysis, result.audit
+    if not result.ok:
+        # Model missing / call failed / empty output: do not store it as a scan.
+        return _item(fid, title, classification=analysis.get("classification"),
+                     error=analysis.get("reasoning") or f"LLM status: {audit_meta.get('status')}",
+                     **_usage(audit_meta))
+
+    return _item(
+        fid, title,
+        status="ok",
+        classification=analysis.get("classification"),
+        regulation=analysis.get("regulation"),
+        **_usage(audit_meta),
+        _scan={
+            "feature_id": fid,
+            "feature_snapshot": feature_snapshot,
+            "analysis": analysis,
+            "audit_meta": audit_meta,
+        },
+    )
+
+def _persist(items: List[Dict[str, Any]]) -> None:
+    scans = [it.pop("_scan") for it in items]
+    try:
+        scan_ids = add_scans_bulk(scans)
+    except Exception as e:
+        for it in items:
+            it["status"] = "error"
+            it["error"] = f"Failed to save scan: {e}"
+        return
+    for it, scan_id in zip(items, scan_ids):
+        it["scan_id"] = scan_id
+
+def run_batch_scan(feature_ids: Iterable[str],
+                   *,
+                   concurrency: Optional[int] = None,
+                   persist_chunk_size: Optional[int] = None,
+                   on_progress: Optional[ProgressCallback] = None,
+                   on_persisted: Optional[PersistedCallback] = None) -> Dict[str, Any]:
+    """
+    Scan many features with a bounded thread pool and save the results in bulk.
+
+    - `on_progress(done, total, item)` fires on the calling thread as each item finishes.
+    - `on_persisted(items)` fires after each bulk insert (and for failed items),
+      so callers can checkpoint work that is durably recorded.
+    Errors are captured per item; nothing is raised for a single bad feature.
+    Features are loaded in windows of BATCH_SCAN_LOAD_CHUNK and at most twice
+    `concurrency` scans are queued, so on KeyboardInterrupt (or an exception from
+    a callback) queued scans are cancelled, finished ones are saved, and the
+    exception propagates.
+    Returns {"total", "succeeded", "failed", "items", "usage"}; "usage" aggregates
+    tokens, latency and cache hits of the items (see llm_metrics.summarize_audits).
+    """
+    ids = list(dict.fromkeys(feature_ids))
+    workers = max(1, concurrency or BATCH_SCAN_CONCURRENCY)
+    chunk_size = max(1, persist_chunk_size or BATCH_SCAN_PERSIST_CHUNK)
+
+    results: List[Dict[str, Any]] = []
+    pending: List[Dict[str, Any]] = []
+    total = len(ids)
+
+    def _flush() -> None:
+        if not pending:
+            return
+        batch = list(pending)
+        pending.clear()
+        _persist(batch)
+        if on_persisted:
+            on_persisted(batch)
+
+    def _finish(item: Dict[str, Any]) -> None:
+        results.append(item)
+        if "_scan" in item:
+            pending.append(item)  # before callbacks, so an interrupt there still saves it
+        if on_progress:
+            on_progress(len(results), total, item)
+        if "_scan" not in item:
+            if on_persisted:
+                on_persisted([item])
+        elif len(pending) >= chunk_size:
+            _flush()
+
+    in_flight: Set[Future] = set()
+
+    def _drain(return_when: str) -> None:
+        done, _ = wait(in_flight, return_when=return_when)
+        for future in done:
+            in_flight.discard(future)
+            _finish(future.result())
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="geoguard-scan")
+    try:
+        for start in range(0, total, BATCH_SCAN_LOAD_CHUNK):
+            window = ids[start:start + BATCH_SCAN_LOAD_CHUNK]
+            try:
+                features = {f["id"]: f for f in get_features_by_ids(window, projection="scan_input")}
+            except Exception as e:
+                for fid in window:
+                    _finish(_item(fid, error=f"Failed to load feature: {e}"))
+                continue
+            for fid in window:
+                if fid not in features:
+                    _finish(_item(fid, error="Feature not found"))
+                    continue
+                if len(in_flight) >= 2 * workers:
+                    _drain(FIRST_COMPLETED)
+                in_flight.add(pool.submit(scan_feature, features[fid]))
+        _drain(ALL_COMPLETED)
+    except BaseException:
+        # Stop paying for queued calls; keep what already finished
+        pool.shutdown(wait=True, cancel_futures=True)
+        try:
+            for future in in_flight:
+                if not future.cancelled():
+                    _finish(future.result())
+            _flush()
+        except Exception as e:
+            print(f"Error saving finished scans after interruption: {e}")
+        raise
+    pool.shutdown()
+    _flush()
+
+    succeeded = sum(1 for it in results if it["status"] == "ok")
+    return {
+        "total": total,
+        "succeeded": succeeded,
+        "failed": total - succeeded,
+        "items": results,
+        "usage": summarize_audits(it for it in results if it.get("latency_ms") is not None),
+    }
@@ -0,0 +1,232 @@
+# src/context_cache.py
+from __future__ import annotations
+
+import atexit
+import hashlib
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .llm_client import estimate_tokens
+
+# ============================== Config ==============================
+# "gemini" keeps the static prompt head (instructions + full legal context) in a
+# Gemini cached-content handle, "stub" simulates that locally (offline), "off" disables
+GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "off").strip().lower()
+# Lifetime requested for a handle, and how close to expiry it gets extended (seconds)
+GEMINI_CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+GEMINI_CONTEXT_CACHE_REFRESH = int(os.getenv("GEMINI_CONTEXT_CACHE_REFRESH", "300"))
+# Gemini rejects cached content below a per-model minimum; smaller heads are sent inline
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "4096"))
+# After a failed create, wait this long before trying the same head again (seconds)
+GEMINI_CONTEXT_CACHE_RETRY = int(os.getenv("GEMINI_CONTEXT_CACHE_RETRY", "300"))
+
+CONTEXT_CACHE_MODES = ("off", "gemini", "stub")
+
+
+# ============================= Backends =============================
+class GeminiCacheBackend:
+    """Cached-content handles through google.generativeai.caching."""
+
+    name = "gemini"
+
+    def create(self, model_name: str, text: str, ttl: int) -> Tuple[Any, Any]:
+        """Returns (handle, model bound to it); the model's calls send only the rest of the prompt."""
+        import google.generativeai as genai
+        from google.generativeai import caching
+
+        handle = caching.CachedContent.create(
+            model=model_name,
+            display_name="geoguard-prompt-head",
+            contents=[text],
+            ttl=timedelta(seconds=ttl),
+        )
+        return handle, genai.GenerativeModel.from_cached_content(cached_content=handle)
+
+    def refresh(self, handle: Any, ttl: int) -> None:
+        handle.update(ttl=timedelta(seconds=ttl))
+
+    def delete(self, handle: Any) -> None:
+        handle.delete()
+
+
+class _PrefixedModel:
+    """Stand-in for a model bound to cached content: prepends the head and calls the base model."""
+
+    def __init__(self, base: Any, head: str):
+        self.base = base
+        self.head = head
+
+    def generate_content(self, contents: str, **kwargs: Any) -> Any:
+        return self.base.generate_content(self.head + contents, **kwargs)
+
+    async def generate_content_async(self, contents: str, **kwargs: Any) -> Any:
+        return await self.base.generate_content_async(self.head + contents, **kwargs)
+
+
+class StubCacheBackend:
+    """
+    Offline backend with the same lifecycle as GeminiCacheBackend. Handles live in
+    memory and calls go to `base_model` with the head prepended, so results match
+    uncached mode. `calls` records ("create" | "refresh" | "delete", handle name).
+    """
+
+    name = "stub"
+
+    def __init__(self, base_model: Any = None):
+        self.base_model = base_model
+        self.handles: Dict[str, Dict[str, Any]] = {}
+        self.calls: list = []
+        self._seq = 0
+
+    def create(self, model_name: str, text: str, ttl: int) -> Tuple[Any, Any]:
+        self._seq += 1
+        handle = {"name": f"cachedContents/stub-{self._seq}", "model": model_name, "ttl": ttl}
+        self.handles[handle["name"]] = handle
+        self.calls.append(("create", handle["name"]))
+        return handle, _PrefixedModel(self.base_model, text)
+
+    def refresh(self, handle: Any, ttl: int) -> None:
+        if handle["name"] not in self.handles:
+            raise LookupError(f"{handle['name']} not found")
+        handle["ttl"] = ttl
+        self.calls.append(("refresh", handle["name"]))
+
+    def delete(self, handle: Any) -> None:
+        self.handles.pop(handle["name"], None)
+        self.calls.append(("delete", handle["name"]))
+
+
+def _handle_name(handle: Any) -> str:
+    return handle["name"] if isinstance(handle, dict) else str(getattr(handle, "name", ""))
+
+
+# ============================== Manager =============================
+class ContextCache:
+    """
+    One cached-content handle per (model, prompt head). A handle is reused until it
+    gets within `refresh` seconds of expiry, then its TTL is extended; a new head
+    for the same model (rules or prompt version changed) replaces the old handle,
+    which is deleted. Failures are reported as None so callers send the full
+    prompt instead. Thread-safe; remote calls happen under the lock so concurrent
+    calls never create the same handle twice.
+    """
+
+    def __init__(self, backend: Any, *,
+                 ttl: int = GEMINI_CONTEXT_CACHE_TTL,
+                 refresh: int = GEMINI_CONTEXT_CACHE_REFRESH,
+                 min_tokens: int = GEMINI_CONTEXT_CACHE_MIN_TOKENS,
+                 retry_after: int = GEMINI_CONTEXT_CACHE_RETRY,
+                 clock: Callable[[], float] = time.time):
+        self.backend = backend
+        self.ttl = max(60, ttl)
+        self.refresh_margin = max(0, min(refresh, self.ttl // 2))
+        self.min_tokens = min_tokens
+        self.retry_after = retry_after
+        self.clock = clock
+        self._entries: Dict[str, Dict[str, Any]] = {}   # key -> entry
+        self._failed: Dict[str, float] = {}             # key -> retry after (epoch s)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(model_name: str, head: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{head}".encode("utf-8")).hexdigest()
+
+    def get(self, model_name: str, head: str) -> Tuple[Optional[Dict[str, Any]], str]:
+        """
+        (entry, status) for the handle holding `head`. status is "reused", "refreshed"
+        or "created" with an entry {"key", "name", "model", "expires_at", "tokens"},
+        or "too_small" / "unavailable" with None.
+        """
+        key = self.key_for(model_name, head)
+        with self._lock:
+            now = self.clock()
+            entry = self._entries.get(key)
+            if entry and entry["expires_at"] - now > self.refresh_margin:
+                return entry, "reused"
+            if entry and entry["expires_at"] > now:
+                try:
+                    self.backend.refresh(entry["handle"], self.ttl)
+                    entry["expires_at"] = now + self.ttl
+                    return entry, "refreshed"
+                except Exception as e:
+                    print(f"Error refreshing context cache {entry['name']}: {e}")
+            self._entries.pop(key, None)
+
+            tokens = estimate_tokens(head)
+            if tokens < self.min_tokens:
+                return None, "too_small"
+            if self._failed.get(key, 0) > now:
+                return None, "unavailable"
+            try:
+                handle, model = self.backend.create(model_name, head, self.ttl)
+            except Exception as e:
+                print(f"Error creating context cache: {e}")
+                self._failed[key] = now + self.retry_after
+                return None, "unavailable"
+            self._failed.pop(key, None)
+
+            # Superseded heads of the same model would only be billed for storage
+            for old_key in [k for k, e in self._entries.items() if e["model_name"] == model_name]:
+                self._delete(self._entries.pop(old_key))
+            entry = {
+                "key": key,
+                "name": _handle_name(handle),
+                "handle": handle,
+                "model": model,
+                "model_name": model_name,
+                "expires_at": now + self.ttl,
+                "tokens": tokens,
+            }
+            self._entries[key] = entry
+            return entry, "created"
+
+    def invalidate(self, key: str) -> None:
+        """Forget (and delete) a handle the API no longer accepts, e.g. expired server-side."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry:
+                self._delete(entry)
+
+    def clear(self) -> None:
+        """Delete every handle this process created."""
+        with self._lock:
+            entries, self._entries = list(self._entries.values()), {}
+            self._failed.clear()
+        for entry in entries:
+            self._delete(entry)
+
+    def _delete(self, entry: Dict[str, Any]) -> None:
+        try:
+            self.backend.delete(entry["handle"])
+        except Exception as e:
+            print(f"Error deleting context cache {entry['name']}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self.clock()
+            return {
+                "mode": self.backend.name,
+                "handles": [
+                    {"name": e["name"], "tokens": e["tokens"], "expires_in_s": round(e["expires_at"] - now)}
+                    for e in self._entries.values()
+                ],
+            }
+
+
+def make_context_cache(mode: str = GEMINI_CONTEXT_CACHE, base_model: Any = None) -> Optional[ContextCache]:
+    """ContextCache for `mode` ("gemini" | "stub"), None when off or unknown. Handles are deleted at exit."""
+    if mode in ("", "0", "off", "false", "no"):
+        return None
+    if mode == "gemini":
+        backend: Any = GeminiCacheBackend()
+    elif mode == "stub":
+        backend = StubCacheBackend(base_model)
+    else:
+        print(f"Unknown GEMINI_CONTEXT_CACHE '{mode}', expected one of {CONTEXT_CACHE_MODES}; context caching is off")
+        return None
+    cache = ContextCache(backend)
+    atexit.register(cache.clear)
+    return cache
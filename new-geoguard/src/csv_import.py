@@ -0,0 +1,130 @@
+# src/csv_import.py
+from __future__ import annotations
+
+import os
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from .db_utils import bulk_upsert_features, get_feature_dedupe_keys
+
+# ============================== Config ==============================
+# Rows parsed per pandas chunk; each chunk goes straight to bulk inserts
+CSV_IMPORT_CHUNK_ROWS = int(os.getenv("CSV_IMPORT_CHUNK_ROWS", "5000"))
+CSV_PREVIEW_ROWS = int(os.getenv("CSV_PREVIEW_ROWS", "20"))
+# Failed rows kept for the report (the counts are always complete)
+CSV_MAX_REPORTED_FAILURES = 1000
+
+REQUIRED_COLUMNS = ["title", "description"]
+OPTIONAL_COLUMNS = ["prd", "trd"]
+FEATURE_COLUMNS = REQUIRED_COLUMNS + OPTIONAL_COLUMNS
+
+ImportProgress = Callable[[Dict[str, int]], None]
+
+
+class CSVFormatError(ValueError):
+    """The CSV is unreadable or lacks required columns."""
+
+
+# ============================== Reading =============================
+def _rewind(source: Any) -> None:
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+def _read(source: Any, **kwargs: Any):
+    """pd.read_csv limited to the feature columns, every value read as text."""
+    _rewind(source)
+    return pd.read_csv(
+        source,
+        usecols=lambda c: str(c).strip() in FEATURE_COLUMNS,
+        dtype=str,
+        keep_default_na=False,
+        **kwargs,
+    )
+
+def read_csv_columns(source: Any) -> List[str]:
+    """Header of the CSV (stripped), read without loading any rows."""
+    _rewind(source)
+    try:
+        header = pd.read_csv(source, nrows=0)
+    except Exception as e:
+        raise CSVFormatError(f"Could not read CSV header: {e}") from e
+    return [str(c).strip() for c in header.columns]
+
+def validate_csv_columns(source: Any) -> List[str]:
+    """Checks the header once; returns the optional columns that are missing."""
+    columns = read_csv_columns(source)
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise CSVFormatError(f"Missing required columns: {missing}")
+    return [c for c in OPTIONAL_COLUMNS if c not in columns]
+
+def _normalize(df: pd.DataFrame, drop_untitled: bool = True) -> pd.DataFrame:
+    df.columns = [str(c).strip() for c in df.columns]
+    for col in OPTIONAL_COLUMNS:
+        if col not in df.columns:
+            df[col] = ""
+    df = df.fillna("")
+    if drop_untitled:
+        df = df[df["title"].str.strip() != ""]
+    return df[FEATURE_COLUMNS]
+
+def preview_csv(source: Any, rows: int = CSV_PREVIEW_ROWS) -> pd.DataFrame:
+    """First `rows` valid features; the rest of the file is not parsed."""
+    return _normalize(_read(source, nrows=rows))
+
+def iter_feature_chunks(source: Any,
+                        chunk_rows: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """
+    Stream the CSV as normalized DataFrame chunks of at most `chunk_rows` rows.
+    The index of each chunk is the row's position in the file (0-based, header
+    excluded). Rows without a title are kept so the importer can report them.
+    """
+    reader = _read(source, chunksize=max(1, chunk_rows or CSV_IMPORT_CHUNK_ROWS))
+    with reader:
+        for chunk in reader:
+            yield _normalize(chunk, drop_untitled=False)
+
+
+# ============================== Import ==============================
+def import_features_csv(source: Any,
+                        *,
+                        chunk_rows: Optional[int] = None,
+                        insert_chunk_size: Optional[int] = None,
+                        dedupe_on: Optional[str] = "content",
+                        on_progress: Optional[ImportProgress] = None) -> Dict[str, Any]:
+    """
+    Validate the header, then read the CSV chunk by chunk and insert each chunk
+    with bulk_upsert_features(). Only one chunk is held in memory at a time and
+    existing features are read once for deduplication.
+
+    Returns {"rows", "inserted", "duplicate", "invalid", "error", "failures"};
+    "failures" lists up to CSV_MAX_REPORTED_FAILURES {"row", "title", "status", "error"}
+    with 1-based data row numbers. `on_progress(counts)` fires after every chunk.
+    """
+    validate_csv_columns(source)
+    existing_keys = get_feature_dedupe_keys(dedupe_on)
+
+    summary: Dict[str, Any] = {"rows": 0, "inserted": 0, "duplicate": 0,
+                               "invalid": 0, "error": 0, "failures": []}
+    try:
+        for chunk in iter_feature_chunks(source, chunk_rows):
+            positions = list(chunk.index)
+            outcomes = bulk_upsert_features(
+                chunk.to_dict("records"),
+                chunk_size=insert_chunk_size,
+                dedupe_on=dedupe_on,
+                existing_keys=existing_keys,
+            )
+            for pos, outcome, title in zip(positions, outcomes, chunk["title"]):
+                summary["rows"] += 1
+                summary[outcome["status"]] += 1
+                if (outcome["status"] in ("error", "invalid")
+                        and len(summary["failures"]) < CSV_MAX_REPORTED_FAILURES):
+                    summary["failures"].append({"row": pos + 1, "title": title,
+                                                "status": outcome["status"], "error": outcome["error"]})
+            if on_progress:
+                on_progress({k: v for k, v in summary.items() if k != "failures"})
+    except (pd.errors.ParserError, UnicodeDecodeError) as e:
+        raise CSVFormatError(f"Could not parse CSV after {summary['rows']} rows: {e}") from e
+    return summary
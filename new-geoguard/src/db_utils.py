@@ -1,9 +1,15 @@
 # src/db_utils.py
+import base64
+import gzip
+import hashlib
 import json
 import os
+import re
+import threading
+import time
 import uuid
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
 from supabase import create_client, Client
 
@@ -16,6 +22,59 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# PostgREST caps rows per response (1000 by default), so bulk reads are paged.
+PAGE_SIZE = int(os.getenv("SUPABASE_PAGE_SIZE", "1000"))
+# Max ids per `in_` filter, keeps request URLs well under server limits.
+IN_FILTER_CHUNK = 200
+# Rows per insert request for bulk feature imports
+FEATURE_IMPORT_CHUNK = int(os.getenv("FEATURE_IMPORT_CHUNK", "500"))
+# Default page sizes for the keyset-paginated list APIs
+FEATURE_PAGE_SIZE = int(os.getenv("FEATURE_PAGE_SIZE", "25"))
+SCAN_PAGE_SIZE = int(os.getenv("SCAN_PAGE_SIZE", "10"))
+
+# PostgREST / Postgres codes for "relation does not exist" (optional tables and views)
+_MISSING_TABLE_CODES = ("42P01", "PGRST205")
+
+# Column projections for feature reads; callers pick the smallest one they need
+FEATURE_PROJECTIONS = {
+    "list": "id, title, description, created_at",      # dashboard rows (no PRD/TRD bodies)
+    "scan_input": "id, title, description, prd, trd",  # what a scan reads
+    "full": "*",
+}
+
+def _fetch_all_pages(build_query) -> List[Dict[str, Any]]:
+    """
+    Runs `build_query()` page by page using .range() until a short page is returned.
+    `build_query` must return a fresh (ordered) select query each time.
+    """
+    rows: List[Dict[str, Any]] = []
+    start = 0
+    while True:
+        response = build_query().range(start, start + PAGE_SIZE - 1).execute()
+        page = response.data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+def _quote(value: Any) -> str:
+    """Value for a PostgREST logic-tree filter, quoted so ':', ',' and '.' survive."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def _keyset_after(query, cursor: Optional[Dict[str, Any]], column: str, id_column: str):
+    """Rows after `cursor` in (column desc, id_column desc) order."""
+    if not cursor:
+        return query
+    value, row_id = _quote(cursor[column]), _quote(cursor[id_column])
+    return query.or_(f"{column}.lt.{value},and({column}.eq.{value},{id_column}.lt.{row_id})")
+
+def _search_filter(query, search: Optional[str]):
+    """Case-insensitive substring match on title or description."""
+    term = re.sub(r'[,()*"\\%]', " ", search or "").strip()
+    if not term:
+        return query
+    return query.or_(f"title.ilike.*{term}*,description.ilike.*{term}*")
+
 # ============================ Features ==============================
 
 def get_all_features() -> List[Dict[str, Any]]:
@@ -36,6 +95,91 @@ def get_feature_by_id(feature_id: str) -> Optional[Dict[str, Any]]:
         print(f"Error fetching feature {feature_id}: {e}")
         return None
 
+def get_features_by_ids(feature_ids: List[str], projection: str = "full") -> List[Dict[str, Any]]:
+    """
+    Fetches several features in as few requests as possible (chunked `in` filters).
+    `projection` names a FEATURE_PROJECTIONS entry. Ids that do not exist are left
+    out; a failed request raises, so callers can tell it apart from a missing feature.
+    """
+    features: List[Dict[str, Any]] = []
+    ids = list(dict.fromkeys(feature_ids))
+    columns = FEATURE_PROJECTIONS[projection]
+    try:
+        for i in range(0, len(ids), IN_FILTER_CHUNK):
+            chunk = ids[i:i + IN_FILTER_CHUNK]
+            response = supabase.table("features").select(columns).in_("id", chunk).execute()
+            features.extend(response.data or [])
+        return features
+    except Exception as e:
+        print(f"Error fetching features by id: {e}")
+        raise
+
+def get_all_feature_ids(search: Optional[str] = None) -> List[str]:
+    """Returns the ids of all features (matching `search` if given), newest first, without their content."""
+    try:
+        rows = _fetch_all_pages(
+            lambda: _search_filter(supabase.table("features").select("id"), search)
+            .order("created_at", desc=True).order("id", desc=True)
+        )
+        return [r["id"] for r in rows]
+    except Exception as e:
+        print(f"Error fetching feature ids: {e}")
+        return []
+
+def get_all_features_list() -> List[Dict[str, Any]]:
+    """All features with the "list" projection (no PRD/TRD bodies), in id order (paged)."""
+    try:
+        return _fetch_all_pages(
+            lambda: supabase.table("features").select(FEATURE_PROJECTIONS["list"]).order("id")
+        )
+    except Exception as e:
+        print(f"Error fetching feature list: {e}")
+        raise
+
+def get_features_page(limit: Optional[int] = None,
+                      cursor: Optional[Dict[str, Any]] = None,
+                      search: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    One page of features, newest first, with the "list" projection only.
+    Keyset pagination on (created_at, id): pass the returned cursor to get the next
+    page; it is None on the last page. `search` matches title or description.
+    """
+    limit = max(1, limit or FEATURE_PAGE_SIZE)
+    try:
+        query = _search_filter(supabase.table("features").select(FEATURE_PROJECTIONS["list"]), search)
+        response = (_keyset_after(query, cursor, "created_at", "id")
+                    .order("created_at", desc=True).order("id", desc=True)
+                    .limit(limit + 1).execute())
+    except Exception as e:
+        print(f"Error fetching features page: {e}")
+        return [], None
+    rows = response.data or []
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], {"created_at": last["created_at"], "id": last["id"]}
+
+def get_features_list_rows(feature_ids: List[str]) -> List[Dict[str, Any]]:
+    """The "list" projection of the given features, in the order of `feature_ids`."""
+    rows: Dict[str, Dict[str, Any]] = {}
+    try:
+        for i in range(0, len(feature_ids), IN_FILTER_CHUNK):
+            chunk = feature_ids[i:i + IN_FILTER_CHUNK]
+            response = supabase.table("features").select(FEATURE_PROJECTIONS["list"]).in_("id", chunk).execute()
+            rows.update((r["id"], r) for r in response.data or [])
+    except Exception as e:
+        print(f"Error fetching features by id: {e}")
+    return [rows[fid] for fid in feature_ids if fid in rows]
+
+def count_features() -> int:
+    """Number of features (exact count, no rows transferred)."""
+    try:
+        response = supabase.table("features").select("id", count="exact").limit(1).execute()
+        return response.count or 0
+    except Exception as e:
+        print(f"Error counting features: {e}")
+        return 0
+
 def add_or_update_feature(feature_details: Dict[str, Any]) -> str:
     """
     Add a new feature or update an existing one in the Supabase 'features' table.
@@ -83,20 +227,152 @@ def delete_features(feature_ids: List[str]) -> Tuple[int, int]:
         return 0, 0
 
 
+# -------------------------- Bulk import ---------------------------
+FEATURE_DEDUPE_MODES = ("content", "title", None)
+_WS_RE = re.compile(r"\s+")
+
+def _norm(value: Any) -> str:
+    return _WS_RE.sub(" ", str(value or "")).strip().lower()
+
+def feature_dedupe_key(feature: Dict[str, Any], dedupe_on: Optional[str] = "content") -> Optional[str]:
+    """
+    Key identifying duplicate features: the normalized title, or a hash of the
+    normalized title + description ("content"). None when deduplication is off.
+    """
+    if dedupe_on is None:
+        return None
+    if dedupe_on == "title":
+        return _norm(feature.get("title"))
+    if dedupe_on == "content":
+        blob = _norm(feature.get("title")) + "\x1f" + _norm(feature.get("description"))
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+    raise ValueError(f"Unknown dedupe mode '{dedupe_on}', expected one of {FEATURE_DEDUPE_MODES}")
+
+def get_feature_dedupe_keys(dedupe_on: Optional[str] = "content") -> Set[str]:
+    """Dedupe keys of every stored feature (only the columns the key needs are read)."""
+    if dedupe_on is None:
+        return set()
+    columns = "id, title" if dedupe_on == "title" else "id, title, description"
+    rows = _fetch_all_pages(lambda: supabase.table("features").select(columns).order("id"))
+    return {feature_dedupe_key(r, dedupe_on) for r in rows}
+
+def bulk_upsert_features(rows: List[Dict[str, Any]],
+                         *,
+                         chunk_size: Optional[int] = None,
+                         dedupe_on: Optional[str] = "content",
+                         existing_keys: Optional[Set[str]] = None,
+                         on_progress: Optional[Callable[[int, int], None]] = None) -> List[Dict[str, Any]]:
+    """
+    Insert many features with one request per `chunk_size` rows.
+
+    Rows whose dedupe key (see feature_dedupe_key) matches a stored feature or an
+    earlier row of the same import are skipped, so re-running an import is safe.
+    `existing_keys` may be passed to avoid re-reading the stored features; it is
+    updated in place with the keys of inserted rows, so one set can be shared by
+    successive calls (e.g. chunks of a streamed file).
+    `on_progress(done, total)` fires after each chunk.
+
+    Returns one outcome per input row, in order:
+    {"row": index, "status": "inserted" | "duplicate" | "invalid" | "error",
+     "id": new feature id or None, "error": message or None}
+    """
+    chunk_size = max(1, chunk_size or FEATURE_IMPORT_CHUNK)
+    outcomes = [{"row": i, "status": None, "id": None, "error": None} for i in range(len(rows))]
+
+    if existing_keys is None:
+        try:
+            existing_keys = get_feature_dedupe_keys(dedupe_on)
+        except Exception as e:
+            print(f"Error loading existing features for dedupe: {e}")
+            raise
+    seen = existing_keys
+
+    pending: List[Tuple[int, Optional[str], Dict[str, Any]]] = []
+    for i, row in enumerate(rows):
+        title = str(row.get("title") or "").strip()
+        if not title:
+            outcomes[i].update(status="invalid", error="Missing title")
+            continue
+        key = feature_dedupe_key(row, dedupe_on)
+        if key is not None:
+            if key in seen:
+                outcomes[i]["status"] = "duplicate"
+                continue
+            seen.add(key)
+        data = {k: ("" if v is None else v) for k, v in row.items()
+                if k in ("title", "description", "prd", "trd")}
+        data["title"] = title
+        pending.append((i, key, data))
+
+    total = len(pending)
+    for start in range(0, total, chunk_size):
+        chunk = pending[start:start + chunk_size]
+        try:
+            response = supabase.table("features").insert([data for _, _, data in chunk]).execute()
+            for (i, _, _), inserted in zip(chunk, response.data or []):
+                outcomes[i].update(status="inserted", id=inserted.get("id"))
+        except Exception as e:
+            print(f"Error inserting features {start}-{start + len(chunk) - 1}: {e}")
+            for i, key, _ in chunk:
+                outcomes[i].update(status="error", error=str(e))
+                seen.discard(key)  # not stored, so a later retry must not skip it
+        if on_progress:
+            on_progress(min(start + chunk_size, total), total)
+
+    for outcome in outcomes:
+        if outcome["status"] is None:
+            outcome.update(status="error", error="No row returned by insert")
+    return outcomes
+
+
 # ============================== Scans ===============================
 
-def add_scan(
+# Audit fields stored with a scan
+AUDIT_KEYS = (
+    "audit_id", "status", "model", "raw_output_hash", "cache_hit",
+    "legal_db_fingerprint", "rules_context_ids",
+    "rules_context_fingerprint", "terminology_version", "detected_locations", "prompt_included", "context_text_included", "prompt_snapshot", "context_snapshot",
+    "prompt_tokens", "output_tokens", "tokens_source", "latency_ms", "retries", "prompt_budget",
+    "artifacts", "prompt_version", "input_fingerprint", "snapshot_refs",
+    "context_cache",
+)
+# The bulky ones (whole prompt / rule context text), only fetched on request
+AUDIT_SNAPSHOT_KEYS = ("prompt_snapshot", "context_snapshot")
+
+# Column projections for scan reads, smallest first. "detail" is everything but
+# the audit snapshots: its audit fields are selected one by one (as audit__<key>)
+# and regrouped into an "audit" dict by _shape_scan_row().
+SCAN_PROJECTIONS = {
+    "summary": ("scan_id, feature_id, timestamp_utc, "
+                "classification:analysis->>classification, regulation:analysis->>regulation"),
+    "snapshots": ("scan_id, snapshot_refs:audit->snapshot_refs, "
+                  + ", ".join(f"{k}:audit->>{k}" for k in AUDIT_SNAPSHOT_KEYS)),
+    "detail": ("scan_id, feature_id, timestamp_utc, version, analysis, feature_snapshot, "
+               + ", ".join(f"audit__{k}:audit->{k}" for k in AUDIT_KEYS if k not in AUDIT_SNAPSHOT_KEYS)),
+    "full": "*",
+}
+_AUDIT_ALIAS = "audit__"
+
+def _shape_scan_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Folds audit__<key> columns of the "detail" projection back into row["audit"]."""
+    if not any(k.startswith(_AUDIT_ALIAS) for k in row):
+        return row
+    shaped: Dict[str, Any] = {"audit": {}}
+    for key, value in row.items():
+        if key.startswith(_AUDIT_ALIAS):
+            if value is not None:
+                shaped["audit"][key[len(_AUDIT_ALIAS):]] = value
+        else:
+            shaped[key] = value
+    return shaped
+
+def _build_scan_entry(
     feature_id: str,
     feature_snapshot: Dict[str, Any],
     analysis: Dict[str, Any],
-    *,
     audit_meta: Optional[Dict[str, Any]] = None,
     version: Optional[str] = "v1"
-) -> str:
-    """
-    Append a new scan entry for a feature to the Supabase 'scans' table.
-    Returns the new scan_id.
-    """
+) -> Dict[str, Any]:
     scan_entry = {
         "feature_id": feature_id,
         "version": version,
@@ -105,12 +381,179 @@ def add_scan(
     }
 
     if audit_meta:
-        allowed_keys = {
-            "audit_id", "status", "model", "raw_output_hash",
-            "legal_db_fingerprint", "rules_context_ids",
-            "rules_context_fingerprint", "prompt_included", "context_text_included", "prompt_snapshot", "context_snapshot",
-        }
-        scan_entry["audit"] = {k: v for k, v in audit_meta.items() if k in allowed_keys}
+        scan_entry["audit"] = {k: v for k, v in audit_meta.items() if k in AUDIT_KEYS}
+    return scan_entry
+
+# ========================= Snapshot Store ==========================
+# Prompt and context snapshots are stored once per distinct text in `snapshot_blobs`
+# and referenced from the scan audit by sha256 ("snapshot_refs"). A prompt is split
+# into its template (one copy per prompt version), the rule context block (one copy
+# per distinct context) and the feature text; short fields stay inline.
+#
+#   create table snapshot_blobs (
+#     hash       text primary key,          -- sha256 of the uncompressed text
+#     kind       text not null,             -- prompt_template | context_text | feature_text_normalized | prompt
+#     encoding   text not null,             -- gzip+base64 | utf-8
+#     content    text not null,
+#     size       integer not null,          -- uncompressed length in characters
+#     created_at timestamptz not null default now()
+#   );
+#
+# Without the table (or with SNAPSHOT_STORE=0) snapshots stay inline in the audit.
+SNAPSHOT_STORE_ENABLED = os.getenv("SNAPSHOT_STORE", "1").strip().lower() not in ("0", "false", "no", "off")
+# "gzip" or "none"
+SNAPSHOT_COMPRESSION = os.getenv("SNAPSHOT_COMPRESSION", "gzip").strip().lower()
+# Prompt fields up to this size are kept in the audit instead of a blob
+SNAPSHOT_INLINE_MAX_CHARS = int(os.getenv("SNAPSHOT_INLINE_MAX_CHARS", "256"))
+# After a failed blob write, snapshots stay inline for this many seconds before retrying
+SNAPSHOT_STORE_RETRY = int(os.getenv("SNAPSHOT_STORE_RETRY", "300"))
+
+_BLOB_CACHE_MAX = 256
+_KNOWN_BLOBS_MAX = 10_000
+_snapshot_store_available = True      # False only once the table is known to be missing
+_snapshot_store_retry_at = 0.0        # time.time() before which writes are not attempted
+_known_blobs: Set[str] = set()        # hashes already written by this process
+_blob_cache: Dict[str, str] = {}      # hash -> text, for rehydration
+
+def _encode_blob(text: str) -> Tuple[str, str]:
+    if SNAPSHOT_COMPRESSION == "gzip":
+        packed = gzip.compress(text.encode("utf-8"), compresslevel=6, mtime=0)
+        return "gzip+base64", base64.b64encode(packed).decode("ascii")
+    return "utf-8", text
+
+def _decode_blob(encoding: str, content: str) -> str:
+    if encoding == "gzip+base64":
+        return gzip.decompress(base64.b64decode(content)).decode("utf-8")
+    return content
+
+def _snapshot_refs(audit_meta: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Tuple[str, str]]]:
+    """(snapshot_refs for the audit, {hash: (kind, text)} blobs they point to)."""
+    blobs: Dict[str, Tuple[str, str]] = {}
+
+    def _ref(kind: str, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        blobs[digest] = (kind, text)
+        return digest
+
+    refs: Dict[str, Any] = {}
+    prompt = audit_meta.get("prompt_snapshot")
+    parts = audit_meta.get("prompt_parts") or {}
+    if prompt:
+        fields = parts.get("fields") or {}
+        if parts.get("template") and parts["template"].format(**fields) == prompt:
+            refs["prompt"] = {
+                "template": _ref("prompt_template", parts["template"]),
+                "fields": {
+                    name: {"text": value} if len(value) <= SNAPSHOT_INLINE_MAX_CHARS else {"blob": _ref(name, value)}
+                    for name, value in fields.items()
+                },
+            }
+        else:
+            refs["prompt"] = {"blob": _ref("prompt", prompt)}
+    if audit_meta.get("context_snapshot"):
+        refs["context"] = _ref("context_text", audit_meta["context_snapshot"])
+    return refs, blobs
+
+def _store_blobs(blobs: Dict[str, Tuple[str, str]]) -> bool:
+    """Writes blobs not yet known to this process; False if the store is unusable."""
+    global _snapshot_store_available, _snapshot_store_retry_at
+    missing = [h for h in blobs if h not in _known_blobs]
+    if not missing:
+        return True
+    rows = []
+    for digest in missing:
+        kind, text = blobs[digest]
+        encoding, content = _encode_blob(text)
+        rows.append({"hash": digest, "kind": kind, "encoding": encoding, "content": content, "size": len(text)})
+    try:
+        supabase.table("snapshot_blobs").upsert(rows, on_conflict="hash", ignore_duplicates=True).execute()
+    except Exception as e:
+        if str(getattr(e, "code", "")) in _MISSING_TABLE_CODES:
+            print(f"Table snapshot_blobs not found, keeping snapshots inline (see the DDL in db_utils.py): {e}")
+            _snapshot_store_available = False
+        else:
+            print(f"Error storing snapshot blobs, keeping snapshots inline for {SNAPSHOT_STORE_RETRY}s: {e}")
+            _snapshot_store_retry_at = time.time() + SNAPSHOT_STORE_RETRY
+        return False
+    if len(_known_blobs) + len(missing) > _KNOWN_BLOBS_MAX:
+        _known_blobs.clear()
+    _known_blobs.update(missing)
+    return True
+
+def _offload_snapshots(entries: List[Dict[str, Any]], audit_metas: List[Optional[Dict[str, Any]]]) -> None:
+    """Replaces inline snapshots of scan entries with snapshot_refs (one blob write for all of them)."""
+    if not (SNAPSHOT_STORE_ENABLED and _snapshot_store_available) or time.time() < _snapshot_store_retry_at:
+        return
+    pending = []
+    blobs: Dict[str, Tuple[str, str]] = {}
+    for entry, meta in zip(entries, audit_metas):
+        audit = entry.get("audit")
+        if not audit or not any(audit.get(k) for k in AUDIT_SNAPSHOT_KEYS):
+            continue
+        refs, entry_blobs = _snapshot_refs(meta or audit)
+        blobs.update(entry_blobs)
+        pending.append((audit, refs))
+    # Blobs go in before the scans; a failed scan insert only leaves unreferenced blobs.
+    if not pending or not _store_blobs(blobs):
+        return
+    for audit, refs in pending:
+        for key in AUDIT_SNAPSHOT_KEYS:
+            audit.pop(key, None)
+        audit["snapshot_refs"] = refs
+
+def get_snapshot_blobs(hashes: List[str]) -> Dict[str, str]:
+    """{hash: text} for the given blob hashes (cached; missing or unreadable ones are left out)."""
+    found = {h: _blob_cache[h] for h in hashes if h in _blob_cache}
+    missing = [h for h in dict.fromkeys(hashes) if h not in found]
+    try:
+        for i in range(0, len(missing), IN_FILTER_CHUNK):
+            chunk = missing[i:i + IN_FILTER_CHUNK]
+            response = supabase.table("snapshot_blobs").select("hash, encoding, content").in_("hash", chunk).execute()
+            for row in response.data or []:
+                found[row["hash"]] = _decode_blob(row["encoding"], row["content"])
+    except Exception as e:
+        print(f"Error fetching snapshot blobs: {e}")
+    if len(_blob_cache) + len(found) > _BLOB_CACHE_MAX:
+        _blob_cache.clear()
+    _blob_cache.update(found)
+    return found
+
+def rehydrate_snapshots(audit: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """{"prompt_snapshot", "context_snapshot"} of an audit, inline or rebuilt from its snapshot_refs."""
+    snapshots = {k: audit.get(k) for k in AUDIT_SNAPSHOT_KEYS}
+    refs = audit.get("snapshot_refs") or {}
+    prompt_ref = refs.get("prompt") or {}
+    fields = prompt_ref.get("fields") or {}
+    wanted = [refs.get("context"), prompt_ref.get("blob"), prompt_ref.get("template")]
+    wanted += [f.get("blob") for f in fields.values()]
+    blobs = get_snapshot_blobs([h for h in wanted if h])
+
+    if not snapshots["context_snapshot"] and refs.get("context"):
+        snapshots["context_snapshot"] = blobs.get(refs["context"])
+    if not snapshots["prompt_snapshot"] and prompt_ref:
+        if prompt_ref.get("blob"):
+            snapshots["prompt_snapshot"] = blobs.get(prompt_ref["blob"])
+        else:
+            values = {name: f["text"] if "text" in f else blobs.get(f.get("blob")) for name, f in fields.items()}
+            template = blobs.get(prompt_ref.get("template"))
+            if template is not None and all(v is not None for v in values.values()):
+                snapshots["prompt_snapshot"] = template.format(**values)
+    return snapshots
+
+def add_scan(
+    feature_id: str,
+    feature_snapshot: Dict[str, Any],
+    analysis: Dict[str, Any],
+    *,
+    audit_meta: Optional[Dict[str, Any]] = None,
+    version: Optional[str] = "v1"
+) -> str:
+    """
+    Append a new scan entry for a feature to the Supabase 'scans' table.
+    Returns the new scan_id.
+    """
+    scan_entry = _build_scan_entry(feature_id, feature_snapshot, analysis, audit_meta, version)
+    _offload_snapshots([scan_entry], [audit_meta])
 
     try:
         response = supabase.table("scans").insert(scan_entry).execute()
@@ -119,24 +562,253 @@ def add_scan(
         print(f"Error adding scan: {e}")
         raise
 
-def get_scans_for_feature(feature_id: str) -> List[Dict[str, Any]]:
+def add_scans_bulk(scans: List[Dict[str, Any]]) -> List[str]:
+    """
+    Insert many scans with a single request.
+    Each item takes the add_scan() arguments as keys: feature_id, feature_snapshot,
+    analysis and optionally audit_meta / version.
+    Returns the new scan_ids in input order.
+    """
+    if not scans:
+        return []
+    entries = [
+        _build_scan_entry(
+            s["feature_id"], s["feature_snapshot"], s["analysis"],
+            s.get("audit_meta"), s.get("version", "v1"),
+        )
+        for s in scans
+    ]
+    _offload_snapshots(entries, [s.get("audit_meta") for s in scans])
+    try:
+        response = supabase.table("scans").insert(entries).execute()
+        return [row['scan_id'] for row in response.data]
+    except Exception as e:
+        print(f"Error adding scans in bulk: {e}")
+        raise
+
+def get_scans_for_feature(feature_id: str, projection: str = "summary") -> List[Dict[str, Any]]:
     """
     Return scans for a feature from Supabase, sorted newest-first.
+    `projection` names a SCAN_PROJECTIONS entry; use "full" only when the audit
+    snapshots are really needed.
     """
     try:
-        response = supabase.table("scans").select("*").eq("feature_id", feature_id).order("timestamp_utc", desc=True).execute()
-        return response.data
+        response = (supabase.table("scans").select(SCAN_PROJECTIONS[projection])
+                    .eq("feature_id", feature_id).order("timestamp_utc", desc=True).execute())
+        return [_shape_scan_row(r) for r in response.data]
     except Exception as e:
         print(f"Error fetching scans for feature {feature_id}: {e}")
         return []
+
+def get_scan_headers_page(feature_id: str,
+                          limit: Optional[int] = None,
+                          cursor: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    One page of a feature's scans, newest first, with the "summary" projection
+    (fetch the payload of a scan with get_scan_details()). Keyset pagination on
+    (timestamp_utc, scan_id); the returned cursor is None on the last page.
+    """
+    limit = max(1, limit or SCAN_PAGE_SIZE)
+    try:
+        query = supabase.table("scans").select(SCAN_PROJECTIONS["summary"]).eq("feature_id", feature_id)
+        response = (_keyset_after(query, cursor, "timestamp_utc", "scan_id")
+                    .order("timestamp_utc", desc=True).order("scan_id", desc=True)
+                    .limit(limit + 1).execute())
+    except Exception as e:
+        print(f"Error fetching scans for feature {feature_id}: {e}")
+        return [], None
+    rows = response.data or []
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], {"timestamp_utc": last["timestamp_utc"], "scan_id": last["scan_id"]}
+
+def get_scan_details(scan_id: str, projection: str = "detail") -> Optional[Dict[str, Any]]:
+    """
+    A single scan with the given SCAN_PROJECTIONS entry. The default "detail" has
+    analysis, feature snapshot and audit without the prompt/context snapshots;
+    "snapshots" has just those two.
+    """
+    try:
+        response = (supabase.table("scans").select(SCAN_PROJECTIONS[projection])
+                    .eq("scan_id", scan_id).limit(1).execute())
+        return _shape_scan_row(response.data[0]) if response.data else None
+    except Exception as e:
+        print(f"Error fetching scan {scan_id}: {e}")
+        return None
+
+def get_scan_snapshots(scan_id: str) -> Optional[Dict[str, Optional[str]]]:
+    """Prompt and context snapshots of one scan, rebuilt from the snapshot store when needed."""
+    row = get_scan_details(scan_id, projection="snapshots")
+    if row is None:
+        return None
+    return rehydrate_snapshots(row)
+
+def get_scan_stats(feature_id: str) -> Dict[str, int]:
+    """{"scan_count", "yes_count"} for a feature, from two exact counts (no rows transferred)."""
+    stats = {"scan_count": 0, "yes_count": 0}
+    try:
+        total = (supabase.table("scans").select("scan_id", count="exact")
+                 .eq("feature_id", feature_id).limit(1).execute())
+        yes = (supabase.table("scans").select("scan_id", count="exact")
+               .eq("feature_id", feature_id).eq("analysis->>classification", "YES").limit(1).execute())
+        stats["scan_count"], stats["yes_count"] = total.count or 0, yes.count or 0
+    except Exception as e:
+        print(f"Error counting scans for feature {feature_id}: {e}")
+    return stats
+
+# ----- Latest scan per feature -----
+# One row per scanned feature (its latest scan plus the scan count), so the
+# dashboard, "changed" detection and rule impact read O(features) rows instead
+# of the whole scans table:
+#
+#   create index if not exists scans_feature_latest_idx on scans (feature_id, timestamp_utc desc, scan_id desc);
+#   create or replace view latest_scans as
+#   select distinct on (feature_id)
+#          feature_id, scan_id, timestamp_utc,
+#          analysis->>'classification'   as classification,
+#          analysis->>'regulation'       as regulation,
+#          analysis->'triggered_rules'   as triggered_rules,
+#          audit->>'input_fingerprint'   as input_fingerprint,
+#          audit->'rules_context_ids'    as rules_context_ids,
+#          count(*) over (partition by feature_id) as scan_count
+#   from scans
+#   order by feature_id, timestamp_utc desc, scan_id desc;
+#
+# Without the view the same rows are derived from a paged pass over `scans`.
+_latest_scans_view_available = True
+
+def _fetch_latest_scans(view_columns: str, scan_columns: str) -> List[Dict[str, Any]]:
+    """
+    Latest scan row of every scanned feature, with `view_columns` from latest_scans
+    (keyset-paged on feature_id, so concurrent inserts cannot skip or repeat rows).
+    Falls back to `scan_columns` over the scans table, newest first per feature,
+    counting scans into "scan_count". Raises on errors.
+    """
+    global _latest_scans_view_available
+    if _latest_scans_view_available:
+        try:
+            rows: List[Dict[str, Any]] = []
+            last = None
+            while True:
+                query = supabase.table("latest_scans").select(view_columns).order("feature_id")
+                if last is not None:
+                    query = query.gt("feature_id", last)
+                page = query.limit(PAGE_SIZE).execute().data or []
+                rows.extend(page)
+                if len(page) < PAGE_SIZE:
+                    return rows
+                last = page[-1]["feature_id"]
+        except Exception as e:
+            if str(getattr(e, "code", "")) not in _MISSING_TABLE_CODES:
+                raise
+            print("View latest_scans not found, reading the scans table instead (see the DDL in db_utils.py)")
+            _latest_scans_view_available = False
+
+    rows = _fetch_all_pages(
+        lambda: supabase.table("scans").select(scan_columns)
+        .order("timestamp_utc", desc=True).order("scan_id", desc=True)
+    )
+    latest: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        first = latest.setdefault(row["feature_id"], dict(row, scan_count=0))
+        first["scan_count"] += 1
+    return list(latest.values())
+
+def get_scan_summaries() -> Dict[str, Dict[str, Any]]:
+    """
+    Latest scan + scan count for every scanned feature (see latest_scans above).
+    Returns {feature_id: {"latest_classification", "latest_timestamp_utc", "scan_count"}}.
+    """
+    try:
+        rows = _fetch_latest_scans(
+            "feature_id, timestamp_utc, classification, scan_count",
+            "feature_id, timestamp_utc, classification:analysis->>classification",
+        )
+    except Exception as e:
+        print(f"Error fetching scan summaries: {e}")
+        return {}
+    return {
+        row["feature_id"]: {
+            "latest_classification": row.get("classification") or "N/A",
+            "latest_timestamp_utc": row.get("timestamp_utc"),
+            "scan_count": int(row.get("scan_count") or 1),
+        }
+        for row in rows
+    }
     
+def get_latest_scan_fingerprints() -> Dict[str, Optional[str]]:
+    """
+    {feature_id: input_fingerprint of its latest scan} for every scanned feature
+    (None for scans recorded before fingerprints existed).
+    """
+    try:
+        rows = _fetch_latest_scans(
+            "feature_id, input_fingerprint",
+            "feature_id, timestamp_utc, input_fingerprint:audit->>input_fingerprint",
+        )
+    except Exception as e:
+        # Raise rather than return {}: an empty map would mark every feature as changed.
+        print(f"Error fetching scan fingerprints: {e}")
+        raise
+    return {row["feature_id"]: row.get("input_fingerprint") for row in rows}
+
+def get_latest_scan_rule_refs() -> Dict[str, Dict[str, List[str]]]:
+    """
+    Rules referenced by the latest scan of every scanned feature:
+    {feature_id: {"context": rules_context_ids sent to the model,
+                  "triggered": rule ids of triggered_rules plus the cited regulation}}.
+    """
+    try:
+        rows = _fetch_latest_scans(
+            "feature_id, rules_context_ids, triggered_rules, regulation",
+            "feature_id, timestamp_utc, rules_context_ids:audit->rules_context_ids, "
+            "triggered_rules:analysis->triggered_rules, regulation:analysis->>regulation",
+        )
+    except Exception as e:
+        # Raise rather than return {}: an empty map would report that no feature is affected.
+        print(f"Error fetching scan rule references: {e}")
+        raise
+    refs: Dict[str, Dict[str, List[str]]] = {}
+    for row in rows:
+        triggered = [str(t.get("rule_id")) for t in row.get("triggered_rules") or []
+                     if isinstance(t, dict) and t.get("rule_id")]
+        regulation = row.get("regulation")
+        if regulation and regulation != "None" and regulation not in triggered:
+            triggered.append(regulation)
+        refs[row["feature_id"]] = {
+            "context": [str(rid) for rid in row.get("rules_context_ids") or [] if rid],
+            "triggered": triggered,
+        }
+    return refs
+
+def get_features_for_fingerprint() -> List[Dict[str, Any]]:
+    """All features with just the columns that feed a scan (paged)."""
+    try:
+        return _fetch_all_pages(
+            lambda: supabase.table("features").select(FEATURE_PROJECTIONS["scan_input"]).order("id")
+        )
+    except Exception as e:
+        print(f"Error fetching features for fingerprinting: {e}")
+        raise
+
 # ========================== Legal Rules ===========================
-    
+# Optional `updated_at` column; with it the cache's version probe also sees rules
+# edited in place by other processes (the app while a CLI batch runs, other workers):
+#
+#   alter table laws add column if not exists updated_at timestamptz not null default now();
+#   create or replace function laws_touch_updated_at() returns trigger language plpgsql as
+#     $$ begin new.updated_at = now(); return new; end $$;
+#   create trigger laws_touch_updated_at before update on laws
+#     for each row execute function laws_touch_updated_at();
+
+def _fetch_legal_rules() -> List[Dict[str, Any]]:
+    return _fetch_all_pages(lambda: supabase.table("laws").select("*").order("id"))
+
 def get_all_legal_rules() -> List[Dict[str, Any]]:
     """Fetches all legal rules from the database."""
     try:
-        response = supabase.table("laws").select("*").execute()
-        return response.data
+        return _fetch_legal_rules()
     except Exception as e:
         print(f"Error fetching legal rules: {e}")
         return []
@@ -150,9 +822,12 @@ def add_or_update_legal_rule(rule_details: Dict[str, Any]) -> Optional[str]:
     if not rule_details.get("id"):
         print("Error: Rule details must include an 'id' to add or update.")
         return None
+    if _laws_has_updated_at:
+        rule_details = {**rule_details, "updated_at": datetime.now(timezone.utc).isoformat()}
     try:
         # Upsert handles both creating and updating in a single call
         response = supabase.table("laws").upsert(rule_details, on_conflict="id").execute()
+        invalidate_legal_rules_cache()
         return response.data[0]['id']
     except Exception as e:
         print(f"Error adding or updating legal rule: {e}")
@@ -167,19 +842,114 @@ def delete_legal_rules(rule_ids: List[str]) -> int:
         return 0
     try:
         response = supabase.table("laws").delete().in_("id", rule_ids).execute()
+        invalidate_legal_rules_cache()
         return len(response.data)
     except Exception as e:
         print(f"Error deleting legal rules: {e}")
         return 0
     
+# ======================= Legal Rules Cache ========================
+# Scans share one in-memory snapshot of the `laws` table. After the TTL expires
+# a cheap version probe (row count + latest updated_at) decides whether the
+# snapshot is still current; without the updated_at column the table is re-read
+# and compared by content hash. Writes through this module invalidate it at once.
+LEGAL_RULES_CACHE_TTL = float(os.getenv("LEGAL_RULES_CACHE_TTL", "300"))
+
+_rules_cache_lock = threading.Lock()
+_rules_cache: Dict[str, Any] = {
+    "rules": None,       # List[Dict] shared by all readers; treat as read-only
+    "version": None,     # result of _legal_rules_version() at fetch time
+    "content_hash": None,
+    "checked_at": 0.0,   # monotonic time of the last fetch or version probe
+}
+# None until the first probe; False once Postgres reports the column missing
+_laws_has_updated_at: Optional[bool] = None
+_UNDEFINED_COLUMN_CODES = ("42703",)
+
+def _legal_rules_version() -> Optional[Tuple[Optional[int], Optional[str]]]:
+    """
+    Cheap change probe for the 'laws' table: (row count, max(updated_at)).
+    Returns None if the table has no updated_at column (only a re-read can tell
+    whether rules were edited in place) or the probe fails.
+    """
+    global _laws_has_updated_at
+    if _laws_has_updated_at is False:
+        return None
+    try:
+        response = (supabase.table("laws").select("updated_at", count="exact")
+                    .order("updated_at", desc=True).limit(1).execute())
+    except Exception as e:
+        if str(getattr(e, "code", "")) in _UNDEFINED_COLUMN_CODES:
+            _laws_has_updated_at = False
+        else:
+            print(f"Error probing legal rules version: {e}")
+        return None
+    _laws_has_updated_at = True
+    latest = response.data[0].get("updated_at") if response.data else None
+    return response.count, latest
+
+def _rules_content_hash(rules: List[Dict[str, Any]]) -> str:
+    canon = json.dumps(rules, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()
+
+def get_cached_legal_rules(force_refresh: bool = False) -> List[Dict[str, Any]]:
+    """
+    Cached variant of get_all_legal_rules() for the scan pipeline.
+    The list is shared between callers and must not be mutated. It is only
+    replaced when the rules changed, so callers can memoize on its identity.
+    """
+    with _rules_cache_lock:
+        now = time.monotonic()
+        rules = _rules_cache["rules"]
+        if rules is not None and not force_refresh:
+            if now - _rules_cache["checked_at"] < LEGAL_RULES_CACHE_TTL:
+                return rules
+            version = _legal_rules_version()
+            if version is not None and version == _rules_cache["version"]:
+                _rules_cache["checked_at"] = now
+                return rules
+        else:
+            version = _legal_rules_version()
+
+        try:
+            fresh = _fetch_legal_rules()
+        except Exception as e:
+            print(f"Error fetching legal rules: {e}")
+            if rules is not None:
+                # Keep serving the last good snapshot; retry on the next probe.
+                _rules_cache["checked_at"] = now
+                return rules
+            return []
+
+        content_hash = _rules_content_hash(fresh)
+        if rules is None or content_hash != _rules_cache["content_hash"]:
+            _rules_cache["rules"] = rules = fresh
+            _rules_cache["content_hash"] = content_hash
+        _rules_cache["version"] = version
+        _rules_cache["checked_at"] = now
+        return rules
+
+def invalidate_legal_rules_cache() -> None:
+    """Drops the cached rules so the next reader fetches a fresh snapshot."""
+    with _rules_cache_lock:
+        _rules_cache["rules"] = None
+        _rules_cache["version"] = None
+        _rules_cache["checked_at"] = 0.0
+
 # ========================= Terminology ==========================
 
-def get_all_terminology() -> List[Dict[str, str]]:
-    """Fetches all terminology entries from the database."""
+def get_all_terminology(raise_errors: bool = False) -> List[Dict[str, str]]:
+    """
+    Fetches all terminology entries from the database.
+    With raise_errors=True a failed fetch raises instead of returning [],
+    so callers can tell an outage from an empty table.
+    """
     try:
         response = supabase.table("terminology").select("term, expansion").execute()
         return response.data
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error fetching terminology: {e}")
         return []
     
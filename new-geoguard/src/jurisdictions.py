@@ -0,0 +1,237 @@
+# src/jurisdictions.py
+from __future__ import annotations
+
+import re
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+# Deterministic location extraction + jurisdiction containment, used to drop
+# rules for unrelated jurisdictions before keyword ranking. Codes are ISO-like:
+# countries "US", subdivisions "US-CA", blocs "EU"/"EEA", and "GLOBAL".
+
+GLOBAL = "GLOBAL"
+
+# ============================ Hierarchy =============================
+# code -> parent codes (a country may sit in several blocs)
+_PARENTS: Dict[str, Tuple[str, ...]] = {}
+
+_EU_MEMBERS = {
+    "AT": "Austria", "BE": "Belgium", "BG": "Bulgaria", "HR": "Croatia", "CY": "Cyprus",
+    "CZ": "Czechia", "DK": "Denmark", "EE": "Estonia", "FI": "Finland", "FR": "France",
+    "DE": "Germany", "GR": "Greece", "HU": "Hungary", "IE": "Ireland", "IT": "Italy",
+    "LV": "Latvia", "LT": "Lithuania", "LU": "Luxembourg", "MT": "Malta", "NL": "Netherlands",
+    "PL": "Poland", "PT": "Portugal", "RO": "Romania", "SK": "Slovakia", "SI": "Slovenia",
+    "ES": "Spain", "SE": "Sweden",
+}
+_EEA_ONLY = {"IS": "Iceland", "LI": "Liechtenstein", "NO": "Norway"}
+_OTHER_COUNTRIES = {
+    "US": "United States", "CA": "Canada", "MX": "Mexico", "BR": "Brazil", "AR": "Argentina",
+    "CL": "Chile", "CO": "Colombia", "PE": "Peru", "GB": "United Kingdom", "CH": "Switzerland",
+    "TR": "Turkey", "RU": "Russia", "UA": "Ukraine", "IN": "India", "CN": "China",
+    "JP": "Japan", "KR": "South Korea", "SG": "Singapore", "MY": "Malaysia", "ID": "Indonesia",
+    "TH": "Thailand", "VN": "Vietnam", "PH": "Philippines", "AU": "Australia", "NZ": "New Zealand",
+    "AE": "United Arab Emirates", "SA": "Saudi Arabia", "IL": "Israel", "ZA": "South Africa",
+    "NG": "Nigeria", "KE": "Kenya", "EG": "Egypt", "HK": "Hong Kong", "TW": "Taiwan",
+    "BH": "Bahrain",
+}
+_US_STATES = {
+    "AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas", "CA": "California",
+    "CO": "Colorado", "CT": "Connecticut", "DE": "Delaware", "FL": "Florida", "GA": "Georgia",
+    "HI": "Hawaii", "ID": "Idaho", "IL": "Illinois", "IN": "Indiana", "IA": "Iowa",
+    "KS": "Kansas", "KY": "Kentucky", "LA": "Louisiana", "ME": "Maine", "MD": "Maryland",
+    "MA": "Massachusetts", "MI": "Michigan", "MN": "Minnesota", "MS": "Mississippi", "MO": "Missouri",
+    "MT": "Montana", "NE": "Nebraska", "NV": "Nevada", "NH": "New Hampshire", "NJ": "New Jersey",
+    "NM": "New Mexico", "NY": "New York", "NC": "North Carolina", "ND": "North Dakota", "OH": "Ohio",
+    "OK": "Oklahoma", "OR": "Oregon", "PA": "Pennsylvania", "RI": "Rhode Island", "SC": "South Carolina",
+    "SD": "South Dakota", "TN": "Tennessee", "TX": "Texas", "UT": "Utah", "VT": "Vermont",
+    "VA": "Virginia", "WA": "Washington", "WV": "West Virginia", "WI": "Wisconsin", "WY": "Wyoming",
+    "DC": "District of Columbia",
+}
+_CA_PROVINCES = {
+    "AB": "Alberta", "BC": "British Columbia", "MB": "Manitoba", "NB": "New Brunswick",
+    "NL": "Newfoundland and Labrador", "NS": "Nova Scotia", "ON": "Ontario",
+    "PE": "Prince Edward Island", "QC": "Quebec", "SK": "Saskatchewan",
+}
+_AU_STATES = {
+    "NSW": "New South Wales", "VIC": "Victoria", "QLD": "Queensland", "WA": "Western Australia",
+    "SA": "South Australia", "TAS": "Tasmania",
+}
+
+for _code in _EU_MEMBERS:
+    _PARENTS[_code] = ("EU", "EEA")
+for _code in _EEA_ONLY:
+    _PARENTS[_code] = ("EEA",)
+for _code in _OTHER_COUNTRIES:
+    _PARENTS.setdefault(_code, ())
+for _code in _US_STATES:
+    _PARENTS[f"US-{_code}"] = ("US",)
+for _code in _CA_PROVINCES:
+    _PARENTS[f"CA-{_code}"] = ("CA",)
+for _code in _AU_STATES:
+    _PARENTS[f"AU-{_code}"] = ("AU",)
+_PARENTS.update({"EU": ("EEA",), "EEA": (), "GB-ENG": ("GB",), "GB-SCT": ("GB",),
+                 "GB-WLS": ("GB",), "GB-NIR": ("GB",)})
+
+def _ancestors_of(code: str) -> FrozenSet[str]:
+    seen: Set[str] = set()
+    stack = [code]
+    while stack:
+        c = stack.pop()
+        if c in seen:
+            continue
+        seen.add(c)
+        stack.extend(_PARENTS.get(c, ()))
+    return frozenset(seen)
+
+# Precomputed closure: code -> {code, parent, grandparent, ...}
+_ANCESTORS: Dict[str, FrozenSet[str]] = {c: _ancestors_of(c) for c in _PARENTS}
+
+def ancestors(code: str) -> FrozenSet[str]:
+    return _ANCESTORS.get(code) or frozenset({code})
+
+def is_related(a: str, b: str) -> bool:
+    """True if jurisdiction `a` equals, contains, or is contained by `b`."""
+    if a == GLOBAL or b == GLOBAL:
+        return True
+    return a in ancestors(b) or b in ancestors(a)
+
+
+# ============================= Aliases ==============================
+# Place names are matched capitalised ("Turkey", "TURKEY") but not in lower case,
+# where many are ordinary words ("turkey", "china", "jersey"). "Georgia" is read
+# as the US state and "Washington" as the state unless written as D.C.
+_NAMES: Dict[str, str] = {}
+for _code, _name in {**_EU_MEMBERS, **_EEA_ONLY, **_OTHER_COUNTRIES}.items():
+    _NAMES[_name] = _code
+for _code, _name in _US_STATES.items():
+    _NAMES[_name] = f"US-{_code}"
+for _code, _name in _CA_PROVINCES.items():
+    _NAMES[_name] = f"CA-{_code}"
+for _code, _name in _AU_STATES.items():
+    _NAMES[_name] = f"AU-{_code}"
+_NAMES.update({
+    "Holland": "NL", "Great Britain": "GB", "Britain": "GB",
+    "England": "GB-ENG", "Scotland": "GB-SCT", "Wales": "GB-WLS", "Northern Ireland": "GB-NIR",
+    "Korea": "KR", "Deutschland": "DE", "Brasil": "BR", "Europe": "EU", "Québec": "CA-QC",
+})
+# Unambiguous in any case
+_ALIASES_CI: Dict[str, str] = {
+    "usa": "US", "united states": "US", "united states of america": "US", "united kingdom": "GB",
+    "czech republic": "CZ", "republic of korea": "KR", "south korea": "KR",
+    "european union": "EU", "european economic area": "EEA",
+    "washington dc": "US-DC", "washington d.c.": "US-DC", "washington, d.c.": "US-DC",
+    "new york city": "US-NY", "nyc": "US-NY",
+    "global": GLOBAL, "worldwide": GLOBAL, "international": GLOBAL,
+}
+# Case-sensitive: capitalised / upper-case names, and codes that collide with
+# ordinary words in lower case.
+_ALIASES_CS: Dict[str, str] = {
+    "US": "US", "U.S.": "US", "U.S.A.": "US", "UK": "GB", "U.K.": "GB",
+    "EU": "EU", "EEA": "EEA", "UAE": "AE", "D.C.": "US-DC", "PRC": "CN",
+}
+for _name, _code in _NAMES.items():
+    _ALIASES_CS.setdefault(_name, _code)
+    _ALIASES_CS.setdefault(_name.upper(), _code)
+# Every name in any case, for short structured labels such as a rule's jurisdiction
+_ALIASES_ANY_CASE: Dict[str, str] = {**{n.lower(): c for n, c in _NAMES.items()}, **_ALIASES_CI}
+
+# Capitalised phrases that are not places; masked before matching
+_NOT_PLACES_RE = re.compile(
+    r"\b(?:Maine\s+[Cc]oons?|Turkey\s+(?:[Bb]acon|[Bb]reast|[Bb]urgers?|[Dd]inners?|[Ss]andwich(?:es)?)"
+    r"|Chile\s+(?:[Pp]eppers?|[Pp]owder|[Ss]auce)|China\s+(?:[Cc]lay|[Dd]olls?|[Cc]abinets?))\b"
+)
+
+def _alias_regex(aliases: Iterable[str], flags: int = 0) -> re.Pattern:
+    alts = "|".join(re.escape(a) for a in sorted(aliases, key=len, reverse=True))
+    return re.compile(rf"(?<![A-Za-z0-9])({alts})(?![A-Za-z0-9])", flags)
+
+_CI_RE = _alias_regex(_ALIASES_CI, re.IGNORECASE)
+_CS_RE = _alias_regex(_ALIASES_CS)
+_ANY_CASE_RE = _alias_regex(_ALIASES_ANY_CASE, re.IGNORECASE)
+
+
+# =========================== Cloud regions ==========================
+# Known cloud regions (AWS / GCP / Azure) -> deployment country or subdivision
+_CLOUD_REGIONS: Dict[str, str] = {
+    # AWS
+    "us-east-1": "US-VA", "us-east-2": "US-OH", "us-west-1": "US-CA", "us-west-2": "US-OR",
+    "ca-central-1": "CA", "ca-west-1": "CA-AB", "sa-east-1": "BR", "mx-central-1": "MX",
+    "eu-west-1": "IE", "eu-west-2": "GB", "eu-west-3": "FR", "eu-central-1": "DE",
+    "eu-central-2": "CH", "eu-north-1": "SE", "eu-south-1": "IT", "eu-south-2": "ES",
+    "ap-south-1": "IN", "ap-south-2": "IN", "ap-northeast-1": "JP", "ap-northeast-2": "KR",
+    "ap-northeast-3": "JP", "ap-southeast-1": "SG", "ap-southeast-2": "AU", "ap-southeast-3": "ID",
+    "ap-southeast-4": "AU", "ap-east-1": "HK", "me-south-1": "BH", "me-central-1": "AE",
+    "il-central-1": "IL", "af-south-1": "ZA",
+    # GCP
+    "us-central1": "US-IA", "us-east1": "US-SC", "us-east4": "US-VA", "us-west1": "US-OR",
+    "us-west2": "US-CA", "us-west3": "US-UT", "us-west4": "US-NV",
+    "europe-west1": "BE", "europe-west2": "GB", "europe-west3": "DE", "europe-west4": "NL",
+    "europe-west6": "CH", "europe-west9": "FR", "europe-north1": "FI",
+    "asia-south1": "IN", "asia-northeast1": "JP", "asia-northeast3": "KR",
+    "asia-southeast1": "SG", "asia-east1": "TW", "asia-east2": "HK",
+    "australia-southeast1": "AU", "southamerica-east1": "BR", "northamerica-northeast1": "CA-QC",
+    # Azure
+    "eastus": "US-VA", "eastus2": "US-VA", "westus": "US-CA", "westus2": "US-WA",
+    "centralus": "US-IA", "northeurope": "IE", "westeurope": "NL", "uksouth": "GB",
+    "francecentral": "FR", "germanywestcentral": "DE", "centralindia": "IN",
+    "japaneast": "JP", "southeastasia": "SG", "australiaeast": "AU-NSW", "brazilsouth": "BR",
+    "canadacentral": "CA-ON",
+}
+# Unknown regions still reveal their country/bloc by prefix
+_CLOUD_PREFIX = {
+    "us": "US", "ca": "CA", "sa": "BR", "mx": "MX", "eu": "EU", "europe": "EU",
+    "uk": "GB", "in": "IN", "jp": "JP", "au": "AU", "australia": "AU",
+    "southamerica": "BR", "northamerica": "US",
+}
+_CLOUD_RE = re.compile(
+    r"(?<![A-Za-z0-9-])("
+    r"(?:us|ca|sa|mx|eu|ap|me|af|il)-(?:north|south|east|west|central|northeast|northwest|southeast|southwest)-\d"
+    r"|(?:us|europe|asia|australia|southamerica|northamerica|me|africa)-[a-z]+\d"
+    r"|" + "|".join(re.escape(r) for r in sorted((k for k in _CLOUD_REGIONS if "-" not in k), key=len, reverse=True)) +
+    r")(?![A-Za-z0-9-])",
+    re.IGNORECASE,
+)
+
+
+# ============================ Extraction ============================
+def _mask(text: str, pattern: re.Pattern) -> str:
+    return pattern.sub(lambda m: " " * len(m.group(0)), text)
+
+def extract_locations(text: str, *, any_case: bool = False) -> List[str]:
+    """
+    Jurisdiction codes mentioned in `text` (names, abbreviations, cloud regions), sorted.
+    Cloud regions are read whole ("europe-west1" is Belgium, not Europe). Place names
+    count only when capitalised unless `any_case` is set (for short labels, not prose).
+    """
+    if not text:
+        return []
+    found: Set[str] = set()
+    for m in _CLOUD_RE.finditer(text):
+        region = m.group(1).lower()
+        code = _CLOUD_REGIONS.get(region) or _CLOUD_PREFIX.get(region.split("-", 1)[0])
+        if code:
+            found.add(code)
+    text = _mask(_mask(text, _CLOUD_RE), _NOT_PLACES_RE)
+    # Longer case-insensitive aliases first and masked, so "Washington, D.C." is not also Washington
+    pattern, table = (_ANY_CASE_RE, _ALIASES_ANY_CASE) if any_case else (_CI_RE, _ALIASES_CI)
+    for m in pattern.finditer(text):
+        found.add(table[m.group(1).lower()])
+    text = _mask(text, pattern)
+    for m in _CS_RE.finditer(text):
+        found.add(_ALIASES_CS[m.group(1)])
+    return sorted(found)
+
+def parse_jurisdiction(label: Optional[str]) -> Optional[FrozenSet[str]]:
+    """
+    Codes covered by a rule's free-text jurisdiction ("USA", "California, US", "EU").
+    None means the rule is not tied to a recognisable place and always applies.
+    """
+    codes = set(extract_locations(label or "", any_case=True))
+    if not codes or GLOBAL in codes:
+        return None
+    return frozenset(codes)
+
+def matches_any(rule_codes: Optional[FrozenSet[str]], locations: Iterable[str]) -> bool:
+    """True if a rule with `rule_codes` may apply to any of the feature `locations`."""
+    if rule_codes is None:
+        return True
+    return any(is_related(loc, rc) for loc in locations for rc in rule_codes)
@@ -0,0 +1,169 @@
+# src/llm_client.py
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+# ============================== Config ==============================
+# Quotas shared by every call in this process (0 disables a limit)
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "60"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "1000000"))
+# Retries for transient failures (429 / 5xx / timeouts)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30.0"))
+# Per-attempt timeout in seconds
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "60"))
+
+_TRANSIENT_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "BadGateway",
+}
+
+
+class LLMCallError(Exception):
+    """Raised when a call fails permanently or runs out of retries."""
+
+    def __init__(self, message: str, *, attempts: int, cause: Optional[BaseException] = None):
+        super().__init__(message)
+        self.attempts = attempts
+        self.cause = cause
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """429, 5xx and timeouts are worth retrying; everything else is not."""
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if type(exc).__name__ in _TRANSIENT_NAMES:
+        return True
+    code = getattr(exc, "code", None)
+    try:
+        code = int(code)
+    except (TypeError, ValueError):
+        return False
+    return code == 429 or 500 <= code < 600
+
+def backoff_delay(attempt: int,
+                  base: float = LLM_BACKOFF_BASE,
+                  cap: float = LLM_BACKOFF_MAX) -> float:
+    """Full-jitter exponential backoff for retry number `attempt` (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used for quota accounting."""
+    return max(1, len(text or "") // 4)
+
+
+# ============================ Rate limit ============================
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute` units per minute.
+    take() reserves capacity immediately and returns how long the caller must wait
+    before using it, so waiters are served in arrival order. Thread-safe.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, amount: float = 1.0) -> float:
+        if self.rate <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, amount: float = 1.0) -> None:
+        wait = self.take(amount)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, amount: float = 1.0) -> None:
+        wait = self.take(amount)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+# ============================== Client ==============================
+class GeminiClient:
+    """
+    Shared call layer around a genai.GenerativeModel: request/token quotas,
+    per-attempt timeouts and jittered exponential backoff on transient errors.
+    generate() and agenerate() return (response, retries_used); `model` overrides
+    the client's model for one call (e.g. one bound to cached content).
+    """
+
+    def __init__(self, model: Any, *,
+                 rpm: int = LLM_RPM_LIMIT,
+                 tpm: int = LLM_TPM_LIMIT,
+                 max_retries: int = LLM_MAX_RETRIES,
+                 timeout: float = LLM_CALL_TIMEOUT):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max(0, max_retries)
+        self.timeout = timeout
+
+    def _cost(self, prompt: str, generation_config: Any) -> int:
+        max_out = getattr(generation_config, "max_output_tokens", None) or 0
+        return estimate_tokens(prompt) + int(max_out)
+
+    def _request_options(self) -> dict:
+        return {"timeout": self.timeout} if self.timeout > 0 else {}
+
+    def generate(self, prompt: str, generation_config: Any, model: Any = None) -> Tuple[Any, int]:
+        cost = self._cost(prompt, generation_config)
+        model = model or self.model
+        for attempt in range(self.max_retries + 1):
+            self.requests.acquire()
+            self.tokens.acquire(cost)
+            try:
+                resp = model.generate_content(
+                    prompt,
+                    generation_config=generation_config,
+                    request_options=self._request_options(),
+                )
+                return resp, attempt
+            except Exception as e:
+                if not is_transient_error(e):
+                    raise LLMCallError(str(e), attempts=attempt + 1, cause=e) from e
+                if attempt >= self.max_retries:
+                    raise LLMCallError(f"{e} (gave up after {attempt + 1} attempts)",
+                                       attempts=attempt + 1, cause=e) from e
+                time.sleep(backoff_delay(attempt))
+        raise AssertionError("unreachable")
+
+    async def agenerate(self, prompt: str, generation_config: Any, model: Any = None) -> Tuple[Any, int]:
+        cost = self._cost(prompt, generation_config)
+        model = model or self.model
+        for attempt in range(self.max_retries + 1):
+            await self.requests.aacquire()
+            await self.tokens.aacquire(cost)
+            try:
+                call = model.generate_content_async(prompt, generation_config=generation_config)
+                if self.timeout > 0:
+                    resp = await asyncio.wait_for(call, timeout=self.timeout)
+                else:
+                    resp = await call
+                return resp, attempt
+            except Exception as e:
+                if not is_transient_error(e):
+                    raise LLMCallError(str(e), attempts=attempt + 1, cause=e) from e
+                if attempt >= self.max_retries:
+                    raise LLMCallError(f"{e} (gave up after {attempt + 1} attempts)",
+                                       attempts=attempt + 1, cause=e) from e
+                await asyncio.sleep(backoff_delay(attempt))
+        raise AssertionError("unreachable")
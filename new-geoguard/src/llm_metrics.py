@@ -0,0 +1,105 @@
+# src/llm_metrics.py
+from __future__ import annotations
+
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, Optional
+
+# ============================== Config ==============================
+# Latencies kept for the rolling percentiles
+LLM_METRICS_WINDOW = int(os.getenv("LLM_METRICS_WINDOW", "1000"))
+
+
+def _percentile(sorted_values, q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+# ============================ Aggregator ============================
+class LLMMetrics:
+    """
+    Running totals over per-call audit metadata (see ai_core: prompt_tokens,
+    output_tokens, latency_ms, retries, cache_hit, status). Tokens are split into
+    billed (model was called) and saved (answered from the response cache);
+    context_cache_tokens is the part of the billed prompt tokens served from a
+    Gemini cached-content handle.
+    Latency percentiles cover the last `window` model calls. Thread-safe.
+    """
+
+    def __init__(self, window: int = LLM_METRICS_WINDOW):
+        self._lock = threading.Lock()
+        self._window = window
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts = {
+                "calls": 0,
+                "model_calls": 0,
+                "cache_hits": 0,
+                "errors": 0,
+                "retries": 0,
+                "prompt_tokens": 0,
+                "output_tokens": 0,
+                "cached_prompt_tokens": 0,
+                "cached_output_tokens": 0,
+                "max_prompt_tokens": 0,
+                "context_cache_tokens": 0,
+            }
+            self._latencies: deque = deque(maxlen=max(1, self._window))
+
+    def record(self, audit: Dict[str, Any]) -> None:
+        prompt_tokens = int(audit.get("prompt_tokens") or 0)
+        output_tokens = int(audit.get("output_tokens") or 0)
+        with self._lock:
+            c = self._counts
+            c["calls"] += 1
+            c["retries"] += int(audit.get("retries") or 0)
+            c["max_prompt_tokens"] = max(c["max_prompt_tokens"], prompt_tokens)
+            if audit.get("status") not in (None, "ok"):
+                c["errors"] += 1
+            if audit.get("cache_hit"):
+                c["cache_hits"] += 1
+                c["cached_prompt_tokens"] += prompt_tokens
+                c["cached_output_tokens"] += output_tokens
+                return
+            if audit.get("status") == "error" and not prompt_tokens:
+                return  # model never reached (e.g. not configured)
+            c["model_calls"] += 1
+            c["prompt_tokens"] += prompt_tokens
+            c["output_tokens"] += output_tokens
+            c["context_cache_tokens"] += int((audit.get("context_cache") or {}).get("cached_tokens") or 0)
+            if audit.get("latency_ms") is not None:
+                self._latencies.append(float(audit["latency_ms"]))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Totals plus cache hit rate, mean prompt size and p50/p95 model latency (ms)."""
+        with self._lock:
+            out: Dict[str, Any] = dict(self._counts)
+            latencies = sorted(self._latencies)
+        calls, model_calls = out["calls"], out["model_calls"]
+        out["cache_hit_rate"] = round(out["cache_hits"] / calls, 4) if calls else 0.0
+        out["mean_prompt_tokens"] = round(out["prompt_tokens"] / model_calls, 1) if model_calls else 0.0
+        out["total_tokens"] = out["prompt_tokens"] + out["output_tokens"]
+        out["latency_p50_ms"] = _percentile(latencies, 0.50)
+        out["latency_p95_ms"] = _percentile(latencies, 0.95)
+        return out
+
+
+def summarize_audits(audits: Iterable[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Same figures as LLMMetrics.snapshot() for a set of stored audit blocks / batch items."""
+    metrics = LLMMetrics(window=1_000_000)
+    for audit in audits:
+        if audit:
+            metrics.record(audit)
+    return metrics.snapshot()
+
+
+# Process-wide totals of every analysis call made by this server / job
+LLM_METRICS = LLMMetrics()
+
+def get_llm_metrics() -> Dict[str, Any]:
+    return LLM_METRICS.snapshot()
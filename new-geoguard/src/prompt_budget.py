@@ -0,0 +1,106 @@
+# src/prompt_budget.py
+from __future__ import annotations
+
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .llm_client import estimate_tokens
+
+# ============================== Config ==============================
+# Upper bound on estimated prompt tokens (0 disables trimming)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "8000"))
+# Rules are dropped (lowest score first) down to this many before any text is cut
+PROMPT_MIN_RULES = int(os.getenv("PROMPT_MIN_RULES", "3"))
+# Truncated sections keep at least this many characters
+SECTION_MIN_CHARS = int(os.getenv("PROMPT_SECTION_MIN_CHARS", "400"))
+
+# Sections whose label is listed here are never truncated
+PROTECTED_SECTIONS = ("Title",)
+
+_CHARS_PER_TOKEN = 4
+_BOUNDARY_RE = re.compile(r"(\n\s*\n|(?<=[.!?])\s+)")
+
+Section = Tuple[Optional[str], str]          # (label or None, text)
+Render = Callable[[List[Dict[str, Any]], List[Section]], str]
+
+
+def truncate_text(text: str, max_chars: int) -> str:
+    """
+    Cut `text` to at most `max_chars`, at the last paragraph / sentence break in the
+    second half of the allowance when there is one, and note how much was dropped.
+    """
+    if len(text) <= max_chars:
+        return text
+    breaks = [m.start() for m in _BOUNDARY_RE.finditer(text, 0, max_chars) if m.start() >= max_chars // 2]
+    cut = breaks[-1] if breaks else max_chars
+    return f"{text[:cut].rstrip()}\n[... {len(text) - cut:,} characters truncated to fit the prompt budget]"
+
+
+def _largest_rule_prefix(render: Render, rules: List[Dict[str, Any]],
+                         sections: List[Section], budget: int, floor: int) -> int:
+    """Largest n >= floor such that the prompt with rules[:n] fits (floor if none does)."""
+    lo, hi = floor, len(rules)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(render(rules[:mid], sections)) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def fit_prompt(render: Render,
+               rules: List[Dict[str, Any]],
+               sections: Sequence[Section],
+               budget: Optional[int] = None,
+               min_rules: Optional[int] = None) -> Tuple[str, List[Dict[str, Any]], List[Section], Dict[str, Any]]:
+    """
+    Render the prompt and shrink it until its estimated size fits `budget` tokens:
+      1) drop the lowest-ranked rules (`rules` must be best-first), keeping `min_rules`;
+      2) truncate feature sections from the last one backwards (protected ones are kept).
+    Returns (prompt, rules kept, sections as rendered, report); the report is meant
+    for the audit block.
+    """
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    min_rules = PROMPT_MIN_RULES if min_rules is None else min_rules
+    sections = list(sections)
+    prompt = render(rules, sections)
+    tokens = estimate_tokens(prompt)
+    report: Dict[str, Any] = {"budget": budget, "estimated_tokens": tokens, "original_tokens": tokens}
+    if budget <= 0 or tokens <= budget:
+        return prompt, rules, sections, report
+
+    # 1) Lowest-scoring rules go first
+    kept = rules
+    floor = min(len(rules), max(0, min_rules))
+    if len(rules) > floor:
+        n = _largest_rule_prefix(render, rules, sections, budget, floor)
+        if n < len(rules):
+            kept = rules[:n]
+            report["dropped_rule_ids"] = [r.get("id") for r in rules[n:]]
+            prompt = render(kept, sections)
+            tokens = estimate_tokens(prompt)
+
+    # 2) Then feature text, section by section from the end
+    truncated: Dict[str, Dict[str, int]] = {}
+    for idx in reversed(range(len(sections))):
+        if tokens <= budget:
+            break
+        label, text = sections[idx]
+        if label in PROTECTED_SECTIONS:
+            continue
+        excess_chars = (tokens - budget) * _CHARS_PER_TOKEN
+        target = max(SECTION_MIN_CHARS, len(text) - excess_chars - 100)  # room for the marker
+        if target >= len(text):
+            continue
+        sections[idx] = (label, truncate_text(text, target))
+        truncated[label or f"section_{idx}"] = {"from_chars": len(text), "to_chars": len(sections[idx][1])}
+        prompt = render(kept, sections)
+        tokens = estimate_tokens(prompt)
+
+    if truncated:
+        report["truncated_sections"] = truncated
+    report["estimated_tokens"] = tokens
+    report["over_budget"] = tokens > budget
+    return prompt, kept, sections, report
@@ -0,0 +1,79 @@
+# src/rule_impact.py
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .ai_core import preview_rule_shortlist
+from .db_utils import get_all_features_list, get_latest_scan_rule_refs
+
+# Why a feature is affected by a rule edit, strongest first
+IMPACT_REASONS = ("triggered", "in_context", "newly_shortlisted")
+
+RuleImpactIndex = Dict[str, Dict[str, Set[str]]]   # rule id -> {"triggered", "in_context"} -> feature ids
+
+
+# ============================ Reverse index ============================
+def build_rule_impact_index(refs: Dict[str, Dict[str, List[str]]]) -> RuleImpactIndex:
+    """Inverts get_latest_scan_rule_refs() into rule id -> features whose latest scan referenced it."""
+    index: RuleImpactIndex = {}
+    for fid, ref in refs.items():
+        for rid in ref.get("triggered") or ():
+            index.setdefault(rid, {"triggered": set(), "in_context": set()})["triggered"].add(fid)
+        for rid in ref.get("context") or ():
+            index.setdefault(rid, {"triggered": set(), "in_context": set()})["in_context"].add(fid)
+    return index
+
+def get_rule_impact_index() -> RuleImpactIndex:
+    """Reverse index over the latest scan of every feature (one paged read of the scans table)."""
+    return build_rule_impact_index(get_latest_scan_rule_refs())
+
+
+# ============================== Impact ===============================
+def find_rule_impact(rule_ids: Iterable[str],
+                     *,
+                     include_new_shortlists: bool = True,
+                     index: Optional[RuleImpactIndex] = None) -> List[Dict[str, Any]]:
+    """
+    Features to rescan after `rule_ids` were added, edited or deleted:
+    - "triggered":         their latest scan cited one of the rules,
+    - "in_context":        one of the rules was sent with their latest scan,
+    - "newly_shortlisted": one of the rules now ranks for the feature's title and
+                           description but the latest scan did not send it (or the
+                           feature has no scan yet).
+    Call it after the rule change is saved. The last check ranks rules for the
+    remaining features locally from title and description only (rule index lookup,
+    no PRD/TRD or model calls); skip it with include_new_shortlists=False, e.g. for
+    deleted rules.
+    Returns [{"feature_id", "title", "reasons", "rule_ids"}], triggered features first.
+    """
+    wanted = {str(rid) for rid in rule_ids if rid}
+    if not wanted:
+        return []
+    index = get_rule_impact_index() if index is None else index
+
+    hits: Dict[str, Dict[str, Set[str]]] = {}   # feature id -> reason -> rule ids
+    for rid in wanted:
+        for reason, fids in (index.get(rid) or {}).items():
+            for fid in fids:
+                hits.setdefault(fid, {}).setdefault(reason, set()).add(rid)
+
+    affected: List[Dict[str, Any]] = []
+    for feature in get_all_features_list():
+        fid = feature["id"]
+        found = hits.get(fid)
+        if found is None and include_new_shortlists:
+            shortlisted = wanted.intersection(preview_rule_shortlist(
+                feature.get("title") or "", feature.get("description") or "",
+            ))
+            if shortlisted:
+                found = {"newly_shortlisted": shortlisted}
+        if not found:
+            continue
+        affected.append({
+            "feature_id": fid,
+            "title": feature.get("title") or "",
+            "reasons": [r for r in IMPACT_REASONS if r in found],
+            "rule_ids": sorted(set().union(*found.values())),
+        })
+    affected.sort(key=lambda a: IMPACT_REASONS.index(a["reasons"][0]))
+    return affected
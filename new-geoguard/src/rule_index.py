@@ -0,0 +1,168 @@
+# src/rule_index.py
+from __future__ import annotations
+
+import heapq
+import re
+import threading
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from .jurisdictions import matches_any, parse_jurisdiction
+
+# Maximal runs of letters/digits. A needle made only of such characters can only
+# occur inside a single run of the text, which is what makes token lookup exact.
+_ATOM_RE = re.compile(r"[^\W_]+")
+
+# Bound on the per-index memo of text run -> atoms it contains
+_RUN_CACHE_MAX = 200_000
+
+Posting = Tuple[int, int]  # (rule position, points)
+
+
+def _severity_weight(sev: str) -> int:
+    return {"critical": 4, "high": 3, "medium": 2, "low": 1}.get((sev or "").lower(), 2)
+
+
+class RuleIndex:
+    """
+    Inverted index over one rule-set snapshot for keyword-based rule ranking.
+
+    Scoring (unchanged from the original per-rule scan):
+      +2 for every keyword that is a substring of the lowercased feature text,
+      +1 if the rule id / title is a substring of it,
+      +0.1 * severity weight.
+    Instead of testing every needle of every rule, the text is split into
+    letter/digit runs, the runs are resolved to the indexed "atoms" they contain,
+    and only the postings of those atoms are visited. Needles containing other
+    characters (ids like `us_ca_aadc`, multi-word titles) are verified with a
+    substring test once all of their atoms are present.
+
+    Each rule's jurisdiction label is parsed once so that ranking can be limited
+    to rules whose jurisdiction is related to the feature's locations.
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.rules = rules
+        self.base = [0.1 * _severity_weight(r.get("severity", "medium")) for r in rules]
+        self.jurisdictions: List[Optional[FrozenSet[str]]] = [
+            parse_jurisdiction(r.get("jurisdiction")) for r in rules
+        ]
+
+        postings: Dict[str, List[Posting]] = {}
+        for pos, rule in enumerate(rules):
+            for kw in rule.get("keywords", []) or []:
+                if isinstance(kw, str):
+                    postings.setdefault(kw.lower(), []).append((pos, 2))
+            for f in ("id", "title"):
+                val = str(rule.get(f, "")).lower()
+                if val:
+                    postings.setdefault(val, []).append((pos, 1))
+
+        # needle == a single atom: presence of the atom is presence of the needle
+        self.simple: Dict[str, List[Posting]] = {}
+        # other needles, keyed by their longest atom: (needle, atoms, postings)
+        self.compound: Dict[str, List[Tuple[str, Tuple[str, ...], List[Posting]]]] = {}
+        # needles without any atom (e.g. "" or "--") are always substring-tested
+        self.atomless: List[Tuple[str, List[Posting]]] = []
+
+        vocab: Set[str] = set()
+        for needle, plist in postings.items():
+            atoms = tuple(_ATOM_RE.findall(needle))
+            if len(atoms) == 1 and atoms[0] == needle:
+                self.simple[needle] = plist
+                vocab.add(needle)
+            elif atoms:
+                key = max(atoms, key=len)
+                self.compound.setdefault(key, []).append((needle, atoms, plist))
+                vocab.update(atoms)
+            else:
+                self.atomless.append((needle, plist))
+
+        self.vocab = vocab
+        self.lengths = sorted({len(a) for a in vocab})
+        self._run_cache: Dict[str, Tuple[str, ...]] = {}
+
+    # --------------------------- lookup ---------------------------
+    def _atoms_in_run(self, run: str) -> Tuple[str, ...]:
+        cached = self._run_cache.get(run)
+        if cached is not None:
+            return cached
+        found = []
+        n = len(run)
+        for length in self.lengths:
+            if length > n:
+                break
+            for i in range(n - length + 1):
+                sub = run[i:i + length]
+                if sub in self.vocab:
+                    found.append(sub)
+        result = tuple(set(found))
+        if len(self._run_cache) >= _RUN_CACHE_MAX:
+            self._run_cache.clear()
+        self._run_cache[run] = result
+        return result
+
+    def hits(self, text_lc: str) -> Dict[int, int]:
+        """Keyword/id/title points per rule position for lowercased text (rules with 0 omitted)."""
+        present: Set[str] = set()
+        for run in set(_ATOM_RE.findall(text_lc)):
+            present.update(self._atoms_in_run(run))
+
+        points: Dict[int, int] = {}
+        for atom in present:
+            for pos, pts in self.simple.get(atom, ()):
+                points[pos] = points.get(pos, 0) + pts
+            for needle, atoms, plist in self.compound.get(atom, ()):
+                if all(a in present for a in atoms) and needle in text_lc:
+                    for pos, pts in plist:
+                        points[pos] = points.get(pos, 0) + pts
+        for needle, plist in self.atomless:
+            if needle in text_lc:
+                for pos, pts in plist:
+                    points[pos] = points.get(pos, 0) + pts
+        return points
+
+    def scores(self, feature_text: str) -> List[float]:
+        """Score of every rule, in rule order."""
+        points = self.hits((feature_text or "").lower())
+        return [points.get(pos, 0) + base for pos, base in enumerate(self.base)]
+
+    def candidates(self, locations: Optional[Iterable[str]]) -> List[int]:
+        """
+        Rule positions whose jurisdiction equals, contains or is contained by one of
+        `locations`, plus rules without a recognisable jurisdiction. Falls back to
+        every rule when there are no locations or nothing matches.
+        """
+        everything = list(range(len(self.rules)))
+        locations = list(locations or ())
+        if not locations:
+            return everything
+        kept = [pos for pos in everything if matches_any(self.jurisdictions[pos], locations)]
+        return kept or everything
+
+    def select(self, feature_text: str, top_k: int,
+               locations: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Rules ranked by score (stable for ties); all candidates when top_k <= 0."""
+        scores = self.scores(feature_text)
+        order = self.candidates(locations)
+        if top_k <= 0 or top_k >= len(order):  # pass all
+            ranked = sorted(order, key=scores.__getitem__, reverse=True)
+        else:
+            ranked = heapq.nlargest(top_k, order, key=scores.__getitem__)
+        return [self.rules[pos] for pos in ranked]
+
+
+# ====================== Per rule-set memo =======================
+_INDEX_CACHE: Dict[str, Any] = {"rules": None, "index": None}
+_INDEX_LOCK = threading.Lock()
+
+def get_rule_index(rules: List[Dict[str, Any]]) -> RuleIndex:
+    """
+    Index for `rules`, built once per rule-set snapshot. The cached legal rules are
+    shared list objects that are replaced (never mutated) on refresh, so the
+    snapshot's identity is its version.
+    """
+    with _INDEX_LOCK:
+        if _INDEX_CACHE["rules"] is not rules:
+            _INDEX_CACHE["index"] = RuleIndex(rules)
+            _INDEX_CACHE["rules"] = rules
+        return _INDEX_CACHE["index"]
@@ -0,0 +1,177 @@
+# src/terminology.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .db_utils import get_all_terminology
+
+# ============================== Config ==============================
+# How often long-lived processes re-read the terminology table
+TERMINOLOGY_REFRESH_SECONDS = float(os.getenv("TERMINOLOGY_REFRESH_SECONDS", "60"))
+# Minimum gap between attempts while no table has been loaded yet
+_FIRST_LOAD_RETRY_SECONDS = 5.0
+
+
+def _terms_fingerprint(terms: Dict[str, str]) -> str:
+    blob = json.dumps(terms, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+# ========================= Compiled expander ========================
+def _trie_pattern(words: List[str]) -> str:
+    """
+    Regex source matching any of `words` (already lowercased), compiled as a trie so
+    each text position is tested in one pass over shared prefixes. Greedy optional
+    branches try longer terms first, matching the old longest-first term order.
+    """
+    trie: Dict[str, Any] = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def _render(node: Dict[str, Any]) -> str:
+        branches = [re.escape(ch) + _render(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            # Term may end here; a longer term is still preferred when it also fits.
+            return body + "?" if len(branches) == 1 and len(body) == 1 else "(?:" + body + ")?"
+        return body
+
+    return _render(trie)
+
+class _TermExpander:
+    """Single-pass terminology expander, compiled once per terminology table."""
+
+    def __init__(self, terms: Dict[str, str]):
+        # Longest-first order decides which key wins for case-insensitive duplicates
+        # and the order of replaced_meta, exactly as the per-term loop did.
+        self.order = sorted(terms.keys(), key=lambda s: len(s), reverse=True)
+        self.by_lower: Dict[str, str] = {}
+        for key in self.order:
+            if key:
+                self.by_lower.setdefault(key.lower(), key)
+        self.terms = terms
+        self.pattern = None
+        if self.by_lower:
+            self.pattern = re.compile(
+                rf"(?<![A-Za-z0-9])({_trie_pattern(list(self.by_lower))})(?![A-Za-z0-9])",
+                re.IGNORECASE,
+            )
+
+    def expand(self, text: str) -> Tuple[str, List[Dict[str, Any]]]:
+        if not text or self.pattern is None:
+            return text or "", []
+        counts: Dict[str, int] = {}
+
+        def _repl(m: re.Match) -> str:
+            token = m.group(1)
+            key = self.by_lower.get(token.lower())
+            if key is None:
+                return token
+            counts[key] = counts.get(key, 0) + 1
+            return f"{token} ({self.terms[key]})"
+
+        text = self.pattern.sub(_repl, text)
+        replaced_meta = [
+            {"term": key, "expansion": self.terms[key], "count": counts[key]}
+            for key in self.order if key in counts
+        ]
+        return text, replaced_meta
+
+
+# ============================= Provider =============================
+class TerminologyProvider:
+    """
+    Keeps the terminology table and its compiled expander fresh for long-lived
+    processes. A daemon thread re-reads the table every `refresh_seconds`; the
+    expander is rebuilt only when the table's hash changes. A failed fetch keeps
+    serving the last good table instead of falling back to no terms.
+    With `refresh_seconds <= 0` the table is loaded once (retried until it loads).
+    """
+
+    def __init__(self, refresh_seconds: float = TERMINOLOGY_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._first_load_lock = threading.Lock()
+        self._terms: Dict[str, str] = {}
+        self._version: Optional[str] = None
+        self._expander = _TermExpander({})
+        self._loaded_at = 0.0
+        self._last_attempt = 0.0
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self) -> bool:
+        """Re-reads the table now. Returns True if the terms changed."""
+        self._last_attempt = time.monotonic()
+        try:
+            data = get_all_terminology(raise_errors=True)
+            terms = {item["term"]: item["expansion"] for item in data}
+        except Exception as e:
+            print(f"Error refreshing terminology (keeping previous version): {e}")
+            return False
+        version = _terms_fingerprint(terms)
+        with self._lock:
+            self._loaded_at = time.monotonic()
+            if version == self._version:
+                return False
+            expander = _TermExpander(terms)
+            self._terms, self._version, self._expander = terms, version, expander
+            return True
+
+    def snapshot(self) -> Tuple[Optional[str], Dict[str, str], _TermExpander]:
+        """Returns (version, terms, expander); version is None until a table has loaded."""
+        self._ensure_running()
+        now = time.monotonic()
+        if self._version is None:
+            # Concurrent first callers wait for the load in flight instead of
+            # proceeding without terms.
+            with self._first_load_lock:
+                if self._version is None and now - self._last_attempt >= _FIRST_LOAD_RETRY_SECONDS:
+                    self.refresh()
+        elif (self.refresh_seconds > 0 and now - self._loaded_at > 2 * self.refresh_seconds
+              and now - self._last_attempt >= self.refresh_seconds):
+            # Background thread is missing or stuck; refresh inline, at most once per
+            # interval (also during a DB outage) and by one caller while others keep
+            # the current table.
+            if self._first_load_lock.acquire(blocking=False):
+                try:
+                    self.refresh()
+                finally:
+                    self._first_load_lock.release()
+        with self._lock:
+            return self._version, self._terms, self._expander
+
+    def _ensure_running(self) -> None:
+        if self.refresh_seconds <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="geoguard-terminology", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.refresh_seconds)
+            self.refresh()
+
+
+_PROVIDER = TerminologyProvider()
+
+def get_terminology_snapshot() -> Tuple[Optional[str], Dict[str, str], _TermExpander]:
+    """(version, terms, compiled expander) of the live terminology table."""
+    return _PROVIDER.snapshot()
+
+def refresh_terminology() -> bool:
+    """Forces an immediate reload, e.g. right after terms were edited."""
+    return _PROVIDER.refresh()
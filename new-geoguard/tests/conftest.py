@@ -0,0 +1,41 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Offline configuration; must be in place before `src` is imported
+os.environ.update({
+    "SUPABASE_URL": "http://supabase.test",
+    "SUPABASE_KEY": "test-key",
+    "GEMINI_API_KEY": "test-key",
+    "GEMINI_CONTEXT_CACHE": "off",
+    "LLM_CACHE_ENABLED": "0",
+    "LLM_MAX_RETRIES": "0",
+    "SNAPSHOT_STORE": "0",
+    "TERMINOLOGY_REFRESH_SECONDS": "0",
+})
+
+import fakes  # noqa: E402
+
+fakes.install()
+
+
+@pytest.fixture(autouse=True)
+def fake_supabase():
+    """Empty in-memory database for every test."""
+    from src import db_utils
+
+    fakes.FAKE_SUPABASE.reset()
+    db_utils.invalidate_legal_rules_cache()
+    yield fakes.FAKE_SUPABASE
+
+
+@pytest.fixture
+def fake_gemini():
+    fakes.FAKE_GEMINI.reset()
+    yield fakes.FAKE_GEMINI
@@ -0,0 +1,315 @@
+# tests/fakes.py
+"""
+In-memory stand-ins for the Supabase client and google.generativeai, installed by
+conftest.py before `src` is imported so the tests never reach the network.
+Only the query-builder calls the code under test uses are implemented.
+"""
+from __future__ import annotations
+
+import copy
+import itertools
+import json
+import re
+import sys
+import types
+from typing import Any, Dict, List, Optional
+
+
+# ============================= Supabase =============================
+class FakeAPIError(Exception):
+    """Mimics postgrest's APIError: carries a Postgres / PostgREST `code`."""
+
+    def __init__(self, message: str, code: str = ""):
+        super().__init__(message)
+        self.code = code
+
+
+# "->" / "->>" steps of a PostgREST JSON path, kept by the split
+_JSON_STEP_RE = re.compile(r"(->>?)")
+
+
+class _Response:
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class _Query:
+    def __init__(self, db: "FakeSupabase", table: str):
+        self.db = db
+        self.table = table
+        self.op = "select"
+        self.columns = "*"
+        self.count = None
+        self.payload: Any = None
+        self.on_conflict: Optional[str] = None
+        self.ignore_duplicates = False
+        self.filters: List[Any] = []
+        self.orders: List[Any] = []
+        self.bounds: Optional[tuple] = None
+        self.max_rows: Optional[int] = None
+        self.one = False
+
+    # -------- builders --------
+    def select(self, columns: str = "*", count: Optional[str] = None) -> "_Query":
+        self.columns, self.count = columns, count
+        return self
+
+    def insert(self, payload: Any) -> "_Query":
+        self.op, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload: Any, on_conflict: Optional[str] = None,
+               ignore_duplicates: bool = False) -> "_Query":
+        self.op, self.payload = "upsert", payload
+        self.on_conflict, self.ignore_duplicates = on_conflict, ignore_duplicates
+        return self
+
+    def update(self, payload: Dict[str, Any]) -> "_Query":
+        self.op, self.payload = "update", payload
+        return self
+
+    def delete(self) -> "_Query":
+        self.op = "delete"
+        return self
+
+    def eq(self, column: str, value: Any) -> "_Query":
+        self.filters.append(lambda row: str(row.get(column)) == str(value))
+        return self
+
+    def gt(self, column: str, value: Any) -> "_Query":
+        self.filters.append(lambda row: row.get(column) is not None and str(row[column]) > str(value))
+        return self
+
+    def lt(self, column: str, value: Any) -> "_Query":
+        self.filters.append(lambda row: row.get(column) is not None and str(row[column]) < str(value))
+        return self
+
+    def in_(self, column: str, values: List[Any]) -> "_Query":
+        wanted = {str(v) for v in values}
+        self.filters.append(lambda row: str(row.get(column)) in wanted)
+        return self
+
+    def order(self, column: str, desc: bool = False) -> "_Query":
+        self.orders.append((column, desc))
+        return self
+
+    def range(self, start: int, end: int) -> "_Query":
+        self.bounds = (start, end)
+        return self
+
+    def limit(self, n: int) -> "_Query":
+        self.max_rows = n
+        return self
+
+    def single(self) -> "_Query":
+        self.one = True
+        return self
+
+    # -------- execution --------
+    def _value(self, row: Dict[str, Any], path: str) -> Any:
+        """Column or JSON path ("audit->rules_context_ids", "analysis->>regulation")."""
+        parts = _JSON_STEP_RE.split(path)
+        column = parts[0]
+        if column not in row and column not in self.db.columns.get(self.table, ()):
+            raise FakeAPIError(f"column {self.table}.{column} does not exist", code="42703")
+        value = row.get(column)
+        for arrow, key in zip(parts[1::2], parts[2::2]):
+            value = value.get(key) if isinstance(value, dict) else None
+            if arrow == "->>" and value is not None and not isinstance(value, str):
+                value = json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+        return copy.deepcopy(value)
+
+    def _project(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        if self.columns.strip() == "*":
+            return copy.deepcopy(row)
+        out = {}
+        for spec in (c.strip() for c in self.columns.split(",") if c.strip()):
+            alias, _, path = spec.rpartition(":")
+            out[alias or _JSON_STEP_RE.split(path)[-1]] = self._value(row, path)
+        return out
+
+    def execute(self) -> _Response:
+        self.db.calls.append((self.table, self.op))
+        if self.table not in self.db.tables:
+            raise FakeAPIError(f"Could not find the table 'public.{self.table}'", code="PGRST205")
+        failure = self.db.failures.get((self.table, self.op))
+        if failure:
+            self.db.failures[(self.table, self.op)] = failure[1:] or None
+            raise failure[0]
+        rows = self.db.tables[self.table]
+
+        if self.op in ("insert", "upsert"):
+            payload = self.payload if isinstance(self.payload, list) else [self.payload]
+            written = []
+            for item in payload:
+                key = self.on_conflict
+                existing = next((r for r in rows if key and r.get(key) == item.get(key)), None)
+                if existing is None:
+                    row = self.db.new_row(self.table, item)
+                    rows.append(row)
+                    written.append(row)
+                elif not self.ignore_duplicates:
+                    existing.update(copy.deepcopy(item))
+                    written.append(existing)
+            return _Response(copy.deepcopy(written))
+
+        matched = [r for r in rows if all(f(r) for f in self.filters)]
+        if self.op == "update":
+            for row in matched:
+                row.update(copy.deepcopy(self.payload))
+            return _Response(copy.deepcopy(matched))
+        if self.op == "delete":
+            for row in matched:
+                rows.remove(row)
+            return _Response(copy.deepcopy(matched))
+
+        for column, desc in reversed(self.orders):
+            matched.sort(key=lambda r: (r.get(column) is None, str(r.get(column) or "")), reverse=desc)
+        total = len(matched)
+        if self.bounds:
+            matched = matched[self.bounds[0]:self.bounds[1] + 1]
+        if self.max_rows is not None:
+            matched = matched[:self.max_rows]
+        data = [self._project(r) for r in matched]
+        if self.one:
+            return _Response(data[0] if data else None)
+        return _Response(data, total if self.count else None)
+
+
+class FakeSupabase:
+    """
+    Tables are plain lists of dict rows. `features` and `scans` rows get their
+    generated id / timestamp columns on insert. `fail(table, op, exc)` makes the
+    next matching execute() raise `exc` (repeat the call to queue more failures).
+    """
+
+    ID_COLUMNS = {"features": "id", "scans": "scan_id"}
+    TIME_COLUMNS = {"features": "created_at", "scans": "timestamp_utc"}
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.tables: Dict[str, List[Dict[str, Any]]] = {
+            "features": [], "scans": [], "laws": [], "terminology": [], "snapshot_blobs": [],
+        }
+        # Declared columns a projection may name even if no row carries them
+        self.columns: Dict[str, tuple] = {
+            "features": ("id", "title", "description", "prd", "trd", "created_at"),
+            "scans": ("scan_id", "feature_id", "timestamp_utc", "feature_snapshot", "analysis", "audit", "version"),
+            "snapshot_blobs": ("hash", "encoding", "content"),
+            "laws": ("id", "title", "jurisdiction", "severity", "summary", "keywords"),
+            "terminology": ("term", "expansion"),
+        }
+        self.failures: Dict[tuple, Any] = {}
+        self.calls: List[tuple] = []
+        self._seq = itertools.count(1)
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def fail(self, table: str, op: str, exc: Exception) -> None:
+        self.failures[(table, op)] = (self.failures.get((table, op)) or ()) + (exc,)
+
+    def new_row(self, table: str, item: Dict[str, Any]) -> Dict[str, Any]:
+        row = copy.deepcopy(item)
+        n = next(self._seq)
+        if table in self.ID_COLUMNS:
+            row.setdefault(self.ID_COLUMNS[table], f"{table[0]}{n:05d}")
+            row.setdefault(self.TIME_COLUMNS[table], f"2025-01-01T00:00:00.{n:06d}+00:00")
+        return row
+
+
+FAKE_SUPABASE = FakeSupabase()
+
+
+def _supabase_module() -> types.ModuleType:
+    module = types.ModuleType("supabase")
+    module.Client = FakeSupabase
+    module.create_client = lambda url, key: FAKE_SUPABASE
+    return module
+
+
+# ============================== Gemini ==============================
+class _Usage:
+    def __init__(self, prompt: str, text: str):
+        self.prompt_token_count = max(1, len(prompt) // 4)
+        self.candidates_token_count = max(1, len(text) // 4)
+        self.total_token_count = self.prompt_token_count + self.candidates_token_count
+
+
+class _GeminiResponse:
+    def __init__(self, prompt: str, text: str):
+        self.text = text
+        self.usage_metadata = _Usage(prompt, text)
+
+
+class FakeGemini:
+    """
+    Scripted model replies. Queued `replies` (str JSON, dict or Exception) are
+    consumed in order; once empty every call answers `default`. Prompts sent
+    are kept in `prompts`.
+    """
+
+    default = {"classification": "NO", "reasoning": "Not a legal requirement.", "regulation": "None"}
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.replies: List[Any] = []
+        self.prompts: List[str] = []
+
+    def reply(self, prompt: str) -> _GeminiResponse:
+        self.prompts.append(prompt)
+        reply = self.replies.pop(0) if self.replies else self.default
+        if isinstance(reply, Exception):
+            raise reply
+        text = reply if isinstance(reply, str) else json.dumps(reply)
+        return _GeminiResponse(prompt, text)
+
+
+FAKE_GEMINI = FakeGemini()
+
+
+class _GenerativeModel:
+    def __init__(self, model_name: str = "", **kwargs: Any):
+        self.model_name = model_name
+
+    def generate_content(self, contents: str, **kwargs: Any) -> _GeminiResponse:
+        return FAKE_GEMINI.reply(contents)
+
+    async def generate_content_async(self, contents: str, **kwargs: Any) -> _GeminiResponse:
+        return FAKE_GEMINI.reply(contents)
+
+
+class _GenerationConfig(dict):
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+
+
+def _genai_modules() -> Dict[str, types.ModuleType]:
+    genai = types.ModuleType("google.generativeai")
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = _GenerativeModel
+    gen_types = types.ModuleType("google.generativeai.types")
+    gen_types.GenerationConfig = _GenerationConfig
+    genai.types = gen_types
+    return {"google.generativeai": genai, "google.generativeai.types": gen_types}
+
+
+def install() -> None:
+    """Registers the fakes in sys.modules (replacing any installed client libraries)."""
+    sys.modules["supabase"] = _supabase_module()
+    google = sys.modules.get("google")
+    if google is None:
+        try:
+            import google  # namespace package of other google-* distributions
+        except ImportError:
+            google = types.ModuleType("google")
+            google.__path__ = []
+            sys.modules["google"] = google
+    modules = _genai_modules()
+    sys.modules.update(modules)
+    google.generativeai = modules["google.generativeai"]
@@ -0,0 +1,48 @@
+# tests/test_artifacts.py
+from src.artifacts import EXCERPT_GAP, chunk_text, select_artifacts, select_excerpts
+
+RULES = [{"id": "us_ut_minor", "title": "Utah Minor Protection", "jurisdiction": "Utah",
+          "keywords": ["curfew", "minor"]}]
+FILLER = "The settings page uses a grid of cards and a blue button. " * 8
+
+
+def _doc(*paragraphs):
+    return "\n\n".join(paragraphs)
+
+
+def test_chunks_respect_the_size_limit():
+    chunks = chunk_text(_doc(*[FILLER] * 10), max_chars=1000)
+    assert len(chunks) > 1
+    assert all(len(c) <= 1000 for c in chunks)
+
+def test_short_document_is_kept_whole():
+    text = "Curfew for minor accounts."
+    excerpt, stats = select_excerpts(text, RULES, token_budget=500)
+    assert excerpt == text
+    assert stats["selected_chunks"] == [0]
+
+def test_relevant_chunk_is_selected_in_document_order():
+    text = _doc(*[FILLER] * 6, "A curfew applies to every minor account in Utah.", *[FILLER] * 6)
+    excerpt, stats = select_excerpts(text, RULES, token_budget=300, max_chars=600)
+    assert "curfew applies" in excerpt
+    assert stats["selected_chunks"] == sorted(stats["selected_chunks"])
+    assert max(stats["scores"]) > 0
+    assert EXCERPT_GAP in excerpt
+    assert len(excerpt) < len(text)
+
+def test_without_any_match_the_opening_is_kept():
+    text = _doc("Opening paragraph.", *[FILLER] * 12)
+    excerpt, _ = select_excerpts(text, RULES, token_budget=200, max_chars=600)
+    assert excerpt.startswith("Opening paragraph.")
+
+def test_artifacts_share_one_budget():
+    long_doc = _doc(*[FILLER] * 40, "Minor curfew in Utah.")
+    selected, report = select_artifacts([("PRD", long_doc), ("TRD", "Short TRD."), ("Empty", "  ")],
+                                        RULES, token_budget=600)
+    names = [name for name, _ in selected]
+    assert names == ["PRD", "TRD"]
+    assert dict(selected)["TRD"] == "Short TRD."
+    assert set(report) == {"PRD", "TRD"}
+    # the TRD's unused share went to the PRD
+    total = sum(len(text) for _, text in selected) // 4
+    assert 300 < total <= 600 + 10
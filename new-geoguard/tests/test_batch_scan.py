@@ -0,0 +1,112 @@
+# tests/test_batch_scan.py
+import pytest
+
+from fakes import FakeAPIError
+from src import ai_core, batch_scan
+from src.batch_scan import run_batch_scan
+
+LAWS = [{"id": "us_ut_minor", "title": "Utah Minor Protection", "jurisdiction": "Utah",
+         "severity": "high", "summary": "Curfew for minors.", "keywords": ["curfew", "minor"]}]
+
+
+@pytest.fixture
+def features(fake_supabase, fake_gemini):
+    fake_supabase.tables["laws"].extend(LAWS)
+    rows = [{"id": f"f{i}", "title": f"Feature {i}", "description": f"Night curfew {i} for minors in Utah",
+             "prd": "", "trd": ""} for i in range(7)]
+    fake_supabase.tables["features"].extend(rows)
+    return [r["id"] for r in rows]
+
+
+def test_every_feature_is_scanned_and_saved(fake_supabase, fake_gemini, features):
+    progress, persisted = [], []
+    report = run_batch_scan(features + ["missing"], concurrency=3, persist_chunk_size=2,
+                            on_progress=lambda done, total, item: progress.append((done, total)),
+                            on_persisted=persisted.append)
+
+    assert (report["total"], report["succeeded"], report["failed"]) == (8, 7, 1)
+    assert [done for done, _ in progress] == list(range(1, 9))
+    missing = next(it for it in report["items"] if it["feature_id"] == "missing")
+    assert missing["error"] == "Feature not found"
+
+    scans = fake_supabase.tables["scans"]
+    assert sorted(s["feature_id"] for s in scans) == features
+    saved = {it["feature_id"]: it["scan_id"] for it in report["items"] if it["status"] == "ok"}
+    assert saved == {s["feature_id"]: s["scan_id"] for s in scans}
+    assert all("_scan" not in it for it in report["items"])
+    # batches of at most two scans, plus the failed item on its own
+    assert sum(len(batch) for batch in persisted) == 8
+    assert max(len(batch) for batch in persisted) <= 2
+    assert report["usage"]["calls"] == 7
+
+def test_features_are_loaded_in_windows(fake_supabase, features, monkeypatch):
+    monkeypatch.setattr(batch_scan, "BATCH_SCAN_LOAD_CHUNK", 3)
+    run_batch_scan(features, concurrency=2)
+    assert fake_supabase.calls.count(("features", "select")) == 3
+
+def test_failed_feature_load_is_not_reported_as_missing(fake_supabase, fake_gemini, features, monkeypatch):
+    monkeypatch.setattr(batch_scan, "BATCH_SCAN_LOAD_CHUNK", 3)
+    fake_supabase.fail("features", "select", FakeAPIError("statement timeout", code="57014"))
+    report = run_batch_scan(features, concurrency=2)
+
+    errors = {it["feature_id"]: it["error"] for it in report["items"] if it["status"] == "error"}
+    assert errors == {fid: "Failed to load feature: statement timeout" for fid in features[:3]}
+    assert report["succeeded"] == 4 and len(fake_gemini.prompts) == 4
+
+def test_failed_model_call_is_not_saved(fake_supabase, fake_gemini, features):
+    fake_gemini.replies = [FakeAPIError("invalid argument", code="400")]
+    report = run_batch_scan(features[:2], concurrency=1)  # one worker: calls run in submit order
+    items = {it["feature_id"]: it for it in report["items"]}
+    first, second = items[features[0]], items[features[1]]
+    assert first["status"] == "error" and first["scan_id"] is None
+    assert second["status"] == "ok"
+    assert [s["feature_id"] for s in fake_supabase.tables["scans"]] == [features[1]]
+
+def test_failed_bulk_save_marks_items_as_errors(fake_supabase, features):
+    fake_supabase.fail("scans", "insert", FakeAPIError("connection reset"))
+    report = run_batch_scan(features[:3], concurrency=1, persist_chunk_size=10)
+    assert report["succeeded"] == 0
+    assert all(it["error"].startswith("Failed to save scan") for it in report["items"])
+
+def test_interrupt_saves_finished_scans_and_stops(fake_supabase, fake_gemini, features, monkeypatch):
+    monkeypatch.setattr(batch_scan, "BATCH_SCAN_LOAD_CHUNK", 2)
+
+    def _interrupt(done, total, item):
+        if done == 2:
+            raise KeyboardInterrupt
+
+    persisted = []
+    with pytest.raises(KeyboardInterrupt):
+        run_batch_scan(features, concurrency=1, persist_chunk_size=50,
+                       on_progress=_interrupt, on_persisted=persisted.extend)
+
+    scans = fake_supabase.tables["scans"]
+    assert 2 <= len(scans) < len(features)
+    # every model call that was paid for ended up as a saved scan
+    assert len(scans) == len(fake_gemini.prompts)
+    assert sorted(it["feature_id"] for it in persisted) == sorted(s["feature_id"] for s in scans)
+
+def test_selections_read_the_latest_scans(fake_supabase, features):
+    run_batch_scan(features[:3], concurrency=2)
+    assert batch_scan.select_feature_ids("unscanned") == sorted(features[3:], reverse=True)
+    summaries = batch_scan.get_scan_summaries()
+    assert set(summaries) == set(features[:3])
+    assert all(s["latest_classification"] == "NO" and s["scan_count"] == 1 for s in summaries.values())
+
+def test_nothing_has_changed_right_after_a_scan(fake_supabase, features, monkeypatch):
+    run_batch_scan(features[:3], concurrency=2)
+
+    def _no_prompt(*args, **kwargs):
+        raise AssertionError("fingerprinting must not build the prompt")
+
+    monkeypatch.setattr(ai_core, "fit_prompt", _no_prompt)
+    monkeypatch.setattr(ai_core, "select_artifacts", _no_prompt)
+    changed = batch_scan.find_changed_features()
+    assert sorted(c["feature_id"] for c in changed) == features[3:]
+    assert {c["reason"] for c in changed} == {"unscanned"}
+
+def test_edited_feature_shows_as_changed(fake_supabase, features):
+    run_batch_scan(features[:2], concurrency=1)
+    fake_supabase.tables["features"][0]["description"] = "Night curfew for adults"
+    assert batch_scan.find_changed_features(features[:2]) == \
+        [{"feature_id": features[0], "title": "Feature 0", "reason": "changed"}]
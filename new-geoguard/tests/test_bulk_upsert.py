@@ -0,0 +1,58 @@
+# tests/test_bulk_upsert.py
+import pytest
+
+from fakes import FakeAPIError
+from src.db_utils import bulk_upsert_features, feature_dedupe_key, get_feature_dedupe_keys
+
+
+def _statuses(outcomes):
+    return [o["status"] for o in outcomes]
+
+
+def test_content_key_ignores_case_and_whitespace():
+    key = feature_dedupe_key({"title": " Night  Mode", "description": "Dark\nUI"})
+    assert key == feature_dedupe_key({"title": "night mode", "description": "dark ui"})
+    assert key != feature_dedupe_key({"title": "night mode", "description": "light ui"})
+    assert feature_dedupe_key({"title": "Night Mode "}, "title") == "night mode"
+    assert feature_dedupe_key({"title": "x"}, None) is None
+    with pytest.raises(ValueError):
+        feature_dedupe_key({"title": "x"}, "prd")
+
+def test_duplicates_of_stored_and_earlier_rows_are_skipped(fake_supabase):
+    fake_supabase.tables["features"].append({"id": "old", "title": "Chat", "description": "Group chat"})
+    rows = [
+        {"title": "chat ", "description": "group  chat"},   # stored already
+        {"title": "Feed", "description": "Ranked", "prd": None, "extra": "dropped"},
+        {"title": "", "description": "untitled"},
+        {"title": "FEED", "description": "ranked"},          # same as row 1
+        {"title": "Feed", "description": "Chronological"},
+    ]
+    progress = []
+    outcomes = bulk_upsert_features(rows, chunk_size=1, on_progress=lambda done, total: progress.append(done))
+
+    assert _statuses(outcomes) == ["duplicate", "inserted", "invalid", "duplicate", "inserted"]
+    assert progress == [1, 2]
+    inserted = fake_supabase.tables["features"][1]
+    assert outcomes[1]["id"] == inserted["id"]
+    assert (inserted["prd"], "extra" in inserted) == ("", False)
+
+def test_title_mode_and_no_dedupe(fake_supabase):
+    rows = [{"title": "A", "description": "one"}, {"title": "a", "description": "two"}]
+    assert _statuses(bulk_upsert_features(rows, dedupe_on="title")) == ["inserted", "duplicate"]
+    assert _statuses(bulk_upsert_features(rows, dedupe_on=None)) == ["inserted", "inserted"]
+
+def test_shared_keys_span_calls_and_failed_rows_stay_retryable(fake_supabase):
+    keys = get_feature_dedupe_keys()
+    fake_supabase.fail("features", "insert", FakeAPIError("timeout"))
+    rows = [{"title": "A", "description": "a"}]
+    failed = bulk_upsert_features(rows, existing_keys=keys)
+    assert failed[0]["status"] == "error" and failed[0]["error"] == "timeout"
+    assert _statuses(bulk_upsert_features(rows, existing_keys=keys)) == ["inserted"]
+    assert _statuses(bulk_upsert_features(rows, existing_keys=keys)) == ["duplicate"]
+    assert ("features", "select") not in fake_supabase.calls[1:]  # stored keys read once
+
+def test_failed_dedupe_read_raises(fake_supabase):
+    fake_supabase.fail("features", "select", FakeAPIError("timeout"))
+    with pytest.raises(FakeAPIError):
+        bulk_upsert_features([{"title": "A"}])
+    assert fake_supabase.tables["features"] == []
@@ -0,0 +1,163 @@
+# tests/test_context_cache.py
+import pytest
+
+from fakes import FakeAPIError
+from src import ai_core
+from src.context_cache import ContextCache, StubCacheBackend, make_context_cache
+
+RULES = [{"id": f"r{i}", "title": f"Rule {i}", "jurisdiction": "Utah" if i % 2 else "EU",
+          "severity": "medium", "summary": f"Obligation number {i}. " * 20,
+          "keywords": ["curfew"] if i in (0, 2, 10) else [f"topic{i}"]}
+         for i in range(20)]
+
+
+class _FailingBackend(StubCacheBackend):
+    def create(self, model_name, text, ttl):
+        raise FakeAPIError("cached content quota exceeded", code="400")
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def cached(fake_supabase, fake_gemini, monkeypatch):
+    """ai_core with a stub context cache over the fake model and a 3-rule shortlist."""
+    fake_supabase.tables["laws"].extend(RULES)
+    monkeypatch.setattr(ai_core, "RULES_TOP_K", 3)
+
+    def _use(backend_cls=StubCacheBackend, min_tokens=100):
+        cache = ContextCache(backend_cls(ai_core._MODEL), min_tokens=min_tokens)
+        monkeypatch.setattr(ai_core, "_CONTEXT_CACHE", cache)
+        return cache
+    return _use
+
+def _scan():
+    return ai_core.analyze_feature(feature_topic="Night curfew", feature_description="Curfew for teens",
+                                   use_cache=False)
+
+
+def test_audit_records_the_prompt_sent_through_the_handle(cached, fake_gemini):
+    cache = cached()
+    audit = _scan().audit
+
+    assert fake_gemini.prompts == [audit["prompt_snapshot"]]
+    assert audit["rules_context_ids"] == sorted(r["id"] for r in RULES)
+    assert audit["rules_context_fingerprint"] == audit["legal_db_fingerprint"]
+    assert "[r19]" in audit["context_snapshot"]
+    cc = audit["context_cache"]
+    assert cc["status"] == "created" and cc["name"] == cache.stats()["handles"][0]["name"]
+    head = next(iter(cache._entries.values()))["model"].head
+    assert fake_gemini.prompts[0].startswith(head)
+    assert ai_core._sha256_text(head) == cc["head_hash"]
+
+    second = _scan().audit
+    assert second["context_cache"]["status"] == "reused"
+    assert second["input_fingerprint"] == audit["input_fingerprint"]
+
+def test_unavailable_handle_sends_and_records_the_shortlist(cached, fake_gemini):
+    cached(_FailingBackend)
+    audit = _scan().audit
+
+    assert fake_gemini.prompts == [audit["prompt_snapshot"]]
+    assert sorted(audit["rules_context_ids"]) == ["r0", "r10", "r2"]
+    assert "[r19]" not in fake_gemini.prompts[0]
+    assert audit["context_cache"] == {"mode": "stub", "status": "unavailable"}
+
+def test_failed_call_on_a_handle_retries_with_the_shortlist(cached, fake_gemini):
+    cached()
+    fake_gemini.replies = [FakeAPIError("cached content not found", code="404")]
+    audit = _scan().audit
+
+    assert audit["status"] == "ok"
+    assert len(fake_gemini.prompts) == 2
+    assert fake_gemini.prompts[-1] == audit["prompt_snapshot"]
+    assert sorted(audit["rules_context_ids"]) == ["r0", "r10", "r2"]
+    assert audit["context_cache"]["status"] == "fallback"
+
+def test_small_head_is_sent_inline(cached, fake_gemini):
+    cached(min_tokens=10**6)
+    audit = _scan().audit
+    assert fake_gemini.prompts == [audit["prompt_snapshot"]]
+    assert len(audit["rules_context_ids"]) == 3
+    assert audit["context_cache"]["status"] == "too_small"
+
+def test_fingerprint_preview_matches_the_scan(cached):
+    cached()
+    audit = _scan().audit
+    assert ai_core.compute_input_fingerprint("Night curfew", "Curfew for teens") == audit["input_fingerprint"]
+
+
+# ============================ Handle lifecycle ============================
+HEAD = "static head " * 100
+
+@pytest.fixture
+def lifecycle():
+    clock, backend = _Clock(), StubCacheBackend()
+    return clock, backend, ContextCache(backend, ttl=600, refresh=60, min_tokens=10, retry_after=30, clock=clock)
+
+def test_handle_is_reused_then_refreshed_then_recreated(lifecycle):
+    clock, backend, cache = lifecycle
+    entry, status = cache.get("m", HEAD)
+    assert status == "created" and entry["expires_at"] == 1600
+    assert cache.get("m", HEAD) == (entry, "reused")
+
+    clock.now = 1560  # within the refresh margin
+    assert cache.get("m", HEAD) == (entry, "refreshed")
+    assert entry["expires_at"] == 2160
+
+    clock.now = 2200  # expired locally: a new handle
+    renewed, status = cache.get("m", HEAD)
+    assert status == "created" and renewed["name"] != entry["name"]
+    assert [op for op, _ in backend.calls] == ["create", "refresh", "create"]
+
+def test_failed_refresh_creates_a_new_handle(lifecycle):
+    clock, backend, cache = lifecycle
+    entry, _ = cache.get("m", HEAD)
+    backend.handles.clear()  # deleted server-side
+    clock.now = 1560
+    renewed, status = cache.get("m", HEAD)
+    assert status == "created" and renewed["name"] != entry["name"]
+
+def test_new_head_replaces_the_old_handle_of_the_same_model(lifecycle):
+    _clock, backend, cache = lifecycle
+    old, _ = cache.get("m", HEAD)
+    other, _ = cache.get("other-model", HEAD)
+    new, status = cache.get("m", HEAD + "edited rule")
+    assert status == "created"
+    assert ("delete", old["name"]) in backend.calls
+    assert set(backend.handles) == {other["name"], new["name"]}
+
+def test_small_heads_are_not_cached(lifecycle):
+    _clock, backend, cache = lifecycle
+    assert cache.get("m", "tiny") == (None, "too_small")
+    assert backend.calls == []
+
+def test_failed_create_is_retried_after_the_backoff():
+    clock, backend = _Clock(), _FailingBackend()
+    cache = ContextCache(backend, min_tokens=10, retry_after=30, clock=clock)
+    assert cache.get("m", HEAD) == (None, "unavailable")
+    backend.create = StubCacheBackend.create.__get__(backend)
+    clock.now += 10
+    assert cache.get("m", HEAD) == (None, "unavailable")  # not tried again yet
+    clock.now += 30
+    assert cache.get("m", HEAD)[1] == "created"
+
+def test_invalidate_and_clear_delete_handles(lifecycle):
+    _clock, backend, cache = lifecycle
+    first, _ = cache.get("m", HEAD)
+    cache.invalidate(first["key"])
+    assert backend.handles == {}
+    cache.get("m", HEAD)
+    cache.get("other-model", HEAD)
+    cache.clear()
+    assert backend.handles == {} and cache.stats()["handles"] == []
+
+def test_modes():
+    assert make_context_cache("off") is None
+    assert make_context_cache("redis") is None
+    assert make_context_cache("stub").backend.name == "stub"
@@ -0,0 +1,53 @@
+# tests/test_csv_import.py
+import io
+
+import pytest
+
+from fakes import FakeAPIError
+from src.csv_import import CSVFormatError, import_features_csv, preview_csv, validate_csv_columns
+
+
+def _csv(text):
+    return io.BytesIO(text.encode("utf-8"))
+
+
+def test_missing_required_column_is_rejected():
+    with pytest.raises(CSVFormatError):
+        validate_csv_columns(_csv("title,prd\nA,x\n"))
+
+def test_missing_optional_columns_are_reported():
+    assert validate_csv_columns(_csv(" title ,description\nA,B\n")) == ["prd", "trd"]
+
+def test_preview_skips_untitled_rows():
+    df = preview_csv(_csv("title,description\nA,a\n,orphan\nB,b\n"))
+    assert list(df["title"]) == ["A", "B"]
+    assert list(df.columns) == ["title", "description", "prd", "trd"]
+
+def test_import_streams_chunks_and_dedupes(fake_supabase):
+    fake_supabase.tables["features"].append({"id": "old", "title": "Existing", "description": "same"})
+    source = _csv(
+        "title,description,prd,extra\n"
+        "Existing,same,,ignored\n"      # duplicate of a stored feature
+        "New one,first,prd text,x\n"
+        ",no title,,\n"                 # invalid
+        "New one,first,,\n"             # duplicate within the file
+        "Another,second,,\n"
+    )
+    progress = []
+    summary = import_features_csv(source, chunk_rows=2, on_progress=progress.append)
+
+    assert {k: summary[k] for k in ("rows", "inserted", "duplicate", "invalid", "error")} == \
+        {"rows": 5, "inserted": 2, "duplicate": 2, "invalid": 1, "error": 0}
+    assert summary["failures"] == [{"row": 3, "title": "", "status": "invalid", "error": "Missing title"}]
+    assert len(progress) == 3  # one per chunk of two rows
+    stored = {f["title"]: f for f in fake_supabase.tables["features"]}
+    assert set(stored) == {"Existing", "New one", "Another"}
+    assert stored["New one"]["prd"] == "prd text"
+    assert "extra" not in stored["New one"]
+
+def test_failed_insert_is_reported_per_row(fake_supabase):
+    fake_supabase.fail("features", "insert", FakeAPIError("timeout"))
+    summary = import_features_csv(_csv("title,description\nA,a\nB,b\nC,c\n"), chunk_rows=2)
+    assert summary["error"] == 2 and summary["inserted"] == 1
+    assert [f["row"] for f in summary["failures"]] == [1, 2]
+    assert [f["title"] for f in fake_supabase.tables["features"]] == ["C"]
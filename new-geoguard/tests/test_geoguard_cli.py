@@ -0,0 +1,43 @@
+# tests/test_geoguard_cli.py
+import json
+
+import geoguard
+from geoguard import JsonlWriter, load_checkpoint
+
+
+def test_missing_output_means_nothing_done(tmp_path):
+    assert load_checkpoint(str(tmp_path / "scans.jsonl")) == set()
+
+def test_only_ok_records_count_and_torn_lines_are_skipped(tmp_path):
+    path = tmp_path / "scans.jsonl"
+    lines = [
+        json.dumps({"feature_id": "a", "status": "ok"}),
+        json.dumps({"feature_id": "b", "status": "error", "error": "timeout"}),
+        json.dumps({"status": "ok"}),
+        "",
+        json.dumps({"feature_id": "c", "status": "ok"})[:15],  # killed mid-write
+    ]
+    path.write_text("\n".join(lines), encoding="utf-8")
+    assert load_checkpoint(str(path)) == {"a"}
+
+def test_resume_skips_features_written_by_a_previous_run(tmp_path, monkeypatch):
+    path = str(tmp_path / "scans.jsonl")
+    writer = JsonlWriter(path, append=False)
+    writer.write([{"feature_id": "a", "status": "ok", "_scan": {"dropped": True}},
+                  {"feature_id": "b", "status": "error"}])
+    writer.close()
+    with open(path, encoding="utf-8") as f:
+        assert all("_scan" not in json.loads(line) for line in f)
+
+    scanned = []
+
+    def _run_batch_scan(ids, **kwargs):
+        scanned.extend(ids)
+        items = [{"feature_id": fid, "status": "ok"} for fid in ids]
+        kwargs["on_persisted"](items)
+        return {"total": len(ids), "succeeded": len(ids), "failed": 0, "items": items}
+
+    monkeypatch.setattr(geoguard, "run_batch_scan", _run_batch_scan)
+    assert geoguard.main(["scan", "--ids", "a", "b", "c", "--output", path, "--resume", "--quiet"]) == 0
+    assert scanned == ["b", "c"]
+    assert load_checkpoint(path) == {"a", "b", "c"}
@@ -0,0 +1,42 @@
+# tests/test_jurisdictions.py
+import pytest
+
+from src.jurisdictions import extract_locations, matches_any, parse_jurisdiction
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("US-only rollout in California", ["US", "US-CA"]),
+    ("Rollout in Turkey and China", ["CN", "TR"]),
+    ("available in TEXAS", ["US-TX"]),
+    ("Users in the European Union and south korea", ["EU", "KR"]),
+    ("Washington, D.C. users", ["US-DC"]),
+    ("hosted in us-east-1", ["US-VA"]),
+    ("deployed on europe-west1", ["BE"]),
+    ("Hosted in Europe", ["EU"]),
+])
+def test_places_are_found(text, expected):
+    assert extract_locations(text) == expected
+
+@pytest.mark.parametrize("text", [
+    "roast turkey and fine china plates",
+    "Our Maine coon mascot",
+    "Turkey sandwich promo",
+    "launch in texas",
+    "",
+])
+def test_ordinary_words_are_not_places(text):
+    assert extract_locations(text) == []
+
+def test_rule_labels_match_in_any_case():
+    assert parse_jurisdiction("utah") == frozenset({"US-UT"})
+    assert parse_jurisdiction("California, US") == frozenset({"US", "US-CA"})
+    assert parse_jurisdiction("european union") == frozenset({"EU"})
+    assert parse_jurisdiction("Global") is None
+    assert parse_jurisdiction(None) is None
+
+def test_containment_both_ways():
+    assert matches_any(frozenset({"US"}), ["US-CA"])
+    assert matches_any(frozenset({"US-CA"}), ["US"])
+    assert matches_any(frozenset({"EU"}), ["DE"])
+    assert not matches_any(frozenset({"US-UT"}), ["US-CA"])
+    assert matches_any(None, ["JP"])
@@ -0,0 +1,66 @@
+# tests/test_legal_rules_cache.py
+import pytest
+
+from fakes import FakeAPIError
+from src import db_utils
+from src.db_utils import add_or_update_legal_rule, get_cached_legal_rules
+
+RULES = [{"id": "r1", "title": "Rule 1", "summary": "One."},
+         {"id": "r2", "title": "Rule 2", "summary": "Two."}]
+
+
+@pytest.fixture
+def laws(fake_supabase, monkeypatch):
+    """Rules table, a cache that probes on every read and a counter of full table reads."""
+    fake_supabase.tables["laws"].extend(dict(r) for r in RULES)
+    monkeypatch.setattr(db_utils, "LEGAL_RULES_CACHE_TTL", 0)
+    monkeypatch.setattr(db_utils, "_laws_has_updated_at", None)
+    reads = []
+    fetch = db_utils._fetch_legal_rules
+    monkeypatch.setattr(db_utils, "_fetch_legal_rules", lambda: reads.append(1) or fetch())
+    return reads
+
+def _with_updated_at(fake_supabase):
+    fake_supabase.columns["laws"] += ("updated_at",)
+    for row in fake_supabase.tables["laws"]:
+        row["updated_at"] = "2025-01-01T00:00:00+00:00"
+
+
+def test_reads_within_the_ttl_are_served_from_memory(laws, monkeypatch):
+    monkeypatch.setattr(db_utils, "LEGAL_RULES_CACHE_TTL", 300)
+    first = get_cached_legal_rules()
+    assert get_cached_legal_rules() is first
+    assert len(laws) == 1
+
+def test_without_updated_at_unchanged_content_keeps_the_snapshot(laws, fake_supabase):
+    first = get_cached_legal_rules()
+    assert db_utils._laws_has_updated_at is False
+    assert get_cached_legal_rules() is first  # re-read, same content hash
+    assert len(laws) == 2
+
+    fake_supabase.tables["laws"][0]["summary"] = "Edited in place."
+    edited = get_cached_legal_rules()
+    assert edited is not first and edited[0]["summary"] == "Edited in place."
+
+def test_version_probe_skips_the_read_until_a_rule_changes(laws, fake_supabase):
+    _with_updated_at(fake_supabase)
+    first = get_cached_legal_rules()
+    assert get_cached_legal_rules() is first
+    assert len(laws) == 1
+
+    fake_supabase.tables["laws"][1].update(summary="Edited.", updated_at="2025-02-01T00:00:00+00:00")
+    assert get_cached_legal_rules()[1]["summary"] == "Edited."
+    assert len(laws) == 2
+
+def test_writes_invalidate_the_snapshot(laws, fake_supabase, monkeypatch):
+    monkeypatch.setattr(db_utils, "LEGAL_RULES_CACHE_TTL", 300)
+    _with_updated_at(fake_supabase)
+    get_cached_legal_rules()
+    assert add_or_update_legal_rule({"id": "r3", "title": "Rule 3", "summary": "Three."}) == "r3"
+    assert [r["id"] for r in get_cached_legal_rules()] == ["r1", "r2", "r3"]
+    assert fake_supabase.tables["laws"][-1]["updated_at"] > "2025-01-01"
+
+def test_failed_refresh_keeps_serving_the_last_snapshot(laws, fake_supabase):
+    first = get_cached_legal_rules()
+    fake_supabase.fail("laws", "select", FakeAPIError("connection reset"))
+    assert get_cached_legal_rules() is first
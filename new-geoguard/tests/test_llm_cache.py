@@ -0,0 +1,59 @@
+# tests/test_llm_cache.py
+import itertools
+import types
+
+from src import ai_core, llm_cache
+from src.llm_cache import ResponseCache, make_cache_key
+
+CONFIG = {"temperature": 0.1, "max_output_tokens": 1200}
+
+
+def test_cache_key_covers_model_config_and_prompt():
+    key = make_cache_key("gemini-2.0-flash", CONFIG, "prompt")
+    assert key == make_cache_key("gemini-2.0-flash", dict(reversed(list(CONFIG.items()))), "prompt")
+    assert key != make_cache_key("gemini-1.5-pro", CONFIG, "prompt")
+    assert key != make_cache_key("gemini-2.0-flash", {**CONFIG, "temperature": 0.2}, "prompt")
+    assert key != make_cache_key("gemini-2.0-flash", CONFIG, "prompt!")
+
+def test_put_get_round_trip_and_persistence(tmp_path):
+    path = str(tmp_path / "cache" / "llm.sqlite3")
+    cache = ResponseCache(path)
+    assert cache.get("k") is None
+    cache.put("k", '{"classification": "NO"}', model="m")
+    assert cache.get("k")["raw"] == '{"classification": "NO"}'
+    assert ResponseCache(path).get("k")["model"] == "m"
+
+def test_least_recently_used_entry_is_evicted(tmp_path, monkeypatch):
+    clock = itertools.count(1000)
+    monkeypatch.setattr(llm_cache, "time", types.SimpleNamespace(time=lambda: next(clock)))
+    cache = ResponseCache(str(tmp_path / "llm.sqlite3"), max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a")  # "b" is now the least recently used
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") and cache.get("c")
+    assert cache.stats()["entries"] == 2
+
+def test_byte_limit_is_enforced(tmp_path):
+    cache = ResponseCache(str(tmp_path / "llm.sqlite3"), max_bytes=10)
+    cache.put("a", "x" * 6)
+    cache.put("b", "y" * 6)
+    assert cache.get("a") is None
+    assert cache.stats() == {"entries": 1, "bytes": 6}
+    cache.clear()
+    assert cache.stats()["entries"] == 0
+
+def test_only_parseable_answers_are_cached(tmp_path, fake_gemini, monkeypatch):
+    cache = ResponseCache(str(tmp_path / "llm.sqlite3"))
+    monkeypatch.setattr(ai_core, "get_response_cache", lambda: cache)
+    fake_gemini.replies = ["Sorry, I can't help with that."]
+
+    def _scan():
+        return ai_core.analyze_feature(feature_topic="Chat", feature_description="Group chat", use_cache=True)
+
+    assert _scan().analysis["classification"] == "ERROR"
+    assert cache.stats()["entries"] == 0
+    assert _scan().analysis["classification"] == "NO"  # asked again, not served the bad answer
+    assert _scan().audit["cache_hit"] is True
+    assert len(fake_gemini.prompts) == 2
@@ -0,0 +1,109 @@
+# tests/test_llm_client.py
+import asyncio
+
+import pytest
+
+from fakes import FakeAPIError
+from src import llm_client
+from src.llm_client import GeminiClient, LLMCallError, TokenBucket, backoff_delay, is_transient_error
+
+
+class _Clock:
+    """Stands in for the `time` module: sleeping advances the clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class _Model:
+    """Raises the queued errors, then answers "ok"."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def generate_content(self, prompt, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+    async def generate_content_async(self, prompt, **kwargs):
+        return self.generate_content(prompt, **kwargs)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(llm_client, "time", clock)
+    monkeypatch.setattr(llm_client, "backoff_delay", lambda attempt: 2.0 ** attempt)
+
+    async def _sleep(seconds):
+        clock.sleep(seconds)
+    monkeypatch.setattr(llm_client.asyncio, "sleep", _sleep)
+    return clock
+
+
+def test_transient_errors():
+    assert is_transient_error(FakeAPIError("quota", code="429"))
+    assert is_transient_error(FakeAPIError("unavailable", code=503))
+    assert is_transient_error(TimeoutError())
+    assert not is_transient_error(FakeAPIError("bad request", code="400"))
+    assert not is_transient_error(ValueError("no code"))
+
+def test_backoff_is_capped_full_jitter():
+    for attempt in range(8):
+        assert 0 <= backoff_delay(attempt, base=1.0, cap=5.0) <= min(5.0, 2 ** attempt)
+
+def test_bucket_waits_for_the_refill(clock):
+    bucket = TokenBucket(per_minute=60, capacity=2)
+    assert [bucket.take() for _ in range(4)] == [0.0, 0.0, 1.0, 2.0]  # waiters queue up
+    clock.now += 10
+    assert bucket.take() == 0.0  # refilled, but never above capacity
+    assert bucket.take() == 0.0
+    assert bucket.take() == pytest.approx(1.0)
+
+def test_disabled_bucket_never_waits(clock):
+    bucket = TokenBucket(per_minute=0)
+    bucket.acquire(10**6)
+    assert clock.sleeps == []
+
+def test_transient_errors_are_retried_with_backoff(clock):
+    model = _Model(FakeAPIError("quota", code="429"), FakeAPIError("unavailable", code="503"))
+    client = GeminiClient(model, rpm=0, tpm=0, max_retries=3)
+    assert client.generate("prompt", {}) == ("ok", 2)
+    assert clock.sleeps == [1.0, 2.0]
+
+def test_permanent_errors_are_not_retried(clock):
+    model = _Model(FakeAPIError("bad request", code="400"))
+    with pytest.raises(LLMCallError) as err:
+        GeminiClient(model, rpm=0, tpm=0, max_retries=3).generate("prompt", {})
+    assert err.value.attempts == 1 and model.calls == 1
+    assert err.value.cause.code == "400"
+
+def test_retries_run_out(clock):
+    model = _Model(*(FakeAPIError("quota", code="429") for _ in range(5)))
+    with pytest.raises(LLMCallError, match="gave up after 3 attempts") as err:
+        GeminiClient(model, rpm=0, tpm=0, max_retries=2).generate("prompt", {})
+    assert err.value.attempts == 3 and clock.sleeps == [1.0, 2.0]
+
+def test_request_quota_spaces_calls(clock):
+    client = GeminiClient(_Model(), rpm=60, tpm=0, max_retries=0)
+    client.requests = TokenBucket(per_minute=60, capacity=1)
+    for _ in range(3):
+        client.generate("prompt", {})
+    assert clock.sleeps == [1.0, 1.0]
+
+def test_async_calls_retry_the_same_way(clock):
+    model = _Model(TimeoutError())
+    client = GeminiClient(model, rpm=0, tpm=0, max_retries=1, timeout=0)
+    assert asyncio.run(client.agenerate("prompt", {})) == ("ok", 1)
+    assert clock.sleeps == [1.0]
@@ -0,0 +1,58 @@
+# tests/test_prompt_budget.py
+from src.prompt_budget import fit_prompt, truncate_text
+
+
+def _rules(n, size=400):
+    return [{"id": f"r{i}", "summary": "x" * size} for i in range(n)]
+
+def _render(rules, sections):
+    body = "\n".join(f"{label}: {text}" for label, text in sections)
+    return "\n".join(r["summary"] for r in rules) + "\n" + body
+
+
+def test_prompt_within_budget_is_untouched():
+    rules, sections = _rules(2), [("Title", "t"), ("Description", "d")]
+    prompt, kept, out, report = fit_prompt(_render, rules, sections, budget=10_000, min_rules=1)
+    assert prompt == _render(rules, sections)
+    assert kept == rules and out == sections
+    assert "dropped_rule_ids" not in report and "truncated_sections" not in report
+
+def test_zero_budget_disables_trimming():
+    rules = _rules(10)
+    _, kept, _, report = fit_prompt(_render, rules, [("Title", "t")], budget=0, min_rules=1)
+    assert kept == rules
+    assert report["budget"] == 0
+
+def test_lowest_ranked_rules_are_dropped_first():
+    rules = _rules(10)  # ~100 tokens each
+    prompt, kept, _, report = fit_prompt(_render, rules, [("Title", "t")], budget=450, min_rules=1)
+    assert [r["id"] for r in kept] == ["r0", "r1", "r2", "r3"]
+    assert report["dropped_rule_ids"] == [f"r{i}" for i in range(4, 10)]
+    assert report["estimated_tokens"] <= 450 < report["original_tokens"]
+    assert not report["over_budget"]
+    assert prompt == _render(kept, [("Title", "t")])
+
+def test_sections_are_truncated_from_the_end_after_min_rules():
+    rules = _rules(3, size=40)
+    long_text = ". ".join(f"Sentence {i} of the spec" for i in range(400))
+    sections = [("Title", "T" * 3000), ("Description", long_text), ("PRD", long_text)]
+    _, kept, out, report = fit_prompt(_render, rules, sections, budget=2000, min_rules=3)
+    assert kept == rules  # never below min_rules
+    assert out[0] == sections[0]  # protected
+    assert "PRD" in report["truncated_sections"]
+    assert "[..." in out[2][1]
+    assert report["estimated_tokens"] <= 2000
+
+def test_over_budget_is_reported_when_nothing_more_can_be_cut():
+    sections = [("Title", "T" * 20_000)]
+    _, _, out, report = fit_prompt(_render, _rules(1), sections, budget=100, min_rules=1)
+    assert out == sections
+    assert report["over_budget"]
+
+def test_truncate_text_cuts_at_a_sentence_break():
+    text = "First sentence here. Second sentence here. Third sentence is longer than the rest."
+    cut = truncate_text(text, 50)
+    assert cut.startswith("First sentence here. Second sentence here.")
+    assert "Third" not in cut
+    assert "characters truncated" in cut
+    assert truncate_text("short", 50) == "short"
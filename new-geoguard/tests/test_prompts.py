@@ -0,0 +1,38 @@
+# tests/test_prompts.py
+import pytest
+
+from src.prompts import PROMPT_TEMPLATES, PromptTemplate, get_prompt_template
+
+
+def _fields(template):
+    return {name: f"<{name} with {{braces}}>" for name in template.slots}
+
+
+def test_render_matches_str_format():
+    template = PromptTemplate("t", "Intro {{literal}}\n{a} then {b}, again {a}.")
+    assert template.prefix == "Intro {literal}\n"
+    assert template.slots == ("a", "b", "a")
+    assert template.render({"a": "A", "b": "B"}) == "Intro {literal}\nA then B, again A."
+
+@pytest.mark.parametrize("version", sorted(PROMPT_TEMPLATES))
+def test_split_halves_join_to_the_full_prompt(version):
+    template = get_prompt_template(version)
+    fields = _fields(template)
+    assert template.render(fields) == template.format_string.format(**fields)
+    for slot in set(template.slots):
+        head, tail = template.render_split(fields, slot)
+        assert head + tail == template.render(fields)
+        assert head.startswith(template.prefix)
+        assert tail.startswith(fields[slot]) and fields[slot] not in head
+
+def test_split_cuts_before_the_first_use_of_a_slot():
+    template = PromptTemplate("t", "Rules: {rules}\nFeature: {feature}\nAgain: {feature}")
+    fields = {"rules": "R", "feature": "F"}
+    assert template.render_split(fields, "feature") == ("Rules: R\nFeature: ", "F\nAgain: F")
+    assert template.render_split(fields, "rules") == ("Rules: ", "R\nFeature: F\nAgain: F")
+
+def test_unknown_slot_or_version_raises():
+    with pytest.raises(ValueError):
+        get_prompt_template("v1").render_split({}, "nope")
+    with pytest.raises(ValueError):
+        get_prompt_template("v0")
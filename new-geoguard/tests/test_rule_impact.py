@@ -0,0 +1,60 @@
+# tests/test_rule_impact.py
+import pytest
+
+from fakes import FakeAPIError
+from src import ai_core
+from src.rule_impact import find_rule_impact
+
+LAWS = [
+    {"id": "ut_curfew", "title": "Utah Curfew", "jurisdiction": "Utah", "severity": "high",
+     "summary": "Curfew for minors.", "keywords": ["curfew"]},
+    {"id": "eu_age", "title": "EU Age Assurance", "jurisdiction": "EU", "severity": "medium",
+     "summary": "Age verification for risky features.", "keywords": ["age verification"]},
+    {"id": "gl_access", "title": "Accessibility", "jurisdiction": "Global", "severity": "low",
+     "summary": "Readable colours.", "keywords": ["colours"]},
+]
+
+
+def _scan(feature_id, context, triggered=(), regulation="None"):
+    return {"feature_id": feature_id, "audit": {"rules_context_ids": list(context)},
+            "analysis": {"triggered_rules": [{"rule_id": rid} for rid in triggered], "regulation": regulation}}
+
+
+@pytest.fixture
+def scanned(fake_supabase, monkeypatch):
+    monkeypatch.setattr(ai_core, "RULES_TOP_K", 1)  # shortlist = the best match only
+    fake_supabase.tables["laws"].extend(LAWS)
+    fake_supabase.tables["features"].extend([
+        {"id": "f1", "title": "Night mode", "description": "Curfew for teens in Utah"},
+        {"id": "f2", "title": "Login", "description": "Password reset"},
+        {"id": "f3", "title": "Creator fund", "description": "Age verification before payouts"},
+        {"id": "f4", "title": "Dark theme", "description": "Colours only"},
+    ])
+    fake_supabase.tables["scans"].extend([
+        dict(_scan("f1", ["ut_curfew"], triggered=["ut_curfew"]), scan_id="s1", timestamp_utc="2025-01-02"),
+        dict(_scan("f2", ["ut_curfew", "eu_age"]), scan_id="s2", timestamp_utc="2025-01-02"),
+        # older scan of f2 that cited the rule; only the latest one counts
+        dict(_scan("f2", ["ut_curfew"], regulation="ut_curfew"), scan_id="s0", timestamp_utc="2025-01-01"),
+    ])
+
+
+def test_features_are_ranked_by_the_strongest_reason(scanned):
+    affected = find_rule_impact(["ut_curfew", "eu_age"])
+    assert [(a["feature_id"], a["reasons"], a["rule_ids"]) for a in affected] == [
+        ("f1", ["triggered", "in_context"], ["ut_curfew"]),
+        ("f2", ["in_context"], ["eu_age", "ut_curfew"]),
+        ("f3", ["newly_shortlisted"], ["eu_age"]),
+    ]
+
+def test_deleted_rules_skip_the_shortlist_check(scanned):
+    affected = find_rule_impact(["eu_age"], include_new_shortlists=False)
+    assert [a["feature_id"] for a in affected] == ["f2"]
+
+def test_no_rules_reads_nothing(scanned, fake_supabase):
+    assert find_rule_impact([None, ""]) == []
+    assert fake_supabase.calls == []
+
+def test_failed_read_raises_instead_of_reporting_no_impact(scanned, fake_supabase):
+    fake_supabase.fail("features", "select", FakeAPIError("timeout"))
+    with pytest.raises(FakeAPIError):
+        find_rule_impact(["ut_curfew"])
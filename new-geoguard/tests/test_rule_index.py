@@ -0,0 +1,53 @@
+# tests/test_rule_index.py
+from src.rule_index import RuleIndex, get_rule_index
+
+RULES = [
+    {"id": "us_ut_minor", "title": "Utah Minor Protection", "jurisdiction": "Utah",
+     "severity": "high", "keywords": ["curfew", "minor"]},
+    {"id": "eu_dsa", "title": "Digital Services Act", "jurisdiction": "EU",
+     "severity": "critical", "keywords": ["recommender", "transparency"]},
+    {"id": "us_ca_aadc", "title": "Age Appropriate Design Code", "jurisdiction": "California",
+     "severity": "medium", "keywords": ["age assurance", "minor"]},
+    {"id": "global_csam", "title": "CSAM reporting", "jurisdiction": "Global",
+     "severity": "low", "keywords": ["csam"]},
+]
+
+
+def _naive_scores(text):
+    """The per-rule substring scan RuleIndex replaces."""
+    weight = {"critical": 4, "high": 3, "medium": 2, "low": 1}
+    text = text.lower()
+    out = []
+    for r in RULES:
+        score = sum(2 for kw in r["keywords"] if kw.lower() in text)
+        score += sum(1 for f in ("id", "title") if r[f].lower() in text)
+        out.append(score + 0.1 * weight[r["severity"]])
+    return out
+
+
+def test_scores_match_substring_scan():
+    index = RuleIndex(RULES)
+    for text in ("Curfew for minor users in Utah",
+                 "Recommender transparency under the Digital Services Act",
+                 "age assurance flow (us_ca_aadc) for minors",
+                 "nothing relevant"):
+        assert index.scores(text) == _naive_scores(text)
+
+def test_select_ranks_by_score():
+    ranked = RuleIndex(RULES).select("curfew for minor accounts", top_k=2)
+    assert [r["id"] for r in ranked] == ["us_ut_minor", "us_ca_aadc"]
+
+def test_locations_drop_unrelated_jurisdictions():
+    ranked = RuleIndex(RULES).select("recommender for minor accounts", top_k=0, locations=["US-UT"])
+    ids = [r["id"] for r in ranked]
+    assert "eu_dsa" not in ids and "us_ca_aadc" not in ids
+    assert set(ids) == {"us_ut_minor", "global_csam"}  # global rules always apply
+
+def test_unmatched_location_falls_back_to_every_rule():
+    ranked = RuleIndex(RULES[:3]).select("text", top_k=0, locations=["JP"])
+    assert {r["id"] for r in ranked} == {"us_ut_minor", "eu_dsa", "us_ca_aadc"}
+
+def test_index_is_memoized_per_rule_list():
+    rules = list(RULES)
+    assert get_rule_index(rules) is get_rule_index(rules)
+    assert get_rule_index(list(RULES)) is not get_rule_index(rules)
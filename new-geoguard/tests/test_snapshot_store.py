@@ -0,0 +1,69 @@
+# tests/test_snapshot_store.py
+import pytest
+
+from fakes import FakeAPIError
+from src import ai_core, db_utils
+from src.db_utils import add_scan, add_scans_bulk, get_scan_snapshots
+
+LAWS = [{"id": f"r{i}", "title": f"Rule {i}", "jurisdiction": "EU", "severity": "medium",
+         "summary": f"Obligation {i}. " * 30, "keywords": ["chat"]} for i in range(3)]
+
+
+@pytest.fixture
+def store(fake_supabase, fake_gemini, monkeypatch):
+    """An empty snapshot store, switched on, with no process-local state."""
+    fake_supabase.tables["laws"].extend(LAWS)
+    monkeypatch.setattr(db_utils, "SNAPSHOT_STORE_ENABLED", True)
+    monkeypatch.setattr(db_utils, "_snapshot_store_available", True)
+    monkeypatch.setattr(db_utils, "_snapshot_store_retry_at", 0.0)
+    monkeypatch.setattr(db_utils, "_known_blobs", set())
+    monkeypatch.setattr(db_utils, "_blob_cache", {})
+    return fake_supabase.tables["snapshot_blobs"]
+
+def _scan(description):
+    result = ai_core.analyze_feature(feature_topic="Chat", feature_description=description, use_cache=False)
+    return {"feature_id": "f1", "feature_snapshot": {"title": "Chat"}, "analysis": result.analysis,
+            "audit_meta": result.audit}
+
+
+def test_snapshots_round_trip_through_the_store(store, fake_supabase):
+    scan = _scan("Group chat " * 100)
+    scan_id = add_scan(scan["feature_id"], scan["feature_snapshot"], scan["analysis"], audit_meta=scan["audit_meta"])
+
+    audit = fake_supabase.tables["scans"][0]["audit"]
+    assert "prompt_snapshot" not in audit and "context_snapshot" not in audit
+    assert set(audit["snapshot_refs"]["prompt"]) == {"template", "fields"}
+    assert {b["kind"] for b in store} >= {"prompt_template", "context_text", "feature_text_normalized"}
+    assert all(b["encoding"] == "gzip+base64" for b in store)
+
+    db_utils._blob_cache.clear()  # read back from the table, not the process cache
+    snapshots = get_scan_snapshots(scan_id)
+    assert snapshots["prompt_snapshot"] == scan["audit_meta"]["prompt_snapshot"]
+    assert snapshots["context_snapshot"] == scan["audit_meta"]["context_snapshot"]
+
+def test_shared_text_is_stored_once(store, fake_supabase):
+    add_scans_bulk([_scan("Group chat " * 100), _scan("Direct chat " * 100)])
+    kinds = [b["kind"] for b in store]
+    assert kinds.count("prompt_template") == 1 and kinds.count("context_text") == 1
+    assert kinds.count("feature_text_normalized") == 2
+
+    writes = fake_supabase.calls.count(("snapshot_blobs", "upsert"))
+    add_scans_bulk([_scan("Group chat " * 100)])
+    assert fake_supabase.calls.count(("snapshot_blobs", "upsert")) == writes  # all known already
+    assert len(fake_supabase.tables["scans"]) == 3
+
+def test_failed_blob_write_keeps_snapshots_inline_and_backs_off(store, fake_supabase):
+    fake_supabase.fail("snapshot_blobs", "upsert", FakeAPIError("connection reset"))
+    add_scans_bulk([_scan("Group chat")])
+    audit = fake_supabase.tables["scans"][0]["audit"]
+    assert audit["prompt_snapshot"] and "snapshot_refs" not in audit
+    assert db_utils._snapshot_store_retry_at > 0 and db_utils._snapshot_store_available
+
+    add_scans_bulk([_scan("Group chat")])  # within the backoff: not attempted
+    assert fake_supabase.calls.count(("snapshot_blobs", "upsert")) == 1
+
+def test_missing_table_disables_the_store(store, fake_supabase):
+    del fake_supabase.tables["snapshot_blobs"]
+    add_scans_bulk([_scan("Group chat")])
+    assert db_utils._snapshot_store_available is False
+    assert get_scan_snapshots(fake_supabase.tables["scans"][0]["scan_id"])["prompt_snapshot"]